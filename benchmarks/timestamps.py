@@ -0,0 +1,43 @@
+"""
+Compares :func:`vidscraper.utils.timestamps.parse_timestamp` with
+:func:`datetime.datetime.strptime` for the timestamp formats used by the
+built-in suites. Run with ``python benchmarks/timestamps.py``.
+
+"""
+import timeit
+
+
+FORMATS = (
+    ("2007-05-07T22:15:21.000Z", "%Y-%m-%dT%H:%M:%S.000Z"),
+    ("2005-02-16 23:09:19", "%Y-%m-%d %H:%M:%S"),
+    ("2010-09-17T22:31:14Z", "%Y-%m-%dT%H:%M:%SZ"),
+    ("2012-12-25T06:46:01.123456", "%Y-%m-%dT%H:%M:%S.%f"),
+)
+
+SETUP = """
+from datetime import datetime
+from vidscraper.utils import timestamps
+value, format = {0!r}, {1!r}
+"""
+
+STATEMENTS = (
+    ('strptime', "datetime.strptime(value, format)"),
+    ('fast path', "timestamps._memo.clear(); "
+                  "timestamps.parse_timestamp(value, format)"),
+    ('memoized', "timestamps.parse_timestamp(value, format)"),
+)
+
+
+def main(number=100000):
+    for value, format in FORMATS:
+        print format
+        setup = SETUP.format(value, format)
+        for name, statement in STATEMENTS:
+            best = min(timeit.repeat(statement, setup, repeat=3,
+                                     number=number))
+            print "    {0:<10} {1:.2f} usec/call".format(
+                                        name, best * 1000000 / number)
+
+
+if __name__ == '__main__':
+    main()
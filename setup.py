@@ -1,6 +1,18 @@
+import sys
+
 from setuptools import setup, find_packages
 
 
+install_requires = [
+    'feedparser>=5.1.2',
+    'beautifulsoup4>=4.0.2',
+    'requests>=1.0.0',
+    'lxml>=2.3.4',
+]
+if sys.version_info < (2, 7):
+    install_requires.append('ordereddict>=1.1')
+
+
 setup(
     name="vidscraper",
     version='1.0.2',
@@ -11,12 +23,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     scripts=['bin/vidscraper'],
-    install_requires=[
-        'feedparser>=5.1.2',
-        'beautifulsoup4>=4.0.2',
-        'requests>=1.0.0',
-        'lxml>=2.3.4',
-    ],
+    install_requires=install_requires,
     extras_require={
         'oauth': ['requests-oauth>=0.4.1'],
         'tests': ['unittest2>=0.5.1', 'mock>=0.8.0', 'tox>=1.4.2', 'nose>=1.2.1'],
@@ -1,10 +1,12 @@
 __version__ = (1, 0, 2)
 
 
+from vidscraper.ratelimit import INTERACTIVE
 from vidscraper.suites import registry
 
 
-def auto_scrape(url, fields=None, api_keys=None):
+def auto_scrape(url, fields=None, api_keys=None, priority=INTERACTIVE,
+                deadline=None):
     """
     Returns a :class:`.Video` instance with data loaded.
 
@@ -17,13 +19,22 @@ def auto_scrape(url, fields=None, api_keys=None):
                    .. seealso:: :ref:`video-fields`
     :param api_keys: A dictionary of API keys for various services. Check the
                      documentation for each :mod:`suite <vidscraper.suites>`
-                     to find what API keys they may want or require.
+                     to find what API keys they may want or require. Any
+                     key may be a :class:`~vidscraper.keys.KeyPool`.
+    :param priority: The priority of the requests made to load the video.
+                     By default, they go ahead of background requests, such
+                     as those for feed pages.
+    :param deadline: A timestamp (as from :func:`time.time`) by which the
+                     video must be loaded. Whatever has been loaded by then
+                     is returned, and the video's
+                     :attr:`~.Video.partial` attribute is ``True`` if
+                     anything was cut off.
     :raises: :exc:`.UnhandledVideo` if no :mod:`suite <vidscraper.suites>`
              can be found which handles the video.
 
     """
     video = registry.get_video(url, fields=fields, api_keys=api_keys)
-    video.load()
+    video.load(priority, deadline)
     return video
 
 
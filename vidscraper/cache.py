@@ -0,0 +1,581 @@
+"""
+An HTTP response cache for the requests made by loaders and iterators.
+Caching is enabled by setting :data:`vidscraper.fetch.cache` to a
+:class:`ResponseCache`::
+
+    from vidscraper import fetch
+    from vidscraper.cache import ResponseCache, SQLiteBackend
+
+    fetch.cache = ResponseCache(SQLiteBackend('/tmp/vidscraper.db'))
+
+Responses are kept for as long as their ``Cache-Control`` or ``Expires``
+headers allow, or for the :attr:`~.VideoLoader.cache_ttl` of the loader or
+iterator which requested them. Once they expire, responses with an ETag or
+Last-Modified header are revalidated with a conditional request.
+
+Video metadata can also be cached with a :class:`MetadataCache`, which
+returns the last known data for a video immediately and refreshes it in the
+background.
+
+Failures can be remembered by setting :data:`vidscraper.fetch.negative_cache`
+to a :class:`NegativeCache`, so that urls which are unhandled, deleted or
+failing aren't looked up again until their failure expires.
+
+"""
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6.
+    from ordereddict import OrderedDict
+import json
+from multiprocessing.pool import ThreadPool
+import sqlite3
+import threading
+import time
+import zlib
+
+from vidscraper.exceptions import (UnhandledFeed, UnhandledVideo,
+                                   VideoDeleted, VidscraperError)
+from vidscraper.ratelimit import BACKGROUND, INTERACTIVE
+from vidscraper.utils.http import (pack_response, parse_http_timestamp,
+                                   unpack_response)
+
+
+class MemoryBackend(object):
+    """
+    Keeps up to ``max_entries`` cache entries in memory, discarding the
+    least recently used entries first.
+
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                return None
+            # Move the entry to the most recently used end.
+            self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend(object):
+    """
+    Keeps cache entries in an SQLite database at ``path``, with compressed
+    response bodies.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None, timeout=30)
+        self.connection.text_factory = str
+        self._lock = threading.Lock()
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS vidscraper_cache ('
+            'key TEXT PRIMARY KEY, '
+            'entry TEXT NOT NULL, '
+            'content BLOB NOT NULL)')
+
+    def get(self, key):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT entry, content FROM vidscraper_cache WHERE key = ?',
+                (key,)).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row[0])
+        if 'response' in entry:
+            entry['response']['content'] = zlib.decompress(row[1])
+        return entry
+
+    def set(self, key, entry):
+        """
+        Stores ``entry``, which must be serializable as json except for the
+        content of its ``'response'``, if it has one.
+
+        """
+        entry = dict(entry)
+        content = ''
+        if 'response' in entry:
+            entry['response'] = dict(entry['response'])
+            content = entry['response'].pop('content')
+        content = zlib.compress(content)
+        with self._lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO vidscraper_cache '
+                '(key, entry, content) VALUES (?, ?, ?)',
+                (key, json.dumps(entry), sqlite3.Binary(content)))
+
+    def delete(self, key):
+        with self._lock:
+            self.connection.execute(
+                'DELETE FROM vidscraper_cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute('DELETE FROM vidscraper_cache')
+
+
+def _parse_cache_control(value):
+    """
+    Returns a dictionary of the directives in a Cache-Control header.
+    Directives without values map to ``True``.
+
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+def _get_validators(headers):
+    """
+    Returns an ``(etag, last_modified)`` tuple with the If-None-Match and
+    If-Modified-Since headers of a request, either of which may be ``None``.
+
+    """
+    headers = dict((key.lower(), value)
+                   for key, value in (headers or {}).iteritems())
+    return headers.get('if-none-match'), headers.get('if-modified-since')
+
+
+def _validators_match(headers, cached_headers):
+    """
+    Returns ``True`` if the request ``headers`` are conditional, and every
+    validator they send came from the cached response with
+    ``cached_headers``, so that a 304 response to them confirms that
+    response.
+
+    """
+    etag, last_modified = _get_validators(headers)
+    if etag is None and last_modified is None:
+        return False
+    if etag is not None and etag != cached_headers.get('etag'):
+        return False
+    if last_modified is not None:
+        cached = parse_http_timestamp(cached_headers.get('last-modified'))
+        if cached is None or parse_http_timestamp(last_modified) != cached:
+            return False
+    return True
+
+
+class ResponseCache(object):
+    """
+    Caches responses in ``backend`` (a :class:`MemoryBackend` by default).
+    :attr:`hits`, :attr:`misses` and :attr:`revalidations` count how each
+    request was handled.
+
+    """
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        #: Requests answered from the cache without contacting the server.
+        self.hits = 0
+        #: Requests which had to be fetched from the server.
+        self.misses = 0
+        #: Requests answered from the cache after the server confirmed that
+        #: the cached response was still valid.
+        self.revalidations = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Returns a dictionary of the hit, miss and revalidation counts."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+        }
+
+    def get_expires(self, response, ttl=None, now=None):
+        """
+        Returns the time (in seconds since the epoch) until which
+        ``response`` can be used without revalidation, or ``None`` if it
+        shouldn't be stored at all. ``ttl``, if given, overrides the
+        response's headers.
+
+        """
+        if now is None:
+            now = time.time()
+        headers = response.headers
+        directives = _parse_cache_control(headers.get('cache-control'))
+        if 'no-store' in directives:
+            return None
+        if ttl is not None:
+            return now + ttl
+        if 'no-cache' in directives:
+            return now
+        try:
+            return now + int(directives['max-age'])
+        except (KeyError, ValueError):
+            pass
+        expires = parse_http_timestamp(headers.get('expires'))
+        if expires is not None:
+            # Allow for differences between the server's clock and ours.
+            date = parse_http_timestamp(headers.get('date'))
+            return now + expires - (date if date is not None else now)
+        return now
+
+    def _store(self, url, response, ttl, now):
+        if response.status_code != 200:
+            return
+        expires = self.get_expires(response, ttl, now)
+        if expires is None:
+            return
+        if (expires <= now and 'etag' not in response.headers and
+                'last-modified' not in response.headers):
+            # It could never be reused.
+            return
+        self.backend.set(url, {
+            'stored': now,
+            'expires': expires,
+            'response': pack_response(response),
+        })
+
+    def prepare(self, url, kwargs, ttl=None):
+        """
+        Looks up ``url`` before a request. Returns a ``(response, entry)``
+        tuple. If ``response`` is not ``None``, it should be used instead of
+        making a request. Otherwise, ``kwargs`` (the keyword arguments for
+        the request) may have been updated to revalidate the cached
+        ``entry``, and the response should be passed to :meth:`process`.
+
+        """
+        now = time.time()
+        entry = self.backend.get(url)
+        if entry is None:
+            return None, None
+        if ttl is not None:
+            # The override applies to responses which were cached with a
+            # different ttl, too.
+            expires = entry['stored'] + ttl
+        else:
+            expires = entry['expires']
+        if expires > now:
+            self._count('hits')
+            return self._cached_response(entry, kwargs), entry
+
+        headers = dict(kwargs.get('headers') or {})
+        cached_headers = dict((key.lower(), value) for key, value
+                              in entry['response']['headers'].iteritems())
+        if _get_validators(headers) != (None, None):
+            # The request is already conditional. A 304 only confirms the
+            # cached response if the validators it sent came from it.
+            if not _validators_match(headers, cached_headers):
+                return None, None
+        else:
+            # Remember that the caller didn't ask for a 304 response.
+            entry = dict(entry, added_validators=True)
+            if 'etag' in cached_headers:
+                headers['If-None-Match'] = cached_headers['etag']
+            if 'last-modified' in cached_headers:
+                headers['If-Modified-Since'] = cached_headers['last-modified']
+            kwargs['headers'] = headers
+        return None, entry
+
+    def _cached_response(self, entry, kwargs):
+        """
+        Returns the cached response for ``entry``, or a 304 response if the
+        request was itself conditional and its validators came from the
+        cached response.
+
+        """
+        response = unpack_response(entry['response'])
+        if (not entry.get('added_validators') and
+                _validators_match(kwargs.get('headers'), response.headers)):
+            response.status_code = 304
+            response._content = ''
+        return response
+
+    def process(self, url, entry, response, kwargs, ttl=None):
+        """
+        Given the ``entry`` and ``kwargs`` from :meth:`prepare` and the
+        ``response`` to the request, updates the cache and returns the
+        response which should be used.
+
+        """
+        now = time.time()
+        if (response is not None and response.status_code == 304 and
+                entry is not None):
+            self._count('revalidations')
+            cached = unpack_response(entry['response'])
+            # The 304 response's headers replace the cached ones.
+            cached.headers.update(response.headers)
+            self._store(url, cached, ttl, now)
+            return self._cached_response(entry, kwargs)
+        self._count('misses')
+        if response is not None:
+            self._store(url, response, ttl, now)
+        return response
+
+    def fetch(self, url, send, ttl=None, **kwargs):
+        """
+        Returns a response for ``url``, from the cache if possible, and
+        otherwise by calling ``send(url, **kwargs)``.
+
+        """
+        response, entry = self.prepare(url, kwargs, ttl)
+        if response is not None:
+            return response
+        return self.process(url, entry, send(url, **kwargs), kwargs, ttl)
+
+
+#: Outcomes which can be stored in a :class:`NegativeCache`.
+UNHANDLED_VIDEO = 'unhandled_video'
+UNHANDLED_FEED = 'unhandled_feed'
+VIDEO_DELETED = 'video_deleted'
+LOADER_ERROR = 'loader_error'
+
+
+class NegativeCache(object):
+    """
+    Remembers urls which couldn't be handled or loaded, so that they can be
+    rejected without any work being done. Entries are stored in ``backend``
+    (a :class:`MemoryBackend` by default) and expire after the ttl for their
+    outcome.
+
+    :param ttls: A dictionary mapping outcomes (:data:`UNHANDLED_VIDEO`,
+                 :data:`UNHANDLED_FEED`, :data:`VIDEO_DELETED` or
+                 :data:`LOADER_ERROR`) to the number of seconds they should
+                 be remembered for. These override :attr:`default_ttls`.
+
+    """
+    #: The default number of seconds each outcome is remembered for. Loader
+    #: errors are often temporary, so they are kept for the least time.
+    default_ttls = {
+        UNHANDLED_VIDEO: 86400,
+        UNHANDLED_FEED: 86400,
+        VIDEO_DELETED: 7 * 86400,
+        LOADER_ERROR: 300,
+    }
+
+    _exception_classes = {
+        UNHANDLED_VIDEO: UnhandledVideo,
+        UNHANDLED_FEED: UnhandledFeed,
+        VIDEO_DELETED: VideoDeleted,
+        LOADER_ERROR: VidscraperError,
+    }
+
+    def __init__(self, backend=None, ttls=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttls = dict(self.default_ttls)
+        if ttls is not None:
+            self.ttls.update(ttls)
+
+    def get_key(self, outcome, url, api_keys=None, loaders=None):
+        """
+        Returns the key for ``outcome`` and ``url``. Variants of the same
+        url share a :meth:`~.SuiteRegistry.canonical_key`, and so share
+        entries. Whether a url is handled can depend on which ``api_keys``
+        are available, so their names are part of the key for
+        :data:`UNHANDLED_VIDEO` and :data:`UNHANDLED_FEED`. Likewise, a
+        :data:`LOADER_ERROR` only applies to the names of the ``loaders``
+        which failed, since other fields or keys may use other loaders.
+
+        """
+        from vidscraper.suites import registry
+        key = u'negative:{0}:{1}'.format(outcome, registry.canonical_key(url))
+        if outcome in (UNHANDLED_VIDEO, UNHANDLED_FEED):
+            key = u'{0}:{1}'.format(key, u','.join(sorted(api_keys or ())))
+        elif outcome == LOADER_ERROR:
+            key = u'{0}:{1}'.format(key, u','.join(sorted(loaders or ())))
+        return key
+
+    def record(self, outcome, url, exc=None, now=None, api_keys=None,
+               loaders=None):
+        """
+        Remembers that looking up ``url`` (with ``api_keys`` or ``loaders``)
+        resulted in ``outcome``, with the message from the exception ``exc``,
+        if given.
+
+        """
+        ttl = self.ttls.get(outcome)
+        if not ttl:
+            return
+        if now is None:
+            now = time.time()
+        if exc is None:
+            message = url
+        elif isinstance(exc, VidscraperError) and exc.args:
+            message = unicode(exc.args[0])
+        else:
+            message = u'{0}: {1}'.format(type(exc).__name__, exc)
+        self.backend.set(self.get_key(outcome, url, api_keys, loaders), {
+            'outcome': outcome,
+            'message': message,
+            'expires': now + ttl,
+        })
+
+    def get(self, url, outcomes, now=None, api_keys=None, loaders=None):
+        """
+        Returns an exception for the first of ``outcomes`` which is
+        remembered for ``url`` (with ``api_keys`` or ``loaders``), or
+        ``None`` if there isn't one.
+
+        """
+        if now is None:
+            now = time.time()
+        for outcome in outcomes:
+            key = self.get_key(outcome, url, api_keys, loaders)
+            entry = self.backend.get(key)
+            if entry is None:
+                continue
+            if entry['expires'] <= now:
+                self.backend.delete(key)
+                continue
+            return self._exception_classes[outcome](entry['message'])
+        return None
+
+    def forget(self, url, api_keys=None, loaders=None):
+        """
+        Removes every outcome remembered for ``url`` (with ``api_keys`` or
+        ``loaders``).
+
+        """
+        for outcome in self._exception_classes:
+            self.backend.delete(self.get_key(outcome, url, api_keys,
+                                             loaders))
+
+
+class MetadataCache(object):
+    """
+    Serves serialized video data from ``backend`` (a :class:`MemoryBackend`
+    by default) so that repeat lookups don't wait on the network.
+
+    Only successful loads are cached: videos whose loaders failed, or which
+    were cut off by a deadline or have no data, are returned but not stored,
+    and background refreshes which fail leave the old data in place.
+
+    :param max_age: Data younger than this many seconds is returned without
+                    being refreshed.
+    :param max_stale: Data younger than this many seconds is returned
+                      immediately, and refreshed in the background if it is
+                      older than ``max_age``. Older data is refreshed before
+                      being returned.
+    :param on_change: A function which will be called with the url, the old
+                      serialized data and the new serialized data whenever a
+                      background refresh changes a video's data.
+    :param pool: The pool used for background refreshes. It must have an
+                 ``apply_async`` method like
+                 :meth:`multiprocessing.pool.ThreadPool.apply_async`. By
+                 default, a :class:`~multiprocessing.pool.ThreadPool` is
+                 created when it is first needed.
+
+    """
+    def __init__(self, backend=None, max_age=0, max_stale=86400,
+                 on_change=None, pool=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.max_age = max_age
+        self.max_stale = max_stale
+        self.on_change = on_change
+        self.pool = pool
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _get_key(self, url, fields):
+        from vidscraper.suites import registry
+        fields = sorted(fields) if fields is not None else None
+        return json.dumps([registry.canonical_key(url), fields])
+
+    def _load(self, url, fields, api_keys, priority):
+        from vidscraper.suites import registry
+        video = registry.get_video(url, fields=fields, api_keys=api_keys)
+        video.load(priority)
+        return video
+
+    def _is_cacheable(self, video):
+        """
+        Returns ``True`` if ``video`` was loaded successfully: completely,
+        without errors from any of its loaders, and with some data.
+
+        """
+        return (video.is_loaded() and not video.partial and
+                not video._errors and
+                any(value is not None for field, value in video.items()))
+
+    def _store(self, key, video):
+        """
+        Stores and returns the serialized data for ``video``, or returns
+        ``None`` if it shouldn't be cached.
+
+        """
+        if not self._is_cacheable(video):
+            return None
+        data = video.serialize()
+        self.backend.set(key, {'stored': time.time(), 'data': data})
+        return data
+
+    def _refresh(self, key, url, fields, api_keys, old_data):
+        try:
+            new_data = self._store(key, self._load(url, fields, api_keys,
+                                                   BACKGROUND))
+        except Exception:
+            new_data = None
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+        if new_data is None:
+            # Keep serving the stale data; the next lookup will try again.
+            return
+        if self.on_change is not None and new_data != old_data:
+            self.on_change(url, old_data, new_data)
+
+    def _start_refresh(self, key, url, fields, api_keys, old_data):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self.pool is None:
+                self.pool = ThreadPool(4)
+        self.pool.apply_async(self._refresh,
+                              (key, url, fields, api_keys, old_data))
+
+    def scrape(self, url, fields=None, api_keys=None, priority=INTERACTIVE):
+        """
+        Returns a :class:`.Video` for ``url``, as with
+        :func:`.auto_scrape`, using cached data if it is recent enough.
+        Background refreshes always have background priority.
+
+        """
+        key = self._get_key(url, fields)
+        entry = self.backend.get(key)
+        if entry is not None:
+            age = time.time() - entry['stored']
+            if age <= self.max_stale:
+                if age > self.max_age:
+                    self._start_refresh(key, url, fields, api_keys,
+                                        entry['data'])
+                from vidscraper.videos import Video
+                video = Video.deserialize(entry['data'], api_keys)
+                # Only successful loads are cached, so the video doesn't
+                # need to be loaded again.
+                video._loaded = True
+                return video
+
+        video = self._load(url, fields, api_keys, priority)
+        self._store(key, video)
+        return video
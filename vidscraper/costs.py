@@ -0,0 +1,97 @@
+"""
+Measured costs of loaders, used by :meth:`.Video.get_best_loaders` to
+choose the cheapest loaders which provide the missing fields. Costs are
+tracked by setting :data:`vidscraper.fetch.loader_costs` to a
+:class:`LoaderCosts` instance::
+
+    from vidscraper import fetch
+    from vidscraper.costs import LoaderCosts
+
+    fetch.loader_costs = LoaderCosts()
+
+Each request which a loader actually sends (rather than answering from a
+cache) then updates moving averages of its class's latency and response
+size. Loaders which haven't been measured yet cost nothing, so they will be
+tried and measured; until there is data, and between loaders which cost the
+same, the order of each suite's
+:attr:`~vidscraper.suites.base.BaseSuite.loader_classes` is kept.
+
+"""
+import threading
+
+from vidscraper.utils.http import total_seconds
+
+
+class LoaderCosts(object):
+    """
+    Keeps exponential moving averages of the latency and the size of the
+    responses of each loader class.
+
+    :param alpha: The weight of each new sample in the averages, between 0
+                  and 1.
+    :param seconds_per_byte: How many seconds of latency a byte of response
+                             is considered to cost, for example in parsing.
+                             By default, a megabyte costs as much as a
+                             second.
+
+    """
+    def __init__(self, alpha=0.2, seconds_per_byte=1e-6):
+        self.alpha = alpha
+        self.seconds_per_byte = seconds_per_byte
+        self._averages = {}
+        self._lock = threading.Lock()
+
+    def record(self, loader_class, latency, size):
+        """
+        Adds a sample of ``latency`` seconds and ``size`` bytes for
+        ``loader_class``.
+
+        """
+        with self._lock:
+            averages = self._averages.get(loader_class)
+            if averages is None:
+                self._averages[loader_class] = {
+                    'latency': float(latency),
+                    'bytes': float(size),
+                    'samples': 1,
+                }
+                return
+            for key, value in (('latency', latency), ('bytes', size)):
+                averages[key] += self.alpha * (value - averages[key])
+            averages['samples'] += 1
+
+    def record_response(self, loader, response):
+        """
+        Adds a sample for ``loader``'s class from a ``response`` it
+        received. Failed requests (``None`` responses) aren't recorded.
+
+        """
+        if response is None:
+            return
+        self.record(type(loader), total_seconds(response.elapsed),
+                    len(response.content or ''))
+
+    def get_cost(self, loader):
+        """
+        Returns the estimated cost, in seconds, of a request by ``loader``,
+        or ``0`` if its class hasn't been measured.
+
+        """
+        with self._lock:
+            averages = self._averages.get(type(loader))
+            if averages is None:
+                return 0
+            return (averages['latency'] +
+                    averages['bytes'] * self.seconds_per_byte)
+
+    def stats(self):
+        """
+        Returns a dictionary mapping the name of each measured loader class
+        to a dictionary with its average ``latency`` in seconds, its average
+        response size in ``bytes``, and the number of ``samples``.
+
+        """
+        with self._lock:
+            return dict(('{0}.{1}'.format(cls.__module__, cls.__name__),
+                         dict(averages))
+                        for cls, averages in self._averages.iteritems())
@@ -42,3 +42,23 @@ class InvalidVideo(VidscraperError):
 class VideoDeleted(VidscraperError):
     """Raised if the remote server has deleted the video being scraped."""
     pass
+
+
+class CircuitOpen(VidscraperError):
+    """
+    Raised instead of making a request to a host whose circuit breaker is
+    open.
+
+    .. seealso:: :mod:`vidscraper.retry`
+
+    """
+    pass
+
+
+class DeadlineExceeded(VidscraperError):
+    """
+    Raised instead of making a request, or waiting any longer for one, once
+    the deadline of the work it is part of has passed.
+
+    """
+    pass
@@ -0,0 +1,516 @@
+"""
+The HTTP layer used by loaders and iterators. All of their requests go
+through :func:`fetch` or :func:`fetch_many`, so that features like response
+caching apply to every suite.
+
+Concurrent requests for the same url with the same headers are coalesced:
+only one of them is sent, and the others wait for it and get a copy of its
+response.
+
+Requests can be given a ``deadline``, as a timestamp like
+:func:`time.time`'s. Their timeouts are cut short so that they end by the
+deadline, they aren't retried past it, and once it has passed, no more
+requests are sent: :exc:`.DeadlineExceeded` is raised instead.
+
+Requests which don't set a timeout get one from :data:`timeouts`, or
+:data:`REQUEST_TIMEOUT` seconds.
+
+If the source of a request has a ``prepare_request`` method (see
+:meth:`.VideoLoader.prepare_request`), it is called with the url and kwargs
+each time the request is actually sent, and returns the ones to send. This
+is where API keys are added, so that requests answered from the cache or by
+an identical request in flight don't use any quota, and so that the cache,
+coalescing and circuit breakers see the same url and headers whichever key
+is used.
+
+"""
+import sys
+import threading
+import time
+
+import requests
+from requests.exceptions import RequestException, Timeout
+try:
+    import grequests
+except (RuntimeError, ImportError):
+    grequests = None
+
+from vidscraper.exceptions import CircuitOpen, DeadlineExceeded
+from vidscraper.ratelimit import BACKGROUND, INTERACTIVE, round_robin
+from vidscraper.retry import TRANSIENT_STATUSES
+from vidscraper.utils.http import (pack_response, total_seconds,
+                                   unpack_response)
+
+
+#: The timeout, in seconds, for requests which don't set one, if there are no
+#: :data:`timeouts`.
+REQUEST_TIMEOUT = 3
+
+#: Whether the installed version of requests accepts ``(connect, read)``
+#: timeout tuples, which were added in requests 2.4.
+_split_timeouts = tuple(int(part) for part in
+                        requests.__version__.split('.')[:2]) >= (2, 4)
+
+#: A :class:`~vidscraper.cache.ResponseCache` used for all requests, or
+#: ``None`` (the default) to disable caching.
+cache = None
+
+#: A :class:`~vidscraper.cache.NegativeCache` used to reject urls which
+#: recently failed, or ``None`` (the default) to always try them again.
+negative_cache = None
+
+#: A :class:`~vidscraper.ratelimit.RateLimiter` which every request sent
+#: must get a token from, or ``None`` (the default) for no rate limiting.
+rate_limiter = None
+
+#: A :class:`~vidscraper.ratelimit.ConcurrencyLimiter` which caps the
+#: requests in flight to each host, or ``None`` (the default) for no caps.
+concurrency_limiter = None
+
+#: A :class:`~vidscraper.retry.RetryPolicy` for requests which fail
+#: transiently, or ``None`` (the default) to never retry.
+retry_policy = None
+
+#: A :class:`~vidscraper.retry.CircuitBreakers` instance tracking failures
+#: per host, or ``None`` (the default) to always send requests.
+circuit_breakers = None
+
+#: A :class:`~vidscraper.timeouts.AdaptiveTimeouts` instance which chooses
+#: timeouts for requests which don't set one, or ``None`` (the default) to
+#: use :data:`REQUEST_TIMEOUT`.
+timeouts = None
+
+#: A :class:`~vidscraper.costs.LoaderCosts` instance which measures the
+#: requests made by loaders, so that the cheapest loaders can be chosen, or
+#: ``None`` (the default) to choose loaders in their static order.
+loader_costs = None
+
+#: A :class:`~vidscraper.hedge.HedgePolicy` for hedging slow loaders with
+#: alternative loaders, or ``None`` (the default) to never hedge.
+hedge_policy = None
+
+#: Whether identical requests which are in flight at the same time should
+#: share a single HTTP call.
+coalesce = True
+
+
+class _Call(object):
+    """A request which is in flight, and which others may wait on."""
+    def __init__(self, key):
+        self.key = key
+        self.event = threading.Event()
+        self.response = None
+        self.exc_info = None
+
+    def finish(self, response=None, exc_info=None):
+        with _in_flight_lock:
+            if _in_flight.get(self.key) is self:
+                del _in_flight[self.key]
+        self.response = response
+        self.exc_info = exc_info
+        self.event.set()
+
+    def wait(self, deadline=None):
+        if deadline is None:
+            self.event.wait()
+        else:
+            self.event.wait(max(0, deadline - time.time()))
+            if not self.event.is_set():
+                raise DeadlineExceeded(self.key[0])
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        # Each waiter gets its own copy, so that nothing done to one
+        # response can affect the others.
+        return unpack_response(pack_response(self.response))
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _join(url, kwargs):
+    """
+    Returns a ``(call, is_new)`` tuple for the request. If ``is_new`` is
+    ``True``, the caller must send the request and :meth:`~_Call.finish` the
+    call; otherwise, it should :meth:`~_Call.wait` for the call.
+
+    """
+    headers = kwargs.get('headers') or {}
+    key = (url, tuple(sorted((name.lower(), value)
+                             for name, value in headers.iteritems())))
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        if call is not None:
+            return call, False
+        call = _in_flight[key] = _Call(key)
+        return call, True
+
+
+def _is_transient_failure(response):
+    return response is None or response.status_code in TRANSIENT_STATUSES
+
+
+def _retry(url, kwargs, attempt, response, exc_info=None,
+           priority=BACKGROUND, deadline=None, prepare=None):
+    """
+    Handles the outcome of a request which has been sent ``attempt`` times:
+    retries it if the :data:`retry_policy` allows, and otherwise returns the
+    response or raises the exception.
+
+    """
+    while True:
+        # Stop early if the failures so far have opened the host's circuit.
+        if (retry_policy is not None and
+                attempt < retry_policy.max_attempts and
+                retry_policy.should_retry(response) and
+                (circuit_breakers is None or
+                 not circuit_breakers.is_open(url))):
+            delay = retry_policy.get_delay(attempt - 1, response)
+            if deadline is None or time.time() + delay < deadline:
+                time.sleep(delay)
+                response, exc_info = _get_once(url, kwargs, priority,
+                                               deadline, prepare)
+                attempt += 1
+                continue
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return response
+
+
+def _limit_timeout(url, kwargs, deadline):
+    """
+    Returns a ``(kwargs, cut)`` tuple, where ``kwargs`` is a copy of
+    ``kwargs`` with a timeout: the one it sets, or one from
+    :data:`timeouts`, cut short to end by the ``deadline``. ``cut`` is
+    ``True`` if the deadline shortened the timeout. Raises
+    :exc:`.DeadlineExceeded` if the deadline has already passed.
+
+    """
+    kwargs = kwargs.copy()
+    timeout = kwargs.get('timeout')
+    if timeout is None:
+        timeout = (REQUEST_TIMEOUT if timeouts is None
+                   else timeouts.get(url))
+    cut = False
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded(url)
+        if isinstance(timeout, tuple):
+            limited = tuple(min(part, remaining) for part in timeout)
+        else:
+            limited = min(timeout, remaining)
+        cut = limited != timeout
+        timeout = limited
+    if isinstance(timeout, tuple) and not _split_timeouts:
+        # Older versions of requests use one timeout for connecting and for
+        # each read.
+        timeout = timeout[1]
+    kwargs['timeout'] = timeout
+    return kwargs, cut
+
+
+def _record_latency(url, response, exc_info, timeout):
+    """
+    Records the latency of a request for ``url`` with the :data:`timeouts`.
+    A request which timed out is only recorded if its ``timeout`` isn't
+    ``None``; timeouts cut short by a deadline say nothing about the host.
+
+    """
+    if timeouts is None:
+        return
+    if response is not None:
+        timeouts.record(url, total_seconds(response.elapsed))
+    elif (exc_info is not None and issubclass(exc_info[0], Timeout) and
+            timeout is not None):
+        timeouts.record_timeout(url, timeout)
+
+
+def _prepare(url, kwargs, prepare):
+    """
+    Returns the ``(url, kwargs)`` to send for a request, as given by its
+    source's ``prepare`` function, if it has one.
+
+    """
+    if prepare is None:
+        return url, kwargs
+    return prepare(url, kwargs)
+
+
+def _get_once(url, kwargs, priority=BACKGROUND, deadline=None, prepare=None):
+    """
+    Sends a GET request once the :data:`circuit_breakers`,
+    :data:`rate_limiter` and :data:`concurrency_limiter` allow it, after
+    passing it through ``prepare`` (see :func:`_prepare`). Returns a
+    ``(response, exc_info)`` tuple, where ``exc_info`` is set if the request
+    failed with a connection error or timeout. If the ``deadline`` has
+    passed, or the request timed out because of it,
+    :exc:`.DeadlineExceeded` is raised instead.
+
+    """
+    kwargs, cut = _limit_timeout(url, kwargs, deadline)
+    if circuit_breakers is not None and not circuit_breakers.allow(url):
+        raise CircuitOpen(url)
+    if rate_limiter is not None:
+        rate_limiter.wait(url)
+    if concurrency_limiter is not None:
+        concurrency_limiter.acquire(url, priority=priority)
+    try:
+        send_url, send_kwargs = _prepare(url, kwargs, prepare)
+        response, exc_info = requests.get(send_url, **send_kwargs), None
+    except RequestException:
+        response, exc_info = None, sys.exc_info()
+    finally:
+        if concurrency_limiter is not None:
+            concurrency_limiter.release(url)
+    _record_latency(url, response, exc_info,
+                    None if cut else kwargs['timeout'])
+    if circuit_breakers is not None:
+        circuit_breakers.record(url, not _is_transient_failure(response))
+    if (exc_info is not None and deadline is not None and
+            time.time() >= deadline):
+        raise DeadlineExceeded(url)
+    return response, exc_info
+
+
+def _get(url, kwargs, priority=BACKGROUND, deadline=None, prepare=None):
+    """Sends a GET request, with retries if there is a retry policy."""
+    response, exc_info = _get_once(url, kwargs, priority, deadline, prepare)
+    return _retry(url, kwargs, 1, response, exc_info, priority, deadline,
+                  prepare)
+
+
+def _send(url, kwargs, priority=BACKGROUND, deadline=None, prepare=None):
+    """Sends a GET request, unless an identical one is already in flight."""
+    if not coalesce:
+        return _get(url, kwargs, priority, deadline, prepare)
+    call, is_new = _join(url, kwargs)
+    if not is_new:
+        return call.wait(deadline)
+    try:
+        response = _get(url, kwargs, priority, deadline, prepare)
+    except Exception:
+        call.finish(exc_info=sys.exc_info())
+        raise
+    call.finish(response)
+    return response
+
+
+def _send_parallel(requests_):
+    """
+    Sends GET requests for a list of ``(url, kwargs, prepare)`` tuples in
+    parallel with :mod:`grequests`, and returns a list of responses.
+    Requests which the :data:`circuit_breakers` reject get a
+    :exc:`.CircuitOpen` instance instead.
+
+    """
+    allowed = [i for i, (url, kwargs, prepare) in enumerate(requests_)
+               if circuit_breakers is None or circuit_breakers.allow(url)]
+    if rate_limiter is not None:
+        rate_limiter.wait_many([requests_[i][0] for i in allowed])
+    prepared = [_prepare(*requests_[i]) for i in allowed]
+    fetched = grequests.map([grequests.get(url, **kwargs)
+                             for url, kwargs in prepared])
+    responses = [CircuitOpen(url) for url, kwargs, prepare in requests_]
+    for i, response in zip(allowed, fetched):
+        # grequests doesn't say why requests failed.
+        _record_latency(requests_[i][0], response, None, None)
+        if circuit_breakers is not None:
+            circuit_breakers.record(requests_[i][0],
+                                    not _is_transient_failure(response))
+        responses[i] = response
+    return responses
+
+
+def _send_many(requests_, priority=BACKGROUND, deadline=None):
+    """
+    Sends GET requests for a list of ``(url, kwargs, prepare)`` tuples (see
+    :func:`_prepare`), in parallel if :mod:`grequests` is installed, and
+    returns a list of responses. Duplicate requests, and requests which are
+    already in flight, are only sent once. Hosts are served round-robin, and
+    with grequests, the requests are sent in waves which respect the
+    :data:`concurrency_limiter`. Requests which fail, which would be sent
+    after the ``deadline``, or which are cut off by it, get a response of
+    ``None``; each failure only affects its own request and the requests
+    which share it.
+
+    """
+    if coalesce:
+        calls = [_join(url, kwargs) for url, kwargs, prepare in requests_]
+    else:
+        calls = [(None, True)] * len(requests_)
+    new = [i for i, (call, is_new) in enumerate(calls) if is_new]
+
+    responses = [None] * len(requests_)
+    finished = set()
+
+    def finish(i, response=None, exc_info=None):
+        responses[i] = response
+        finished.add(i)
+        if calls[i][0] is not None:
+            calls[i][0].finish(response, exc_info)
+
+    def send(i, send_request):
+        try:
+            finish(i, send_request())
+        except (CircuitOpen, DeadlineExceeded):
+            finish(i)
+        except RequestException:
+            finish(i, exc_info=sys.exc_info())
+
+    try:
+        urls = [requests_[i][0] for i in new]
+        if grequests is None:
+            for j in round_robin(urls):
+                url, kwargs, prepare = requests_[new[j]]
+                send(new[j], lambda: _get(url, kwargs, priority, deadline,
+                                          prepare))
+        else:
+            if concurrency_limiter is None:
+                waves = [range(len(new))]
+            else:
+                waves = concurrency_limiter.get_waves(urls, priority)
+            for wave in waves:
+                wave = [new[j] for j in wave]
+                try:
+                    fetched = _send_parallel([
+                        (url, _limit_timeout(url, kwargs, deadline)[0],
+                         prepare)
+                        for url, kwargs, prepare in (requests_[i]
+                                                     for i in wave)])
+                except DeadlineExceeded:
+                    for i in wave:
+                        finish(i)
+                    continue
+                finally:
+                    if concurrency_limiter is not None:
+                        for i in wave:
+                            concurrency_limiter.release(requests_[i][0])
+                for i, response in zip(wave, fetched):
+                    if isinstance(response, CircuitOpen):
+                        finish(i)
+                        continue
+                    url, kwargs, prepare = requests_[i]
+                    send(i, lambda: _retry(url, kwargs, 1, response,
+                                           priority=priority,
+                                           deadline=deadline,
+                                           prepare=prepare))
+    except Exception:
+        # Requests which haven't finished share the unexpected error.
+        exc_info = sys.exc_info()
+        for i in new:
+            if i not in finished and calls[i][0] is not None:
+                calls[i][0].finish(exc_info=exc_info)
+        raise
+
+    for i in new:
+        if i not in finished:
+            finish(i)
+    for i, (call, is_new) in enumerate(calls):
+        if not is_new:
+            try:
+                responses[i] = call.wait(deadline)
+            except (CircuitOpen, DeadlineExceeded, RequestException):
+                pass
+    return responses
+
+
+def _get_ttl(source):
+    return getattr(source, 'cache_ttl', None)
+
+
+def _get_prepare(source):
+    return getattr(source, 'prepare_request', None)
+
+
+def _get_priority(source, priority):
+    if priority is not None:
+        return priority
+    return getattr(source, 'priority', None) or BACKGROUND
+
+
+def _record_cost(source, response):
+    """
+    Adds a sample for a ``response`` received by ``source`` to the
+    :data:`loader_costs`, if they are being tracked.
+
+    """
+    if loader_costs is not None and source is not None:
+        loader_costs.record_response(source, response)
+
+
+def fetch(url, source=None, priority=None, deadline=None, **kwargs):
+    """
+    Makes a GET request for ``url`` with ``kwargs`` (as for
+    :func:`requests.get`) and returns the response.
+
+    :param source: The loader or iterator making the request, whose settings
+                   (such as :attr:`~.VideoLoader.cache_ttl`) apply to it.
+    :param priority: :data:`~vidscraper.ratelimit.INTERACTIVE` or
+                     :data:`~vidscraper.ratelimit.BACKGROUND`. Defaults to
+                     the source's ``priority`` attribute, if it has one, and
+                     to background otherwise.
+    :param deadline: A timestamp by which the request must be finished.
+                     Defaults to the source's ``deadline`` attribute, if it
+                     has one.
+    :raises: :exc:`.DeadlineExceeded` if the deadline passes first.
+
+    """
+    priority = _get_priority(source, priority)
+    if deadline is None:
+        deadline = getattr(source, 'deadline', None)
+
+    prepare = _get_prepare(source)
+
+    def send(url, **kwargs):
+        response = _send(url, kwargs, priority, deadline, prepare)
+        _record_cost(source, response)
+        return response
+    if cache is None:
+        return send(url, **kwargs)
+    return cache.fetch(url, send, ttl=_get_ttl(source), **kwargs)
+
+
+def fetch_many(requests_, priority=None, deadline=None):
+    """
+    Given a list of ``(url, source, kwargs)`` tuples, makes all of the
+    requests, in parallel if :mod:`grequests` is installed, and returns a
+    list of responses in the same order. As with :func:`grequests.map`, a
+    request which fails will have a response of ``None``; the other
+    requests are unaffected. Requests to hosts whose circuit breaker is
+    open also have a response of ``None``.
+
+    :param priority: The priority of the requests, as for :func:`fetch`. If
+                     it isn't given and the sources' priorities differ, the
+                     requests are all sent as interactive.
+    :param deadline: A timestamp by which the requests must be finished.
+                     Requests which aren't get a response of ``None``.
+
+    """
+    responses = [None] * len(requests_)
+    entries = [None] * len(requests_)
+    pending = []
+    for i, (url, source, kwargs) in enumerate(requests_):
+        if cache is not None:
+            responses[i], entries[i] = cache.prepare(url, kwargs,
+                                                     _get_ttl(source))
+            if responses[i] is not None:
+                continue
+        pending.append(i)
+
+    if priority is None:
+        priorities = set(_get_priority(requests_[i][1], None)
+                         for i in pending)
+        priority = INTERACTIVE if INTERACTIVE in priorities else BACKGROUND
+    fetched = _send_many([(requests_[i][0], requests_[i][2],
+                           _get_prepare(requests_[i][1]))
+                          for i in pending], priority, deadline)
+
+    for i, response in zip(pending, fetched):
+        url, source, kwargs = requests_[i]
+        _record_cost(source, response)
+        if cache is not None:
+            response = cache.process(url, entries[i], response, kwargs,
+                                     _get_ttl(source))
+        responses[i] = response
+    return responses
@@ -0,0 +1,166 @@
+"""
+Hedged requests for :meth:`.Video.run_loaders`. Hedging is enabled by
+setting :data:`vidscraper.fetch.hedge_policy` to a :class:`HedgePolicy`::
+
+    from vidscraper import fetch
+    from vidscraper.hedge import HedgePolicy
+
+    # Hedge after a fixed half second...
+    fetch.hedge_policy = HedgePolicy(delay=0.5)
+    # ... or once a loader is slower than 95% of its recent requests.
+    fetch.hedge_policy = HedgePolicy(percentile=95)
+
+If one of the loaders chosen for a video hasn't answered by then, and the
+video has another loader which provides all of the fields it was chosen
+for, the other loader's request is started as well. Whichever answers
+first is used; the slower request is left to finish in the background, so
+that its response can still be cached.
+
+"""
+from collections import deque
+import threading
+import time
+
+from vidscraper.fetch import fetch, fetch_many
+from vidscraper.utils.stats import percentile
+
+
+class _Race(object):
+    """Requests by a loader and its alternative, of which the first wins."""
+    def __init__(self, policy, fields, priority, deadline):
+        self.policy = policy
+        self.fields = fields
+        self.priority = priority
+        self.deadline = deadline
+        self.result = None
+        self.done = threading.Event()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self, loader):
+        with self._lock:
+            self._pending += 1
+        thread = threading.Thread(target=self._run, args=(loader,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, loader):
+        started = time.time()
+        try:
+            response = fetch(loader.get_url_for_fields(self.fields), loader,
+                             priority=self.priority, deadline=self.deadline,
+                             **loader.get_request_kwargs())
+        except Exception:
+            response = None
+        else:
+            self.policy.record(loader, time.time() - started)
+        with self._lock:
+            self._pending -= 1
+            # A failure only wins if nothing else is left to answer.
+            if self.result is None and (response is not None or
+                                        not self._pending):
+                self.result = (loader, response)
+                self.done.set()
+
+
+class HedgePolicy(object):
+    """
+    Decides when to hedge a loader's request, and keeps the latencies which
+    that decision can be based on.
+
+    :param delay: The number of seconds to wait for a loader before hedging,
+                  or ``None`` to use the observed ``percentile`` of the
+                  latencies of its class.
+    :param percentile: The percentile of the latencies to wait for, if no
+                       ``delay`` is given.
+    :param min_samples: The number of latencies which must have been
+                        observed for a loader class before it is hedged
+                        based on them.
+    :param max_samples: The number of recent latencies kept for each loader
+                        class.
+
+    """
+    def __init__(self, delay=None, percentile=95, min_samples=20,
+                 max_samples=200):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, loader, latency):
+        """Adds a latency, in seconds, for ``loader``'s class."""
+        with self._lock:
+            samples = self._samples.get(type(loader))
+            if samples is None:
+                samples = self._samples[type(loader)] = deque(
+                    maxlen=self.max_samples)
+            samples.append(latency)
+
+    def get_delay(self, loader):
+        """
+        Returns the number of seconds to wait for ``loader`` before hedging,
+        or ``None`` if it shouldn't be hedged yet.
+
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            samples = list(self._samples.get(type(loader), ()))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return percentile(samples, self.percentile)
+
+    def _race(self, race, loader, alternative):
+        race.start(loader)
+        delay = self.get_delay(loader)
+        if delay is not None:
+            race.done.wait(delay)
+            if not race.done.is_set():
+                race.start(alternative)
+        if race.deadline is None:
+            race.done.wait()
+        else:
+            race.done.wait(max(0, race.deadline - time.time()))
+
+    def fetch_many(self, loaders, alternatives, fields, priority=None,
+                   deadline=None):
+        """
+        Makes the requests for ``loaders``, hedging each with the loader at
+        the same index of ``alternatives`` (unless that is ``None``), and
+        returns a list of ``(loader, response)`` tuples with the loaders
+        whose responses were used. As with
+        :func:`~vidscraper.fetch.fetch_many`, failed requests, and requests
+        which aren't finished by the ``deadline``, have a response of
+        ``None``.
+
+        """
+        results = [None] * len(loaders)
+        races = []
+        threads = []
+        plain = []
+        for i, (loader, alternative) in enumerate(zip(loaders,
+                                                      alternatives)):
+            if alternative is None:
+                plain.append(i)
+                continue
+            race = _Race(self, fields, priority, deadline)
+            thread = threading.Thread(target=self._race,
+                                      args=(race, loader, alternative))
+            thread.start()
+            races.append((i, race))
+            threads.append(thread)
+
+        responses = fetch_many(
+            [(loaders[i].get_url_for_fields(fields), loaders[i],
+              loaders[i].get_request_kwargs()) for i in plain], priority,
+            deadline)
+        for i, response in zip(plain, responses):
+            results[i] = (loaders[i], response)
+
+        for thread in threads:
+            thread.join()
+        for i, race in races:
+            results[i] = race.result or (loaders[i], None)
+        return results
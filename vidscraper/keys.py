@@ -0,0 +1,106 @@
+"""
+Pools of API keys. Any value in an ``api_keys`` dictionary can be a
+:class:`KeyPool` instead of a single key, to spread requests over several
+keys and to stop using quota-limited APIs once every key has used up its
+budget::
+
+    from vidscraper import auto_scrape
+    from vidscraper.keys import KeyPool
+
+    api_keys = {
+        'youtube_key': KeyPool(['key1', 'key2'], quota=10000),
+        # Vimeo needs a consumer key and secret, so its pool holds pairs.
+        'vimeo_key': KeyPool([('key1', 'secret1'), ('key2', 'secret2')]),
+    }
+    video = auto_scrape(url, api_keys=api_keys)
+
+Each request made with a key from a pool counts against that key. Loaders
+which would use up quota are only chosen by :meth:`.Video.get_best_loaders`
+when quota-free loaders can't provide the requested fields, and loaders
+whose pools are out of budget aren't chosen at all.
+
+"""
+import threading
+import time
+
+
+class KeyPool(object):
+    """
+    Rotates between ``keys``, always handing out the key which has been
+    used least in the current period.
+
+    :param quota: The number of requests which each key may make per
+                  ``period``, or ``None`` if they're unlimited.
+    :param period: The length of a quota period, in seconds. Periods start
+                   at midnight UTC for the default of one day.
+
+    """
+    def __init__(self, keys, quota=None, period=86400):
+        if not keys:
+            raise ValueError("A key pool needs at least one key.")
+        self.keys = list(keys)
+        self.quota = quota
+        self.period = period
+        self._period = None
+        self._usage = [0] * len(self.keys)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks can't be pickled, for example to send a loader to a parse
+        # pool.
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _reset(self, now):
+        current = int((time.time() if now is None else now) // self.period)
+        if current != self._period:
+            self._period = current
+            self._usage = [0] * len(self.keys)
+
+    def get(self, now=None):
+        """
+        Returns the least used key, and counts a use of it. If every key has
+        used up its quota, one is still returned, since the service may
+        accept some extra requests.
+
+        """
+        with self._lock:
+            self._reset(now)
+            i = min(xrange(len(self.keys)), key=self._usage.__getitem__)
+            self._usage[i] += 1
+            return self.keys[i]
+
+    def has_budget(self, now=None):
+        """Returns ``True`` if any key has quota left in this period."""
+        if self.quota is None:
+            return True
+        with self._lock:
+            self._reset(now)
+            return min(self._usage) < self.quota
+
+    def usage(self, now=None):
+        """
+        Returns a list of ``(key, count)`` tuples with the number of times
+        each key has been used in this period.
+
+        """
+        with self._lock:
+            self._reset(now)
+            return zip(self.keys, self._usage)
+
+
+def get_api_key(api_keys, name):
+    """
+    Returns the key called ``name`` in ``api_keys``, or ``None`` if there is
+    none. If the value is a :class:`KeyPool`, a key is taken from it.
+
+    """
+    value = api_keys.get(name)
+    if isinstance(value, KeyPool):
+        return value.get()
+    return value
@@ -0,0 +1,322 @@
+"""
+Per-host rate and concurrency limits for the requests made by loaders and
+iterators. Rate limiting is enabled by setting
+:data:`vidscraper.fetch.rate_limiter` to a :class:`RateLimiter`, and
+concurrency limits by setting :data:`vidscraper.fetch.concurrency_limiter`
+to a :class:`ConcurrencyLimiter`::
+
+    from vidscraper import fetch
+    from vidscraper.ratelimit import ConcurrencyLimiter, RateLimiter
+
+    fetch.rate_limiter = RateLimiter(default_rate=(5, 10))
+    fetch.concurrency_limiter = ConcurrencyLimiter(default_limit=4,
+                                                   max_requests=20)
+
+Every request which is actually sent (rather than answered from a cache or
+shared with an identical request) then waits for a token from its host's
+bucket. Buckets are shared by all threads; waiting is done with
+:func:`time.sleep`, so it also cooperates with gevent if it has patched the
+standard library, as :mod:`grequests` does.
+
+Requests which are waiting for a concurrency slot are served by priority:
+:func:`.auto_scrape` and :meth:`.Video.load` can be given
+:data:`INTERACTIVE` priority, so that a user who is waiting isn't stuck
+behind queued :data:`BACKGROUND` work such as feed pages.
+
+"""
+import threading
+import time
+
+from vidscraper.utils.http import get_host
+
+
+#: Request priorities. When requests are waiting for a
+#: :class:`ConcurrencyLimiter`, interactive requests (for example, for a user
+#: who is waiting on the result) go ahead of background requests.
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+
+class TokenBucket(object):
+    """
+    Allows an average of ``rate`` requests per second, with bursts of up to
+    ``burst`` requests.
+
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+        self._lock = threading.Lock()
+
+    def reserve(self, now=None):
+        """
+        Takes a token and returns the number of seconds to wait before using
+        it. Tokens are reserved in order, so waiting callers are served
+        first come, first served.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if self.updated is not None:
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class RateLimiter(object):
+    """
+    Keeps a :class:`TokenBucket` for each host. Rates are ``(rate, burst)``
+    tuples, as for :class:`TokenBucket`.
+
+    :param rates: A dictionary mapping hosts to rates. These override the
+                  :attr:`~.BaseSuite.rate_limits` of registered suites.
+    :param default_rate: The rate for hosts which have none, or ``None`` to
+                         leave them unlimited.
+    :param use_suite_defaults: Whether the :attr:`~.BaseSuite.rate_limits`
+                               of registered suites should be used.
+
+    """
+    def __init__(self, rates=None, default_rate=None,
+                 use_suite_defaults=True):
+        self.rates = {}
+        if use_suite_defaults:
+            # Avoid circular imports.
+            from vidscraper.suites import registry
+            for suite in registry.suites:
+                self.rates.update(suite.rate_limits)
+        if rates is not None:
+            self.rates.update(rates)
+        self.default_rate = default_rate
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, host):
+        """
+        Returns the bucket for ``host``, or ``None`` if it isn't limited.
+
+        """
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default_rate)
+                if rate is None:
+                    self._buckets[host] = None
+                else:
+                    self._buckets[host] = TokenBucket(*rate)
+            return self._buckets[host]
+
+    def reserve(self, url, now=None):
+        """
+        Takes a token for ``url``'s host and returns the number of seconds
+        to wait before sending the request.
+
+        """
+        host = get_host(url)
+        bucket = self.get_bucket(host)
+        delay = 0 if bucket is None else bucket.reserve(now)
+        with self._lock:
+            stats = self._stats.setdefault(host, {
+                'requests': 0,
+                'waited': 0,
+                'wait_time': 0.0,
+            })
+            stats['requests'] += 1
+            if delay > 0:
+                stats['waited'] += 1
+                stats['wait_time'] += delay
+        return delay
+
+    def wait(self, url):
+        """Blocks until a request for ``url`` may be sent."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def wait_many(self, urls):
+        """
+        Blocks until requests for all of ``urls`` may be sent, for example
+        in parallel.
+
+        """
+        delay = max([0] + [self.reserve(url) for url in urls])
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self):
+        """
+        Returns a dictionary mapping each host to a dictionary with the
+        number of ``requests`` made to it, the number which ``waited`` for a
+        token, and the total ``wait_time`` in seconds.
+
+        """
+        with self._lock:
+            return dict((host, dict(stats))
+                        for host, stats in self._stats.iteritems())
+
+
+def round_robin(urls):
+    """
+    Returns the indexes of ``urls`` in an order which takes one url from
+    each host in turn, so that hosts with many urls don't crowd out the
+    others. Urls for each host stay in their original order.
+
+    """
+    queues = {}
+    hosts = []
+    for i, url in enumerate(urls):
+        host = get_host(url)
+        if host not in queues:
+            queues[host] = []
+            hosts.append(host)
+        queues[host].append(i)
+    queues = [iter(queues[host]) for host in hosts]
+    order = []
+    while queues:
+        remaining = []
+        for queue in queues:
+            try:
+                order.append(queue.next())
+            except StopIteration:
+                continue
+            remaining.append(queue)
+        queues = remaining
+    return order
+
+
+class ConcurrencyLimiter(object):
+    """
+    Limits the number of requests in flight at once to each host, and in
+    total, across all threads. When requests have to wait for a slot,
+    :data:`INTERACTIVE` requests are given slots ahead of
+    :data:`BACKGROUND` requests, except that a waiting background request
+    gets a slot after every :attr:`max_interactive_streak` interactive ones,
+    so that background work is never starved. Requests of the same priority
+    are served in the order they arrived.
+
+    :param limits: A dictionary mapping hosts to their limits. These
+                   override the :attr:`~.BaseSuite.concurrency_limits` of
+                   registered suites.
+    :param default_limit: The limit for hosts which have none, or ``None``
+                          to leave them unlimited.
+    :param max_requests: The limit on requests to all hosts, or ``None``.
+    :param use_suite_defaults: Whether the
+                               :attr:`~.BaseSuite.concurrency_limits` of
+                               registered suites should be used.
+
+    """
+    #: The number of interactive requests which may be given slots in a row
+    #: while background requests are waiting.
+    max_interactive_streak = 4
+
+    def __init__(self, limits=None, default_limit=4, max_requests=None,
+                 use_suite_defaults=True):
+        self.limits = {}
+        if use_suite_defaults:
+            # Avoid circular imports.
+            from vidscraper.suites import registry
+            for suite in registry.suites:
+                self.limits.update(suite.concurrency_limits)
+        if limits is not None:
+            self.limits.update(limits)
+        self.default_limit = default_limit
+        self.max_requests = max_requests
+        self._in_flight = {}
+        self._total = 0
+        self._waiting = {INTERACTIVE: [], BACKGROUND: []}
+        self._interactive_streak = 0
+        self._condition = threading.Condition()
+
+    def _has_slot(self, host):
+        if self.max_requests is not None and self._total >= self.max_requests:
+            return False
+        limit = self.limits.get(host, self.default_limit)
+        return limit is None or self._in_flight.get(host, 0) < limit
+
+    def _first_ready(self, priority):
+        for waiter in self._waiting[priority]:
+            if self._has_slot(waiter[0]):
+                return waiter
+        return None
+
+    def _is_next(self, waiter, priority):
+        """
+        Returns ``True`` if ``waiter`` should get the next free slot.
+
+        """
+        if self._first_ready(priority) is not waiter:
+            return False
+        other = BACKGROUND if priority == INTERACTIVE else INTERACTIVE
+        if self._first_ready(other) is None:
+            return True
+        if priority == INTERACTIVE:
+            return self._interactive_streak < self.max_interactive_streak
+        return self._interactive_streak >= self.max_interactive_streak
+
+    def acquire(self, url, blocking=True, priority=BACKGROUND):
+        """
+        Takes a slot for a request to ``url``. Returns ``False`` if
+        ``blocking`` is ``False`` and no slot is free.
+
+        """
+        host = get_host(url)
+        waiter = [host]
+        with self._condition:
+            self._waiting[priority].append(waiter)
+            try:
+                while not self._is_next(waiter, priority):
+                    if not blocking:
+                        return False
+                    self._condition.wait()
+            finally:
+                self._waiting[priority].remove(waiter)
+            if priority == INTERACTIVE:
+                if self._waiting[BACKGROUND]:
+                    self._interactive_streak += 1
+            else:
+                self._interactive_streak = 0
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            self._total += 1
+            # Another waiter may be next now that this one is done.
+            self._condition.notify_all()
+            return True
+
+    def release(self, url):
+        """Frees the slot taken by :meth:`acquire` for ``url``."""
+        host = get_host(url)
+        with self._condition:
+            self._in_flight[host] -= 1
+            self._total -= 1
+            self._condition.notify_all()
+
+    def get_waves(self, urls, priority=BACKGROUND):
+        """
+        Splits the indexes of ``urls`` into groups which can be sent in
+        parallel, one after another, taking the slots for each group. Hosts
+        are served round-robin, so each group includes as many urls from
+        each host as its limit (and the total limit) allows. The slots for
+        each group must be released before the next group is requested.
+
+        """
+        pending = round_robin(urls)
+        while pending:
+            wave = []
+            rest = []
+            for i in pending:
+                if self.acquire(urls[i], blocking=False, priority=priority):
+                    wave.append(i)
+                else:
+                    rest.append(i)
+            if not wave:
+                # Every slot we need is taken by other threads, or promised
+                # to other waiters; wait for our turn.
+                self.acquire(urls[rest[0]], priority=priority)
+                wave.append(rest.pop(0))
+            yield wave
+            pending = rest
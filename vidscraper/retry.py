@@ -0,0 +1,187 @@
+"""
+Retries and circuit breakers for the requests made by loaders and
+iterators. They are enabled by setting :data:`vidscraper.fetch.retry_policy`
+to a :class:`RetryPolicy` and :data:`vidscraper.fetch.circuit_breakers` to
+a :class:`CircuitBreakers` instance::
+
+    from vidscraper import fetch
+    from vidscraper.retry import CircuitBreakers, RetryPolicy
+
+    fetch.retry_policy = RetryPolicy(max_attempts=3)
+    fetch.circuit_breakers = CircuitBreakers()
+
+Only transient failures are retried: connection errors, timeouts, and the
+response statuses in :attr:`RetryPolicy.retry_statuses`. The same failures
+count against a host's circuit breaker. While a host's circuit is open,
+requests to it fail immediately with :exc:`.CircuitOpen`, and
+:meth:`.Video.get_best_loaders` prefers loaders for other hosts.
+
+"""
+import random
+import threading
+import time
+
+from vidscraper.utils.http import get_host, parse_http_timestamp
+
+
+#: Response statuses which indicate that the server is overloaded or
+#: temporarily failing.
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy(object):
+    """
+    Retries transient failures up to ``max_attempts`` times in all, with
+    jittered exponential backoff: before retry ``n``, waits a random time of
+    up to ``base_delay * 2 ** n`` seconds, but no more than ``max_delay``.
+    A ``Retry-After`` header on the failed response is honoured instead, as
+    long as it asks for no more than ``max_delay`` seconds.
+
+    """
+    #: Response statuses which will be retried.
+    retry_statuses = TRANSIENT_STATUSES
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=30):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, response):
+        """
+        Returns ``True`` if ``response`` (or ``None``, if the request raised
+        a connection error or timed out) should be retried.
+
+        """
+        return response is None or response.status_code in self.retry_statuses
+
+    def get_retry_after(self, response, now=None):
+        """
+        Returns the number of seconds that ``response``'s ``Retry-After``
+        header asks for, or ``None``.
+
+        """
+        if response is None:
+            return None
+        value = response.headers.get('retry-after')
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        timestamp = parse_http_timestamp(value)
+        if timestamp is None:
+            return None
+        if now is None:
+            now = time.time()
+        return max(0, timestamp - now)
+
+    def get_delay(self, attempt, response=None):
+        """
+        Returns the number of seconds to wait before retrying a request
+        which has failed ``attempt`` times, with ``response``.
+
+        """
+        retry_after = self.get_retry_after(response)
+        if retry_after is not None and retry_after <= self.max_delay:
+            return retry_after
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """
+    Opens after ``failure_threshold`` failures in a row, so that requests
+    can fail fast instead of waiting on a host which is down. After
+    ``reset_timeout`` seconds, a single trial request is allowed through;
+    the circuit closes again if it succeeds and stays open otherwise.
+
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def is_open(self, now=None):
+        """
+        Returns ``True`` if requests would currently be rejected. A circuit
+        which is ready for a trial request isn't considered open.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self._trial:
+                return True
+            return now - self.opened_at < self.reset_timeout
+
+    def allow(self, now=None):
+        """
+        Returns ``True`` if a request may be sent. Callers which are allowed
+        through must report the outcome with :meth:`record`.
+
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or now - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, success, now=None):
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.opened_at = now
+
+
+class CircuitBreakers(object):
+    """
+    Keeps a :class:`CircuitBreaker` for each host, created with the given
+    arguments.
+
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns the breaker for ``url``'s host."""
+        host = get_host(url)
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold,
+                                                      self.reset_timeout)
+            return self._breakers[host]
+
+    def is_open(self, url, now=None):
+        return self.get(url).is_open(now)
+
+    def allow(self, url, now=None):
+        return self.get(url).allow(now)
+
+    def record(self, url, success, now=None):
+        self.get(url).record(success, now)
+
+    def open_hosts(self, now=None):
+        """Returns a list of the hosts whose circuits are open."""
+        with self._lock:
+            breakers = self._breakers.items()
+        return sorted(host for host, breaker in breakers
+                      if breaker.is_open(now))
@@ -0,0 +1,381 @@
+"""
+A scheduler for polling large numbers of feeds. Each feed's poll interval
+adapts to how often it publishes new videos and how often it is found to be
+unchanged, and feeds can be split across several nodes by consistent
+hashing of their urls.
+
+"""
+import bisect
+from datetime import datetime
+import hashlib
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+from vidscraper.suites import registry
+from vidscraper.utils.http import get_host, total_seconds
+from vidscraper.videos import _isoformat_to_datetime
+
+
+class HashRing(object):
+    """
+    Assigns keys (such as feed urls) to ``nodes`` by consistent hashing, so
+    that adding or removing a node only moves the keys of that node.
+
+    :param nodes: An iterable of node names.
+    :param replicas: The number of points each node has on the ring. More
+                     points spread keys more evenly.
+
+    """
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def _hash(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+    def add(self, node):
+        for i in xrange(self.replicas):
+            point = self._hash('{0}:{1}'.format(node, i))
+            self._nodes[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node):
+        for i in xrange(self.replicas):
+            point = self._hash('{0}:{1}'.format(node, i))
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._points.remove(point)
+
+    def get_node(self, key):
+        """Returns the node responsible for ``key``."""
+        if not self._points:
+            raise ValueError(u"The ring has no nodes.")
+        index = bisect.bisect(self._points, self._hash(key))
+        return self._nodes[self._points[index % len(self._points)]]
+
+
+class FeedState(object):
+    """
+    What the scheduler knows about a feed between polls. Instances can be
+    saved with :meth:`serialize` and restored with :meth:`deserialize`.
+
+    .. attribute:: url
+
+        The feed's url.
+
+    .. attribute:: etag
+    .. attribute:: last_modified
+
+        The feed's state as of the last poll, used for conditional requests.
+
+    .. attribute:: since_guid
+    .. attribute:: since_datetime
+
+        The feed's high-water mark as of the last poll.
+
+    .. attribute:: interval
+
+        The current number of seconds between polls.
+
+    .. attribute:: next_poll
+
+        The time (in seconds since the epoch) when the feed should next be
+        polled.
+
+    .. attribute:: unchanged_count
+
+        The number of polls in a row which found no new videos.
+
+    .. attribute:: publish_datetimes
+
+        The publish datetimes of the most recent videos seen.
+
+    """
+    _datetime_attrs = ('last_modified', 'since_datetime')
+
+    def __init__(self, url, etag=None, last_modified=None, since_guid=None,
+                 since_datetime=None, interval=None, next_poll=0,
+                 unchanged_count=0, publish_datetimes=None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.since_guid = since_guid
+        self.since_datetime = since_datetime
+        self.interval = interval
+        self.next_poll = next_poll
+        self.unchanged_count = unchanged_count
+        self.publish_datetimes = publish_datetimes or []
+
+    def serialize(self):
+        """Returns the state as a dictionary which can be stored as json."""
+        data = dict(self.__dict__)
+        for attr in self._datetime_attrs:
+            if isinstance(data[attr], datetime):
+                data[attr] = data[attr].isoformat()
+        data['publish_datetimes'] = [dt.isoformat()
+                                     for dt in self.publish_datetimes]
+        return data
+
+    @classmethod
+    def deserialize(cls, data):
+        """
+        Given a dictionary such as would be provided by :meth:`serialize`,
+        returns a :class:`FeedState`.
+
+        """
+        kwargs = dict((str(key), value) for key, value in data.iteritems())
+        for attr in cls._datetime_attrs:
+            if kwargs.get(attr) is not None:
+                kwargs[attr] = _isoformat_to_datetime(kwargs[attr])
+        kwargs['publish_datetimes'] = [
+            _isoformat_to_datetime(dt)
+            for dt in kwargs.get('publish_datetimes') or []]
+        return cls(**kwargs)
+
+
+class PollResult(object):
+    """
+    The outcome of polling a feed.
+
+    .. attribute:: state
+
+        The feed's :class:`FeedState`, after being updated.
+
+    .. attribute:: videos
+
+        A list of new :class:`.Video` instances, newest first. If several
+        entries are variants of the same video url (according to
+        :meth:`~.SuiteRegistry.canonical_key`), only the first is included.
+
+    .. attribute:: not_modified
+
+        ``True`` if the feed reported that it hadn't changed.
+
+    .. attribute:: error
+
+        The exception raised while polling the feed, or ``None``.
+
+    """
+    def __init__(self, state, videos=None, not_modified=False, error=None):
+        self.state = state
+        self.videos = videos or []
+        self.not_modified = not_modified
+        self.error = error
+
+
+class Scheduler(object):
+    """
+    Keeps track of a set of feeds and polls the ones which are due.
+
+    :param min_interval: The shortest time between polls of a feed, in
+                         seconds.
+    :param max_interval: The longest time between polls of a feed, in
+                         seconds.
+    :param max_workers: The number of feeds which can be polled at once.
+    :param max_per_host: The number of feeds from a single host which can be
+                         polled at once.
+    :param ring: A :class:`HashRing` used to split feeds between nodes. If
+                 this is given, only feeds assigned to ``node`` will be
+                 polled.
+    :param node: The name of the node this scheduler is running on.
+    :param video_fields: The video fields to load for new videos.
+    :param api_keys: A dictionary of API keys to use for all feeds.
+    :param first_poll_limit: The most videos to read from a feed the first
+                             time it is polled, so that adding a feed
+                             doesn't crawl its whole history. ``None`` means
+                             no limit.
+
+    """
+    #: The number of recent publish datetimes used to estimate a feed's
+    #: publishing cadence.
+    history_size = 10
+
+    #: How much a feed's poll interval grows each time it is found to be
+    #: unchanged.
+    backoff = 1.5
+
+    def __init__(self, min_interval=300, max_interval=86400, max_workers=10,
+                 max_per_host=2, ring=None, node=None, video_fields=None,
+                 api_keys=None, first_poll_limit=50):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.ring = ring
+        self.node = node
+        self.video_fields = video_fields
+        self.api_keys = api_keys
+        self.first_poll_limit = first_poll_limit
+        self.states = {}
+        self._host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def add(self, url_or_state):
+        """
+        Adds a feed, given its url or a :class:`FeedState`, and returns its
+        state. If the feed is already known, its existing state is returned.
+
+        """
+        if isinstance(url_or_state, FeedState):
+            state = url_or_state
+        else:
+            state = self.states.get(url_or_state) or FeedState(url_or_state)
+        if state.interval is None:
+            state.interval = self.min_interval
+        self.states[state.url] = state
+        return state
+
+    def remove(self, url):
+        self.states.pop(url, None)
+
+    def handles(self, url):
+        """Returns ``True`` if this node is responsible for ``url``."""
+        return self.ring is None or self.ring.get_node(url) == self.node
+
+    def due(self, now=None):
+        """
+        Returns a list of the states of feeds handled by this node which are
+        due to be polled, most overdue first.
+
+        """
+        if now is None:
+            now = time.time()
+        states = [state for state in self.states.itervalues()
+                  if state.next_poll <= now and self.handles(state.url)]
+        states.sort(key=lambda state: state.next_poll)
+        return states
+
+    def get_interval(self, state):
+        """
+        Returns the number of seconds until ``state``'s feed should be polled
+        again. This is based on the median time between its recent videos,
+        grown by :attr:`backoff` for each poll in a row which found nothing
+        new, and kept between :attr:`min_interval` and :attr:`max_interval`.
+
+        """
+        dts = sorted(state.publish_datetimes)
+        gaps = sorted(total_seconds(later - earlier)
+                      for earlier, later in zip(dts, dts[1:]))
+        if gaps:
+            interval = gaps[len(gaps) // 2]
+        else:
+            interval = self.min_interval
+        interval *= self.backoff ** state.unchanged_count
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _get_host_semaphore(self, url):
+        host = get_host(url)
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(
+                                                            self.max_per_host)
+            return self._host_semaphores[host]
+
+    def _read_feed(self, feed):
+        """
+        Returns a list of the new videos in ``feed``, without duplicates, and
+        a list of their publish datetimes. The datetimes are read from the
+        data the feed parsed to track new videos, so they are available even
+        if ``publish_datetime`` isn't one of :attr:`video_fields`.
+
+        """
+        seen = set()
+        videos = []
+        dts = []
+        for video in feed:
+            if video.url:
+                key = registry.canonical_key(video.url)
+                if key in seen:
+                    continue
+                seen.add(key)
+            videos.append(video)
+            publish_datetime = feed._last_video_data.get('publish_datetime')
+            if publish_datetime is not None:
+                dts.append(publish_datetime)
+        return videos, dts
+
+    def poll(self, state, now=None):
+        """
+        Polls the feed for ``state``, updates the state and returns a
+        :class:`PollResult`.
+
+        """
+        if now is None:
+            now = time.time()
+        result = PollResult(state)
+        dts = []
+        if state.since_guid is None and state.since_datetime is None:
+            max_results = self.first_poll_limit
+        else:
+            max_results = None
+        semaphore = self._get_host_semaphore(state.url)
+        semaphore.acquire()
+        try:
+            feed = registry.get_feed(state.url,
+                                     etag=state.etag,
+                                     last_modified=state.last_modified,
+                                     since_guid=state.since_guid,
+                                     since_datetime=state.since_datetime,
+                                     max_results=max_results,
+                                     video_fields=self.video_fields,
+                                     api_keys=self.api_keys)
+            feed.load()
+            result.videos, dts = self._read_feed(feed)
+            result.not_modified = feed.not_modified
+        except Exception, exc:
+            result.error = exc
+        else:
+            state.etag = feed.etag
+            state.last_modified = feed.last_modified
+            state.since_guid = feed.newest_guid
+            state.since_datetime = feed.newest_datetime
+        finally:
+            semaphore.release()
+
+        if dts:
+            state.publish_datetimes = sorted(
+                      state.publish_datetimes + dts)[-self.history_size:]
+        if result.videos:
+            state.unchanged_count = 0
+        else:
+            state.unchanged_count += 1
+        state.interval = self.get_interval(state)
+        state.next_poll = now + state.interval
+        return result
+
+    def run_once(self, now=None):
+        """
+        Polls every feed which is due, using up to :attr:`max_workers`
+        threads, and returns a list of :class:`PollResult`\ s.
+
+        """
+        if now is None:
+            now = time.time()
+        states = self.due(now)
+        if not states:
+            return []
+        pool = ThreadPool(min(self.max_workers, len(states)))
+        try:
+            return pool.map(lambda state: self.poll(state, now), states)
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self, callback, poll_interval=1):
+        """
+        Runs forever, passing each :class:`PollResult` to ``callback`` and
+        sleeping for ``poll_interval`` seconds whenever no feeds are due.
+
+        """
+        while True:
+            results = self.run_once()
+            for result in results:
+                callback(result)
+            if not results:
+                time.sleep(poll_interval)
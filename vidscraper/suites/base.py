@@ -1,6 +1,9 @@
 import operator
 import re
+import urlparse
 
+import vidscraper.fetch
+from vidscraper.cache import UNHANDLED_FEED, UNHANDLED_VIDEO, VIDEO_DELETED
 from vidscraper.exceptions import (UnhandledVideo, UnhandledFeed,
                                    UnhandledSearch)
 from vidscraper.videos import Video
@@ -9,6 +12,17 @@ from vidscraper.videos import Video
 RegexpPattern = type(re.compile(''))
 
 
+def _normalize_url(url):
+    """
+    Lowercases the scheme and host of ``url`` and strips its fragment, which
+    never reaches the server.
+
+    """
+    scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+    return urlparse.urlunsplit((scheme.lower(), netloc.lower(), path, query,
+                                ''))
+
+
 class SuiteRegistry(object):
     """
     A registry of suites. Suites may be registered, unregistered, and iterated
@@ -68,9 +82,19 @@ class SuiteRegistry(object):
                                 any additional data.
         :raises: :exc:`.UnhandledVideo` if ``require_loaders`` is ``True`` and
                  no registered suite returns a video for the given parameters.
+                 If a :data:`~vidscraper.fetch.negative_cache` is set, this
+                 (or :exc:`.VideoDeleted`) will also be raised if the url
+                 recently failed in that way.
         :returns: :class:`.Video` instance with no data loaded.
 
         """
+        negative_cache = vidscraper.fetch.negative_cache
+        if require_loaders and negative_cache is not None:
+            exc = negative_cache.get(url, (UNHANDLED_VIDEO, VIDEO_DELETED),
+                                     api_keys=api_keys)
+            if exc is not None:
+                raise exc
+
         for suite in self.suites:
             try:
                 return suite.get_video(url, fields=fields, api_keys=api_keys)
@@ -78,12 +102,16 @@ class SuiteRegistry(object):
                 pass
 
         if require_loaders:
+            if negative_cache is not None:
+                negative_cache.record(UNHANDLED_VIDEO, url,
+                                      api_keys=api_keys)
             raise UnhandledVideo(url)
 
         return Video(url, fields=fields)
 
     def get_feed(self, url, last_modified=None, etag=None, start_index=1,
-                 max_results=None, video_fields=None, api_keys=None):
+                 max_results=None, video_fields=None, api_keys=None,
+                 since_guid=None, since_datetime=None):
         """
         For each registered :mod:`suite <vidscraper.suites>`, calls
         :meth:`~BaseSuite.get_feed` with the given parameters, until a suite
@@ -93,9 +121,17 @@ class SuiteRegistry(object):
                   :attr:`~.BaseSuite.feed_class` with no data loaded.
 
         :raises: :exc:`.UnhandledFeed` if no registered suites know how
-                 to handle this url.
+                 to handle this url, or if the url recently failed in that
+                 way and a :data:`~vidscraper.fetch.negative_cache` is set.
 
         """
+        negative_cache = vidscraper.fetch.negative_cache
+        if negative_cache is not None:
+            exc = negative_cache.get(url, (UNHANDLED_FEED,),
+                                     api_keys=api_keys)
+            if exc is not None:
+                raise exc
+
         for suite in self.suites:
             try:
                 return suite.get_feed(url,
@@ -104,17 +140,38 @@ class SuiteRegistry(object):
                                       start_index=start_index,
                                       max_results=max_results,
                                       video_fields=video_fields,
-                                      api_keys=api_keys)
+                                      api_keys=api_keys,
+                                      since_guid=since_guid,
+                                      since_datetime=since_datetime)
             except UnhandledFeed:
                 pass
+        if negative_cache is not None:
+            negative_cache.record(UNHANDLED_FEED, url, api_keys=api_keys)
         raise UnhandledFeed(url)
 
 
+    def canonical_key(self, url):
+        """
+        Returns the :meth:`~BaseSuite.canonical_key` of the first registered
+        suite which has one for ``url``, or a normalized form of ``url`` if
+        none do. Urls with the same key are variants of the same video, and
+        can share cache entries and loads.
+
+        """
+        for suite in self.suites:
+            key = suite.canonical_key(url)
+            if key is not None:
+                return key
+        return _normalize_url(url)
+
     def get_searches(self, query, order_by='relevant', start_index=1,
-                     max_results=None, video_fields=None, api_keys=None):
+                     max_results=None, video_fields=None, api_keys=None,
+                     deadline=None):
         """
         For each registered :mod:`suite <vidscraper.suites>`, calls
-        :meth:`~.BaseSuite.get_search` with the given parameters.
+        :meth:`~.BaseSuite.get_search` with the given parameters. The
+        ``deadline``, if any, is set as each search's
+        :attr:`~.VideoIterator.deadline`.
 
         :returns: a list of iterators over search results for suites
                   which support the given parameters.
@@ -132,6 +189,7 @@ class SuiteRegistry(object):
             except UnhandledSearch:
                 pass
             else:
+                search.deadline = deadline
                 searches.append(search)
 
         return searches
@@ -208,6 +266,23 @@ class BaseSuite(object):
     #: this suite.
     search_class = None
 
+    #: Format strings which, paired with the :attr:`~.VideoLoader.url_data`
+    #: of one of the suite's loaders, return a key identifying the video.
+    #: The first format which can be filled is used.
+    #:
+    #: .. seealso:: :meth:`canonical_key`
+    canonical_key_formats = ()
+
+    #: A dictionary mapping the hosts which this suite's loaders and
+    #: iterators make requests to to default ``(rate, burst)`` limits, in
+    #: requests per second, for a :class:`~vidscraper.ratelimit.RateLimiter`.
+    rate_limits = {}
+
+    #: A dictionary mapping hosts to the default number of requests which a
+    #: :class:`~vidscraper.ratelimit.ConcurrencyLimiter` allows in flight
+    #: to each at once.
+    concurrency_limits = {}
+
     def __init__(self):
         if isinstance(self.video_regex, basestring):
             self.video_regex = re.compile(self.video_regex)
@@ -276,6 +351,29 @@ class BaseSuite(object):
             raise UnhandledVideo(url)
         return Video(url, loaders=loaders, fields=fields)
 
+    def canonical_key(self, url):
+        """
+        Returns a key which is the same for every url which this suite's
+        loaders would treat as the same video, based on the first of
+        :attr:`canonical_key_formats` which can be filled from a loader's
+        :attr:`~.VideoLoader.url_data`. Returns ``None`` if no loader handles
+        ``url`` or the suite has no key formats.
+
+        """
+        if not url or not self.canonical_key_formats:
+            return None
+        for cls in self.loader_classes:
+            try:
+                loader = cls(url)
+            except UnhandledVideo:
+                continue
+            for key_format in self.canonical_key_formats:
+                try:
+                    return key_format.format(**loader.url_data)
+                except KeyError:
+                    pass
+        return None
+
     def get_feed(self, url, *args, **kwargs):
         """
         Returns an instance of :attr:`feed_class`, which should be a subclass
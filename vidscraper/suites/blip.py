@@ -1,4 +1,3 @@
-from datetime import datetime
 import re
 import urlparse
 
@@ -8,6 +7,7 @@ from vidscraper.exceptions import UnhandledVideo, UnhandledFeed, InvalidVideo
 from vidscraper.suites import BaseSuite, registry
 from vidscraper.utils.feedparser import (get_entry_thumbnail_url,
                                          get_accepted_enclosures)
+from vidscraper.utils.timestamps import parse_timestamp
 from vidscraper.videos import (FeedparserFeed, FeedparserSearch,
                                VideoLoader, OEmbedLoaderMixin, VideoFile)
 
@@ -45,9 +45,11 @@ class ApiLoader(PathMixin, VideoLoader):
                   'embed_code', 'thumbnail_url', 'tags', 'publish_datetime',
                   'user', 'user_url', 'license'])
 
-    def get_video_data(self, response):
+    accepts_fields = True
+
+    def get_video_data(self, response, fields=None):
         parsed = feedparser.parse(response.text.encode('utf-8'))
-        return Suite.parse_feed_entry(parsed.entries[0])
+        return Suite.parse_feed_entry(parsed.entries[0], fields)
 
 
 class OEmbedLoader(OEmbedLoaderMixin, PathMixin, VideoLoader):
@@ -97,8 +99,10 @@ class Feed(FeedparserFeed):
         data['show_path'] = '{0}/'.format(show) if show is not None else ''
         return data
 
-    def get_video_data(self, item):
-        return Suite.parse_feed_entry(item)
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        return Suite.parse_feed_entry(item, fields)
 
 
 class Search(FeedparserSearch):
@@ -106,47 +110,64 @@ class Search(FeedparserSearch):
     # pagelen doesn't work with searches. Huh.
     per_page = 10
 
-    def get_video_data(self, item):
-        return Suite.parse_feed_entry(item)
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        return Suite.parse_feed_entry(item, fields)
 
 
 class Suite(BaseSuite):
     loader_classes = (OEmbedLoader, ApiLoader)
+    # Old /file/ urls use item ids, which aren't the same as post ids.
+    canonical_key_formats = ('blip:{post_id}', 'blip:file:{item_id}')
     feed_class = Feed
     search_class = Search
 
     @staticmethod
-    def parse_feed_entry(entry):
+    def parse_feed_entry(entry, fields=None):
         """
         Parses a feedparser entry from a blip rss feed into a dictionary
         mapping :class:`.Video` fields to values. This is used for blip feeds
         and blip API requests (since those can also be done with feeds.)
 
+        If ``fields`` is given, only those fields will be parsed.
+
         """
         if 'blip_puredescription' not in entry:
             raise InvalidVideo
-        files = [VideoFile(url=enclosure.get('url'),
-                           mime_type=enclosure.get('type'),
-                           length=(enclosure.get('filesize') or
-                                   enclosure.get('length')))
-                 for enclosure in get_accepted_enclosures(entry)]
-
-        data = {
-            'guid': entry['id'],
-            'link': entry['link'],
-            'title': entry['title'],
-            'description': entry['blip_puredescription'],
-            'files': files,
-            'embed_code': entry['media_player']['content'],
-            'publish_datetime': datetime.strptime(entry['blip_datestamp'],
-                                                  "%Y-%m-%dT%H:%M:%SZ"),
-            'thumbnail_url': get_entry_thumbnail_url(entry),
-            'tags': [tag['term'] for tag in entry['tags']
-                     if tag['scheme'] is None][1:],
-            'user': entry['blip_safeusername'],
-            'user_url': entry['blip_showpage']
-        }
-        if 'license' in entry:
+        if fields is None:
+            fields = ApiLoader.fields
+
+        data = {}
+        if 'guid' in fields:
+            data['guid'] = entry['id']
+        if 'link' in fields:
+            data['link'] = entry['link']
+        if 'title' in fields:
+            data['title'] = entry['title']
+        if 'description' in fields:
+            data['description'] = entry['blip_puredescription']
+        if 'files' in fields:
+            data['files'] = [VideoFile(url=enclosure.get('url'),
+                                       mime_type=enclosure.get('type'),
+                                       length=(enclosure.get('filesize') or
+                                               enclosure.get('length')))
+                             for enclosure in get_accepted_enclosures(entry)]
+        if 'embed_code' in fields:
+            data['embed_code'] = entry['media_player']['content']
+        if 'publish_datetime' in fields:
+            data['publish_datetime'] = parse_timestamp(
+                                entry['blip_datestamp'], "%Y-%m-%dT%H:%M:%SZ")
+        if 'thumbnail_url' in fields:
+            data['thumbnail_url'] = get_entry_thumbnail_url(entry)
+        if 'tags' in fields:
+            data['tags'] = [tag['term'] for tag in entry['tags']
+                            if tag['scheme'] is None][1:]
+        if 'user' in fields:
+            data['user'] = entry['blip_safeusername']
+        if 'user_url' in fields:
+            data['user_url'] = entry['blip_showpage']
+        if 'license' in fields and 'license' in entry:
             data['license'] = entry['license']
         return data
 
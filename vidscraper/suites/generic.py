@@ -21,61 +21,84 @@ class Feed(FeedparserFeed):
             raise StopIteration
         super(Feed, self)._next_page()
 
-    def get_video_data(self, item):
-        if item.get('published_parsed'):
-            best_date = struct_time_to_datetime(item['published_parsed'])
-        elif item.get('updated_parsed'):
-            best_date = struct_time_to_datetime(item['updated_parsed'])
-        else:
-            best_date = None
-
-        link = item.get('link')
-        if 'links' in item:
-            for possible_link in item.links:
-                if possible_link.get('rel') == 'via':
-                    # original URL
-                    link = possible_link['href']
-                    break
-        if ('content' in item and item['content'] and
-            item['content'][0]['value']): # Atom
-            description = item['content'][0]['value']
-        else:
-            description = item.get('summary', '')
-
-        files = [VideoFile(url=enclosure.get('url'),
-                           mime_type=enclosure.get('type'),
-                           length=(enclosure.get('filesize') or
-                                   enclosure.get('length')))
-                 for enclosure in get_accepted_enclosures(item)]
-
-        embed_code = None
-        if 'media_player' in item:
-            player = item['media_player']
-            if player.get('content'):
-                embed_code = convert_entities(player['content'])
-            elif 'url' in player:
-                files.append(VideoFile(
-                                     url=player['url'],
-                                     mime_type=player.get('type')))
-        if not files:
-            files = None
-        if 'media_license' in item:
-            license = item['media_license']['href']
-        else:
-            license = item.get('license')
-        return {
-            'link': link,
-            'title': convert_entities(item.get('title', '')),
-            'description': description,
-            'thumbnail_url': get_entry_thumbnail_url(item),
-            'files': files,
-            'publish_datetime': best_date,
-            'guid': item.get('id'),
-            'embed_code': embed_code,
-            'tags': [tag['term'] for tag in item['tags']
-                     if tag['scheme'] is None] if 'tags' in item else None,
-            'license': license
-        }
+    #: The video fields which :meth:`get_video_data` can provide.
+    provided_fields = set(['link', 'title', 'description',
+                                 'thumbnail_url', 'files', 'publish_datetime',
+                                 'guid', 'embed_code', 'tags', 'license'])
+
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        if fields is None:
+            fields = self.provided_fields
+        data = {}
+
+        if 'publish_datetime' in fields:
+            if item.get('published_parsed'):
+                best_date = struct_time_to_datetime(item['published_parsed'])
+            elif item.get('updated_parsed'):
+                best_date = struct_time_to_datetime(item['updated_parsed'])
+            else:
+                best_date = None
+            data['publish_datetime'] = best_date
+
+        if 'link' in fields:
+            link = item.get('link')
+            if 'links' in item:
+                for possible_link in item.links:
+                    if possible_link.get('rel') == 'via':
+                        # original URL
+                        link = possible_link['href']
+                        break
+            data['link'] = link
+
+        if 'description' in fields:
+            if ('content' in item and item['content'] and
+                item['content'][0]['value']): # Atom
+                description = item['content'][0]['value']
+            else:
+                description = item.get('summary', '')
+            data['description'] = description
+
+        if 'files' in fields or 'embed_code' in fields:
+            files = [VideoFile(url=enclosure.get('url'),
+                               mime_type=enclosure.get('type'),
+                               length=(enclosure.get('filesize') or
+                                       enclosure.get('length')))
+                     for enclosure in get_accepted_enclosures(item)]
+
+            embed_code = None
+            if 'media_player' in item:
+                player = item['media_player']
+                if player.get('content'):
+                    embed_code = convert_entities(player['content'])
+                elif 'url' in player:
+                    files.append(VideoFile(
+                                         url=player['url'],
+                                         mime_type=player.get('type')))
+            if not files:
+                files = None
+            data['files'] = files
+            data['embed_code'] = embed_code
+
+        if 'license' in fields:
+            if 'media_license' in item:
+                license = item['media_license']['href']
+            else:
+                license = item.get('license')
+            data['license'] = license
+
+        if 'title' in fields:
+            data['title'] = convert_entities(item.get('title', ''))
+        if 'thumbnail_url' in fields:
+            data['thumbnail_url'] = get_entry_thumbnail_url(item)
+        if 'guid' in fields:
+            data['guid'] = item.get('id')
+        if 'tags' in fields:
+            data['tags'] = ([tag['term'] for tag in item['tags']
+                             if tag['scheme'] is None]
+                            if 'tags' in item else None)
+        return data
 
 
 class Suite(BaseSuite):
@@ -1,10 +1,11 @@
-import datetime
 import json
 import re
 import urlparse
 
 from vidscraper.exceptions import UnhandledVideo
+from vidscraper.keys import KeyPool
 from vidscraper.suites import BaseSuite, registry
+from vidscraper.utils.timestamps import parse_timestamp
 from vidscraper.videos import VideoLoader, OEmbedLoaderMixin
 
 
@@ -26,20 +27,35 @@ class ApiLoader(PathMixin, VideoLoader):
                   'thumbnail_url', 'publish_date', 'tags', 'user',
                   'user_url'])
 
-    url_format = u'http://api.ustream.tv/json/video/{id}/getInfo/?key={ustream_key}'
+    url_format = u'http://api.ustream.tv/json/video/{id}/getInfo/'
+
+    api_key_names = ('ustream_key',)
 
     def get_url_data(self, url):
         if 'ustream_key' not in self.api_keys:
             raise UnhandledVideo(url)
-        data = super(ApiLoader, self).get_url_data(url)
-        data.update(self.api_keys)
-        return data
+        return super(ApiLoader, self).get_url_data(url)
+
+    def get_url(self):
+        url = super(ApiLoader, self).get_url()
+        key = self.api_keys['ustream_key']
+        if isinstance(key, KeyPool):
+            # Keys from a pool are only taken when a request is sent, since
+            # each use counts against them.
+            return url
+        return u'{0}?key={1}'.format(url, key)
+
+    def prepare_request(self, url, kwargs):
+        key = self.api_keys['ustream_key']
+        if isinstance(key, KeyPool):
+            url = u'{0}?key={1}'.format(url, key.get())
+        return super(ApiLoader, self).prepare_request(url, kwargs)
 
     def get_video_data(self, response):
         parsed = json.loads(response.text)['results']
         url = parsed['embedTagSourceUrl']
-        publish_date = datetime.datetime.strptime(parsed['createdAt'],
-                                                 '%Y-%m-%d %H:%M:%S')
+        publish_date = parse_timestamp(parsed['createdAt'],
+                                       '%Y-%m-%d %H:%M:%S')
         data = {
             'link': parsed['url'],
             'title': parsed['title'],
@@ -63,6 +79,7 @@ class Suite(BaseSuite):
     """Suite for fetching data on ustream videos."""
     # TODO: Ustream has feeds and search functionality - add support for that!
     loader_classes = (OEmbedLoader, ApiLoader)
+    canonical_key_formats = ('ustream:{id}',)
 
 
 registry.register(Suite)
@@ -1,6 +1,5 @@
 from __future__ import unicode_literals
 
-import datetime
 import re
 import urlparse
 import warnings
@@ -9,11 +8,13 @@ try:
     import oauth_hook
 except ImportError:
     oauth_hook = None
-import requests
 
 from vidscraper.exceptions import (VideoDeleted, UnhandledVideo,
                                    UnhandledFeed, UnhandledSearch)
+from vidscraper.fetch import fetch
+from vidscraper.keys import KeyPool, get_api_key
 from vidscraper.suites import BaseSuite, registry
+from vidscraper.utils.timestamps import parse_timestamp
 from vidscraper.videos import (BaseFeed, BaseSearch, VideoLoader,
                                OEmbedLoaderMixin)
 
@@ -35,23 +36,53 @@ class PathMixin(object):
 
 class AdvancedApiMixin(object):
     """
-    Provides some common functionality for the vimeo advanced API.
+    Provides some common functionality for the vimeo advanced API. The
+    ``vimeo_key`` may be a :class:`~vidscraper.keys.KeyPool` of ``(key,
+    secret)`` pairs, in which case no ``vimeo_secret`` is needed.
 
     """
+    api_key_names = ('vimeo_key', 'vimeo_secret')
+
+    #: Fields which can be parsed from the advanced API's summary
+    #: responses. Any other fields require a full response.
+    summary_fields = set(['title', 'link', 'guid', 'publish_datetime',
+                          'flash_enclosure_url'])
+
+    def get_response_level(self, fields):
+        """
+        Returns the name of the advanced API parameter which requests the
+        smallest response that still contains the given ``fields``. The
+        advanced API doesn't support selecting individual fields, but it
+        does support smaller responses.
+
+        """
+        if fields is not None and fields <= self.summary_fields:
+            return 'summary_response'
+        return 'full_response'
+
     def is_available(self):
         return ('vimeo_key' in self.api_keys and
-                'vimeo_secret' in self.api_keys and
+                ('vimeo_secret' in self.api_keys or
+                 isinstance(self.api_keys['vimeo_key'], KeyPool)) and
                 oauth_hook is not None)
 
-    def get_request_kwargs(self):
-        hook = oauth_hook.OAuthHook(consumer_key=self.api_keys['vimeo_key'],
-                                consumer_secret=self.api_keys['vimeo_secret'],
-                                header_auth=True)
-        kwargs = super(AdvancedApiMixin, self).get_request_kwargs()
+    def prepare_request(self, url, kwargs):
+        url, kwargs = super(AdvancedApiMixin, self).prepare_request(url,
+                                                                    kwargs)
+        key = get_api_key(self.api_keys, 'vimeo_key')
+        if isinstance(key, tuple):
+            key, secret = key
+        else:
+            secret = self.api_keys['vimeo_secret']
+        hook = oauth_hook.OAuthHook(consumer_key=key, consumer_secret=secret,
+                                    header_auth=True)
+        kwargs = kwargs.copy()
         kwargs['hooks'] = {'pre_request': hook}
-        return kwargs
+        return url, kwargs
+
+    accepts_fields = True
 
-    def get_video_data(self, item):
+    def get_video_data(self, item, fields=None):
         # TODO: items have an embed_privacy key. What is this? Should
         # vidscraper return that information? Doesn't youtube have something
         # similar?
@@ -60,21 +91,34 @@ class AdvancedApiMixin(object):
             link = [u['_content'] for u in item['urls']['url']
                     if u['type'] == 'video'][0]
             raise VideoDeleted(link)
-        data = {
-            'title': item['title'],
-            'link': [u['_content'] for u in item['urls']['url']
-                    if u['type'] == 'video'][0],
-            'description': item['description'],
-            'thumbnail_url': item['thumbnails']['thumbnail'][2]['_content'],
-            'user': item['owner']['realname'],
-            'user_url': item['owner']['profileurl'],
-            'publish_datetime': datetime.datetime.strptime(
-                    item['upload_date'], '%Y-%m-%d %H:%M:%S'),
-            'tags': [t['_content']
-                            for t in item.get('tags', {}).get('tag', [])],
-            'flash_enclosure_url': Suite.video_flash_enclosure(item['id']),
-            'guid': Suite.video_guid(item['upload_date'], item['id']),
-        }
+        if fields is None:
+            fields = AdvancedLoader.fields
+        data = {}
+        if 'title' in fields:
+            data['title'] = item['title']
+        if 'link' in fields:
+            data['link'] = [u['_content'] for u in item['urls']['url']
+                            if u['type'] == 'video'][0]
+        if 'description' in fields:
+            data['description'] = item['description']
+        if 'thumbnail_url' in fields:
+            data['thumbnail_url'] = item['thumbnails']['thumbnail'][2][
+                                                                   '_content']
+        if 'user' in fields:
+            data['user'] = item['owner']['realname']
+        if 'user_url' in fields:
+            data['user_url'] = item['owner']['profileurl']
+        if 'publish_datetime' in fields:
+            data['publish_datetime'] = parse_timestamp(
+                    item['upload_date'], '%Y-%m-%d %H:%M:%S')
+        if 'tags' in fields:
+            data['tags'] = [t['_content']
+                            for t in item.get('tags', {}).get('tag', [])]
+        if 'flash_enclosure_url' in fields:
+            data['flash_enclosure_url'] = Suite.video_flash_enclosure(
+                                                                   item['id'])
+        if 'guid' in fields:
+            data['guid'] = Suite.video_guid(item['upload_date'], item['id'])
         return data
 
 
@@ -90,15 +134,17 @@ class SimpleLoader(PathMixin, VideoLoader):
 
     url_format = u"http://vimeo.com/api/v2/video/{video_id}.json"
 
-    def get_video_data(self, response):
-        return Suite.simple_api_video_to_data(response.json()[0])
+    accepts_fields = True
+
+    def get_video_data(self, response, fields=None):
+        return Suite.simple_api_video_to_data(response.json()[0], fields)
 
 
 class AdvancedLoader(AdvancedApiMixin, PathMixin, VideoLoader):
     fields = set(['title', 'link', 'description', 'thumbnail_url', 'user',
                   'user_url', 'publish_datetime', 'tags', 'guid',
                   'flash_enclosure_url'])
-    url_format = (u"http://vimeo.com/api/rest/v2?format=json&full_response=1&"
+    url_format = (u"http://vimeo.com/api/rest/v2?format=json&{response_level}=1&"
                   u"method=vimeo.videos.getInfo&video_id={video_id}")
 
     def get_url_data(self, url):
@@ -106,9 +152,18 @@ class AdvancedLoader(AdvancedApiMixin, PathMixin, VideoLoader):
             raise UnhandledVideo(url)
         return super(AdvancedLoader, self).get_url_data(url)
 
-    def get_video_data(self, response):
+    def get_url(self):
+        return self.get_url_for_fields(None)
+
+    def get_url_for_fields(self, fields):
+        return self.url_format.format(
+                               response_level=self.get_response_level(fields),
+                               **self.url_data)
+
+    def get_video_data(self, response, fields=None):
         return AdvancedApiMixin.get_video_data(self,
-                                               response.json()['video'][0])
+                                               response.json()['video'][0],
+                                               fields)
 
 
 class SimpleFeed(BaseFeed):
@@ -202,8 +257,10 @@ class SimpleFeed(BaseFeed):
             return []
         return response.json()
 
-    def get_video_data(self, item):
-        return Suite.simple_api_video_to_data(item)
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        return Suite.simple_api_video_to_data(item, fields)
 
     def load(self):
         """
@@ -214,14 +271,13 @@ class SimpleFeed(BaseFeed):
         if not self._loaded:
             url = self.info_url_format.format(
                                     api_path=self.get_api_path(self.url_data))
-            response = requests.get(url)
+            response = fetch(url, self)
             data = self.data_from_response(response)
 
             if self._response is None:
                 self._next_page()
 
-            data['etag'] = self._response.headers['etag']
-
+            # The feed's etag is updated from the page response.
             self._apply(data)
             self._loaded = True
 
@@ -304,10 +360,17 @@ class AdvancedIteratorMixin(AdvancedApiMixin):
     Vimeo's advanced API.
 
     """
-    page_url_format = (u"http://vimeo.com/api/rest/v2?format=json&full_response=1&per_page=50&"
+    page_url_format = (u"http://vimeo.com/api/rest/v2?format=json&{response_level}=1&per_page=50&"
                        u"method=vimeo.{method}&sort={sort}&page={page}&{method_params}")
     per_page = 50
 
+    def get_page_url_data(self, *args, **kwargs):
+        data = super(AdvancedIteratorMixin, self).get_page_url_data(*args,
+                                                                   **kwargs)
+        data['response_level'] = self.get_response_level(
+                                                  self.get_requested_fields())
+        return data
+
     def data_from_response(self, response):
         response_json = response.json()
         # Advanced api doesn't have etags, but it does have explicit
@@ -429,14 +492,15 @@ class AdvancedFeed(AdvancedIteratorMixin, SimpleFeed):
         if not self._loaded:
             url = self.info_url_format.format(
                                     api_path=self.get_api_path(self.url_data))
-            response = requests.get(url)
+            response = fetch(url, self)
             data = SimpleFeed.data_from_response(self, response)
 
             if self._response is None:
                 self._next_page()
 
-            data.update(
-                AdvancedIteratorMixin.data_from_response(self,
+            if not self.not_modified:
+                data.update(
+                    AdvancedIteratorMixin.data_from_response(self,
                                                               self._response))
             self._apply(data)
             self._loaded = True
@@ -449,6 +513,13 @@ class Suite(BaseSuite):
 
     """
     loader_classes = (OEmbedLoader, AdvancedLoader, SimpleLoader)
+    canonical_key_formats = ('vimeo:{video_id}',)
+    rate_limits = {
+        'vimeo.com': (2, 5),
+    }
+    concurrency_limits = {
+        'vimeo.com': 4,
+    }
     search_class = Search
 
     def get_feed(self, url, *args, **kwargs):
@@ -467,25 +538,40 @@ class Suite(BaseSuite):
                                                video_id)
 
     @classmethod
-    def simple_api_video_to_data(cls, api_video):
+    def simple_api_video_to_data(cls, api_video, fields=None):
         """
         Takes a video dictionary from a vimeo API response and returns a
-        dictionary mapping field names to values.
+        dictionary mapping field names to values. If ``fields`` is given, only
+        those fields will be included.
 
         """
-        data = {
-            'title': api_video['title'],
-            'link': api_video['url'],
-            'description': api_video['description'],
-            'thumbnail_url': api_video['thumbnail_large'],
-            'user': api_video['user_name'],
-            'user_url': api_video['user_url'],
-            'publish_datetime': datetime.datetime.strptime(
-                api_video['upload_date'], '%Y-%m-%d %H:%M:%S'),
-            'tags': [tag for tag in api_video['tags'].split(', ') if tag],
-            'flash_enclosure_url': cls.video_flash_enclosure(api_video['id']),
-            'guid': cls.video_guid(api_video['upload_date'], api_video['id'])
-        }
+        if fields is None:
+            fields = SimpleLoader.fields
+        data = {}
+        if 'title' in fields:
+            data['title'] = api_video['title']
+        if 'link' in fields:
+            data['link'] = api_video['url']
+        if 'description' in fields:
+            data['description'] = api_video['description']
+        if 'thumbnail_url' in fields:
+            data['thumbnail_url'] = api_video['thumbnail_large']
+        if 'user' in fields:
+            data['user'] = api_video['user_name']
+        if 'user_url' in fields:
+            data['user_url'] = api_video['user_url']
+        if 'publish_datetime' in fields:
+            data['publish_datetime'] = parse_timestamp(
+                api_video['upload_date'], '%Y-%m-%d %H:%M:%S')
+        if 'tags' in fields:
+            data['tags'] = [tag for tag in api_video['tags'].split(', ')
+                            if tag]
+        if 'flash_enclosure_url' in fields:
+            data['flash_enclosure_url'] = cls.video_flash_enclosure(
+                                                             api_video['id'])
+        if 'guid' in fields:
+            data['guid'] = cls.video_guid(api_video['upload_date'],
+                                          api_video['id'])
         return data
 
 
@@ -1,4 +1,3 @@
-from datetime import datetime
 import json
 import re
 import time
@@ -15,8 +14,10 @@ feedparser._FeedParserMixin.namespaces[
 import requests
 
 from vidscraper.exceptions import UnhandledVideo, UnhandledFeed
+from vidscraper.keys import KeyPool
 from vidscraper.suites import BaseSuite, registry
 from vidscraper.utils.feedparser import struct_time_to_datetime
+from vidscraper.utils.timestamps import parse_timestamp
 from vidscraper.videos import (BaseFeed, BaseSearch, VideoLoader,
                                OEmbedLoaderMixin, VideoFile)
 
@@ -26,6 +27,78 @@ from vidscraper.videos import (BaseFeed, BaseSearch, VideoLoader,
 # * https://developers.google.com/youtube/2.0/reference
 
 
+def _parse_video_info(body, keys):
+    """
+    Returns a dictionary mapping each of the given ``keys`` which is present
+    in the urlencoded ``body`` to its (first) decoded value. Unlike
+    :func:`urlparse.parse_qs`, values for other keys are never decoded.
+
+    """
+    params = {}
+    for pair in body.split('&'):
+        key, sep, value = pair.partition('=')
+        if key in keys and key not in params and sep:
+            params[key] = urllib.unquote_plus(value)
+            if len(params) == len(keys):
+                break
+    return params
+
+
+def _parse_stream_map(stream_map, codes):
+    """
+    Parses a ``url_encoded_fmt_stream_map`` value from a get_video_info
+    response into a dictionary mapping format codes (itags) to ``(url,
+    expires)`` tuples, where ``url`` has its signature attached. Only entries
+    whose itag is in ``codes`` are decoded, and parsing stops as soon as
+    every code has been found.
+
+    """
+    wanted = set(codes)
+    found = {}
+    for entry in stream_map.split(','):
+        params = entry.split('&')
+        for param in params:
+            if param.startswith('itag='):
+                itag = param[5:]
+                break
+        else:
+            continue
+        if itag not in wanted or itag in found:
+            continue
+
+        url = sig = None
+        for param in params:
+            if param.startswith('url='):
+                url = urllib.unquote_plus(param[4:])
+            elif param.startswith('sig='):
+                sig = param[4:]
+        if url is None:
+            continue
+
+        # The file url's query is already encoded; only the signature needs
+        # to be attached, so keep the rest of the url as-is.
+        base, _, query = url.partition('?')
+        url_params = [p for p in query.split('&')
+                      if p and not p.startswith('signature=')]
+        expires = None
+        for param in url_params:
+            if param.startswith('expire='):
+                expires = struct_time_to_datetime(
+                                           time.gmtime(int(param[7:])))
+                break
+        if sig is not None:
+            url_params.append('signature=' + sig)
+        found[itag] = (base + '?' + '&'.join(url_params), expires)
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def _quote_selector(selector):
+    """Quotes a partial response selector for use in a query string."""
+    return urllib.quote(selector.encode('utf-8'), safe=',:()@')
+
+
 class PathMixin(object):
     short_path_re = re.compile(r"^/(?P<video_id>[\w-]+)/?$")
 
@@ -49,57 +122,124 @@ class PathMixin(object):
 
 
 class ApiMixin(object):
+    api_key_names = ('youtube_key',)
+
+    #: Maps video fields to the elements of a GData entry which are needed
+    #: to parse them. Elements in the media namespace are children of the
+    #: entry's ``media:group``.
+    field_elements = {
+        'link': ('link',),
+        'title': ('title',),
+        'description': ('media:description',),
+        'thumbnail_url': ('media:thumbnail',),
+        'publish_datetime': ('published', 'updated'),
+        'tags': ('media:keywords', 'media:category'),
+        'user': ('author',),
+        'user_url': ('author',),
+        'guid': ('id',),
+        'license': ('media:license',),
+        'flash_enclosure_url': ('media:player',),
+    }
+
+    def get_fields_selector(self, fields):
+        """
+        Returns a GData partial response selector for the parts of an entry
+        which are needed to parse the given ``fields``, or ``None`` if the
+        full entry should be fetched.
+
+        .. seealso:: https://developers.google.com/youtube/2.0/developers_guide_protocol_partial
+
+        """
+        if fields is None:
+            return None
+        elements = set()
+        for field in fields:
+            elements.update(self.field_elements.get(field, ()))
+        if not elements:
+            return None
+        media = sorted(e for e in elements if e.startswith('media:'))
+        selector = sorted(e for e in elements if not e.startswith('media:'))
+        if media:
+            selector.append('media:group({0})'.format(','.join(media)))
+        return ','.join(selector)
+
     def get_headers(self):
         headers = super(ApiMixin, self).get_headers()
-        if 'youtube_key' in self.api_keys:
-            headers['X-GData-Key'] = "key=" + self.api_keys['youtube_key']
+        key = self.api_keys.get('youtube_key')
+        if key is not None and not isinstance(key, KeyPool):
+            headers['X-GData-Key'] = "key=" + key
         return headers
 
-    def get_video_data(self, item):
-        username = item['author'][0]['uri']['$t'].rsplit('/', 1)[-1]
-        if 'published' in item:
-            date_key = 'published'
-        else:
-            date_key = 'updated'
-
-        media_group = item['media$group']
-        description = media_group['media$description']
-        if description['type'] != 'plain':
-            # HTML-ified description. SB: Is this correct? Added in
-            # 5ca9e928 originally.
-            soup = BeautifulSoup(description['$t']).findAll('span')[0]
-            description = unicode(soup.string)
-        else:
-            description = description['$t']
-
-        thumbnail_url = None
-        for thumbnail in media_group['media$thumbnail']:
-            if thumbnail_url is None and thumbnail['yt$name'] == 'default':
-                thumbnail_url = thumbnail['url']
-            if thumbnail['yt$name'] == 'hqdefault':
-                thumbnail_url = thumbnail['url']
-                break
-        if '$t' in media_group['media$keywords']:
-            tags = media_group['media$keywords']['$t'].split(', ')
-        else:
-            tags = []
-        tags.extend(
-            [cat['$t'] for cat in media_group['media$category']])
-        data = {
-            'link': item['link'][0]['href'].split('&', 1)[0],
-            'title': item['title']['$t'],
-            'description': description.replace('\r', ''),
-            'thumbnail_url': thumbnail_url,
-            'publish_datetime': datetime.strptime(item[date_key]['$t'],
-                                                  "%Y-%m-%dT%H:%M:%S.000Z"),
-            'tags': tags,
-            'user': username,
-            'user_url': u'http://www.youtube.com/user/{0}'.format(username),
-            'guid' : 'http://gdata.youtube.com/feeds/api/videos/{0}'.format(
-                        item['id']['$t'].split(':')[-1]),
-            'license': media_group['media$license']['href'],
-            'flash_enclosure_url': media_group['media$player']['url']
-        }
+    def prepare_request(self, url, kwargs):
+        url, kwargs = super(ApiMixin, self).prepare_request(url, kwargs)
+        pool = self.api_keys.get('youtube_key')
+        if isinstance(pool, KeyPool):
+            # Keys from a pool are only taken when a request is sent, since
+            # each use counts against them.
+            kwargs = kwargs.copy()
+            kwargs['headers'] = dict(kwargs.get('headers') or {})
+            kwargs['headers']['X-GData-Key'] = "key=" + pool.get()
+        return url, kwargs
+
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        if fields is None:
+            fields = ApiLoader.fields
+        data = {}
+        media_group = item.get('media$group', {})
+
+        if 'link' in fields:
+            data['link'] = item['link'][0]['href'].split('&', 1)[0]
+        if 'title' in fields:
+            data['title'] = item['title']['$t']
+        if 'description' in fields:
+            description = media_group['media$description']
+            if description['type'] != 'plain':
+                # HTML-ified description. SB: Is this correct? Added in
+                # 5ca9e928 originally.
+                soup = BeautifulSoup(description['$t']).findAll('span')[0]
+                description = unicode(soup.string)
+            else:
+                description = description['$t']
+            data['description'] = description.replace('\r', '')
+        if 'thumbnail_url' in fields:
+            thumbnail_url = None
+            for thumbnail in media_group['media$thumbnail']:
+                if (thumbnail_url is None and
+                    thumbnail['yt$name'] == 'default'):
+                    thumbnail_url = thumbnail['url']
+                if thumbnail['yt$name'] == 'hqdefault':
+                    thumbnail_url = thumbnail['url']
+                    break
+            data['thumbnail_url'] = thumbnail_url
+        if 'publish_datetime' in fields:
+            if 'published' in item:
+                date_key = 'published'
+            else:
+                date_key = 'updated'
+            data['publish_datetime'] = parse_timestamp(
+                            item[date_key]['$t'], "%Y-%m-%dT%H:%M:%S.000Z")
+        if 'tags' in fields:
+            if '$t' in media_group['media$keywords']:
+                tags = media_group['media$keywords']['$t'].split(', ')
+            else:
+                tags = []
+            tags.extend(
+                [cat['$t'] for cat in media_group['media$category']])
+            data['tags'] = tags
+        if 'user' in fields or 'user_url' in fields:
+            username = item['author'][0]['uri']['$t'].rsplit('/', 1)[-1]
+            data['user'] = username
+            data['user_url'] = u'http://www.youtube.com/user/{0}'.format(
+                                                                    username)
+        if 'guid' in fields:
+            data['guid'] = ('http://gdata.youtube.com/feeds/api/videos/'
+                            '{0}'.format(item['id']['$t'].split(':')[-1]))
+        if 'license' in fields:
+            data['license'] = media_group['media$license']['href']
+        if 'flash_enclosure_url' in fields:
+            data['flash_enclosure_url'] = media_group['media$player']['url']
         return data
 
 
@@ -110,12 +250,19 @@ class ApiLoader(ApiMixin, PathMixin, VideoLoader):
 
     url_format = u"http://gdata.youtube.com/feeds/api/videos/{video_id}?v=2&alt=json"
 
-    def get_video_data(self, response):
+    def get_url_for_fields(self, fields):
+        url = self.get_url()
+        selector = self.get_fields_selector(fields)
+        if selector is not None:
+            url = u"{0}&fields={1}".format(url, _quote_selector(selector))
+        return url
+
+    def get_video_data(self, response, fields=None):
         if response.status_code in (401, 403):
             return {'is_embeddable': False}
         parsed = json.loads(response.text)
         entry = parsed['entry']
-        return ApiMixin.get_video_data(self, entry)
+        return ApiMixin.get_video_data(self, entry, fields)
 
 
 class VideoInfoLoader(PathMixin, VideoLoader):
@@ -145,46 +292,54 @@ class VideoInfoLoader(PathMixin, VideoLoader):
         ('100', u'video/webm-3d', 640, 360),
     )
 
+    #: The get_video_info parameters which :meth:`get_video_data` uses. All
+    #: other parameters in the response are skipped without being decoded.
+    info_keys = frozenset(('status', 'errorcode', 'title', 'thumbnail_url',
+                           'keywords', 'url_encoded_fmt_stream_map'))
+
     url_format = u"http://www.youtube.com/get_video_info?video_id={video_id}&el=embedded&ps=default&eurl="
 
-    def get_video_data(self, response):
+    accepts_fields = True
+
+    def get_video_data(self, response, fields=None):
         if response.status_code == 402:
             # 402: Payment required.
             # A note in the previous code said this could happen when too many
             # requests were made (per second?) Unclear why, though, or why
             # this is only caught here.
             return {}
-        params = urlparse.parse_qs(response.text.encode('utf-8'))
-        if params['status'][0] == 'fail':
-            if params['errorcode'][0] == '150': # unembedable
+        if fields is None:
+            fields = self.fields
+        info_keys = self.info_keys
+        if 'files' not in fields:
+            info_keys = info_keys - set(('url_encoded_fmt_stream_map',))
+        params = _parse_video_info(response.text.encode('utf-8'), info_keys)
+        if params.get('status') == 'fail':
+            if params.get('errorcode') == '150': # unembedable
                 return {'is_embeddable': False}
             return {}
         data = {
-            'title': params['title'][0].decode('utf8'),
-            'thumbnail_url': params['thumbnail_url'][0],
+            'title': params['title'].decode('utf8'),
+            'thumbnail_url': params['thumbnail_url'],
             }
         if 'keywords' in params:
-            data['tags'] = params['keywords'][0].decode('utf8').split(',')
+            data['tags'] = params['keywords'].decode('utf8').split(',')
         if data['thumbnail_url'].endswith('/default.jpg'):
             # got a crummy version; increase the resolution
             data['thumbnail_url'] = data['thumbnail_url'].replace(
                 '/default.jpg', '/hqdefault.jpg')
 
-        url_querystrings = params["url_encoded_fmt_stream_map"][0].split(",")
-        url_data = [urlparse.parse_qs(qs) for qs in url_querystrings]
-        url_data_map = dict((ud['itag'][0], ud) for ud in url_data if 'itag' in ud)
+        if 'files' not in fields:
+            return data
+
+        stream_map = _parse_stream_map(
+                             params.get('url_encoded_fmt_stream_map', ''),
+                             [code for code, _, _, _ in self.formats])
 
         data['files'] = []
         for code, mime_type, width, height in self.formats:
-            if code in url_data_map:
-                file_data = url_data_map[code]
-                parsed_file_url = urlparse.urlsplit(file_data['url'][0])
-                parsed_file_url_qs = dict(urlparse.parse_qsl(parsed_file_url.query))
-                expires = struct_time_to_datetime(time.gmtime(int(parsed_file_url_qs['expire'])))
-                parsed_file_url_qs['signature'] = file_data['sig'][0]
-                url = urlparse.urlunsplit(parsed_file_url[:3] +
-                                          (urllib.urlencode(parsed_file_url_qs),) +
-                                          parsed_file_url[4:])
+            if code in stream_map:
+                url, expires = stream_map[code]
                 data['files'].append(VideoFile(url=url,
                                                expires=expires,
                                                mime_type=mime_type,
@@ -206,7 +361,30 @@ class OEmbedLoader(OEmbedLoaderMixin, PathMixin, VideoLoader):
         return super(OEmbedLoader, self).get_video_data(response)
 
 
-class Feed(ApiMixin, BaseFeed):
+class ApiIteratorMixin(ApiMixin):
+    """
+    Mixin class to be used with VideoIterators to provide standard access to
+    the GData API.
+
+    """
+    #: A GData partial response selector for the parts of a response, other
+    #: than its entries, which are needed by :meth:`data_from_response`.
+    response_selector = None
+
+    def get_page_url(self, page_start, page_max):
+        url = super(ApiIteratorMixin, self).get_page_url(page_start,
+                                                         page_max)
+        selector = self.get_fields_selector(self.get_requested_fields())
+        if selector is not None:
+            selector = u"entry({0})".format(selector)
+            if self.response_selector is not None:
+                selector = u"{0},{1}".format(self.response_selector,
+                                             selector)
+            url = u"{0}&fields={1}".format(url, _quote_selector(selector))
+        return url
+
+
+class Feed(ApiIteratorMixin, BaseFeed):
     per_page = 50
     page_url_format = ('http://gdata.youtube.com/feeds/api/users/{username}/'
                        'uploads?alt=json&v=2&start-index={page_start}&max-results={page_max}')
@@ -222,6 +400,9 @@ class Feed(ApiMixin, BaseFeed):
     invalid_usernames = set(('user', 'profile', 'profile_videos', 'watch',
                              'playlist', 'embed'))
 
+    response_selector = ('@gd:etag,id,title,link,logo,'
+                         'openSearch:totalResults')
+
     def get_url_data(self, url):
         parsed_url = urlparse.urlsplit(url)
         if parsed_url.scheme in ('http', 'https'):
@@ -281,7 +462,7 @@ class Feed(ApiMixin, BaseFeed):
         }
 
 
-class Search(ApiMixin, BaseSearch):
+class Search(ApiIteratorMixin, BaseSearch):
     per_page = 50
     page_url_format = ('http://gdata.youtube.com/feeds/api/videos?v=2&alt=json&'
                        'q={query}&orderby={order_by}&start-index={page_start}&'
@@ -294,6 +475,8 @@ class Search(ApiMixin, BaseSearch):
         'popular': 'viewCount',
     }
 
+    response_selector = 'openSearch:totalResults'
+
     def get_response_items(self, response):
         # Response will have a 400 error code if we're beyond the end of the
         # search results (max 999).
@@ -315,6 +498,16 @@ class Search(ApiMixin, BaseSearch):
 class Suite(BaseSuite):
     loader_classes = (OEmbedLoader, ApiLoader,
                       VideoInfoLoader)
+    canonical_key_formats = ('youtube:{video_id}',)
+    # get_video_info starts answering 402 when it gets too many requests.
+    rate_limits = {
+        'www.youtube.com': (2, 5),
+        'gdata.youtube.com': (5, 10),
+    }
+    concurrency_limits = {
+        'www.youtube.com': 4,
+        'gdata.youtube.com': 8,
+    }
 
     feed_class = Feed
     search_class = Search
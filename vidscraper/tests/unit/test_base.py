@@ -1,4 +1,5 @@
 from vidscraper.exceptions import UnhandledVideo
+from vidscraper.suites import registry
 from vidscraper.suites.base import BaseSuite
 from vidscraper.tests.base import BaseTestCase
 
@@ -8,3 +9,11 @@ class BaseSuiteTestCase(BaseTestCase):
         suite = BaseSuite()
         self.assertRaises(UnhandledVideo, suite.get_video, None)
         self.assertRaises(UnhandledVideo, suite.get_video, '')
+
+    def test_canonical_key(self):
+        self.assertEqual(
+            registry.canonical_key('http://vimeo.com/2'),
+            registry.canonical_key('https://player.vimeo.com/2'))
+        self.assertEqual(
+            registry.canonical_key('HTTP://Example.com/a?b=c#d'),
+            'http://example.com/a?b=c')
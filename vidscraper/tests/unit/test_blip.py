@@ -42,6 +42,14 @@ class BlipTestCase(BaseTestCase):
     def setUp(self):
         self.suite = Suite()
 
+    def test_canonical_key(self):
+        self.assertEqual(self.suite.canonical_key(
+                         'http://blip.tv/djangocon/lightning-talks-4102127'),
+                         'blip:4102127')
+        self.assertEqual(self.suite.canonical_key(
+                         'http://www.blip.tv/file/2114/'),
+                         'blip:file:2114')
+
 
 class BlipApiTestCase(BlipTestCase):
     def test_valid_urls(self):
@@ -76,6 +84,14 @@ class BlipApiTestCase(BlipTestCase):
         self.assertEqual(set(data), loader.fields)
         self.assertEqual(data, DISQUS_DATA)
 
+    def test_get_video_data__fields(self):
+        loader = ApiLoader('http://blip.tv/file/4135225')
+        api_file = self.get_data_file('blip/api.rss')
+        response = self.get_response(api_file.read())
+        data = loader.get_video_data(response, fields=set(['title', 'user']))
+        self.assertEqual(data, {'title': DISQUS_DATA['title'],
+                                'user': DISQUS_DATA['user']})
+
 
 class BlipOEmbedTestCase(BlipTestCase):
     def test_valid_urls(self):
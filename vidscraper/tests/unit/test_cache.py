@@ -0,0 +1,467 @@
+import os
+import shutil
+import tempfile
+
+import mock
+from requests.structures import CaseInsensitiveDict
+
+from vidscraper import fetch
+from vidscraper.cache import (MemoryBackend, MetadataCache, NegativeCache,
+                              ResponseCache, SQLiteBackend, LOADER_ERROR,
+                              UNHANDLED_VIDEO, VIDEO_DELETED)
+from vidscraper.exceptions import (UnhandledFeed, UnhandledVideo,
+                                   VideoDeleted, VidscraperError)
+from vidscraper.ratelimit import BACKGROUND, INTERACTIVE
+from vidscraper.suites import registry
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import Video, VideoLoader
+
+
+class CacheTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.sent = []
+
+    def get_response(self, content, code=200, headers=None):
+        response = super(CacheTestCase, self).get_response(content, code)
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(headers or {})
+        return response
+
+    def send(self, *responses):
+        responses = list(responses)
+
+        def send(url, **kwargs):
+            self.sent.append(kwargs.get('headers') or {})
+            return responses.pop(0)
+        return send
+
+    def test_max_age(self):
+        send = self.send(self.get_response('a', headers={
+            'Cache-Control': 'public, max-age=60'}))
+        self.assertEqual(self.cache.fetch(self.url, send).content, 'a')
+        self.assertEqual(self.cache.fetch(self.url, send).content, 'a')
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'revalidations': 0})
+
+    def test_expires(self):
+        send = self.send(self.get_response('a', headers={
+            'Date': 'Mon, 02 Jan 2012 08:30:00 GMT',
+            'Expires': 'Mon, 02 Jan 2012 09:30:00 GMT'}))
+        self.cache.fetch(self.url, send)
+        self.cache.fetch(self.url, send)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_no_store(self):
+        send = self.send(
+            self.get_response('a', headers={'Cache-Control': 'no-store',
+                                            'ETag': '"a"'}),
+            self.get_response('b'))
+        self.cache.fetch(self.url, send)
+        self.assertEqual(self.cache.fetch(self.url, send).content, 'b')
+        self.assertEqual(self.sent, [{}, {}])
+
+    def test_not_cacheable(self):
+        """Responses which can't be reused shouldn't be stored."""
+        send = self.send(self.get_response('a'),
+                         self.get_response('b', 404,
+                                           {'Cache-Control': 'max-age=60'}))
+        self.cache.fetch(self.url, send)
+        self.cache.fetch(self.url, send)
+        self.assertTrue(self.cache.backend.get(self.url) is None)
+
+    def test_revalidate(self):
+        send = self.send(
+            self.get_response('a', headers={'ETag': '"a"',
+                                            'Cache-Control': 'no-cache'}),
+            self.get_response('', 304, {'ETag': '"a"'}))
+        self.cache.fetch(self.url, send)
+        response = self.cache.fetch(self.url, send)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, 'a')
+        self.assertEqual(self.sent[1], {'If-None-Match': '"a"'})
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 0, 'misses': 1, 'revalidations': 1})
+
+    def test_conditional_request(self):
+        """
+        A conditional request for the cached version should get a 304
+        response from the cache.
+
+        """
+        send = self.send(self.get_response('a', headers={
+            'ETag': '"a"', 'Cache-Control': 'max-age=60'}))
+        self.cache.fetch(self.url, send)
+        response = self.cache.fetch(self.url, send,
+                                    headers={'If-None-Match': '"a"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_conditional_request__other_version(self):
+        send = self.send(
+            self.get_response('a', headers={'ETag': '"a"',
+                                            'Cache-Control': 'no-cache'}),
+            self.get_response('', 304, {'ETag': '"b"'}))
+        self.cache.fetch(self.url, send)
+        response = self.cache.fetch(self.url, send,
+                                    headers={'If-None-Match': '"b"'})
+        # The server says the caller's version is current; the cached
+        # version shouldn't be used.
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.cache.revalidations, 0)
+
+    def test_conditional_request__last_modified(self):
+        send = self.send(self.get_response('a', headers={
+            'Last-Modified': 'Mon, 02 Jan 2012 08:30:00 GMT',
+            'Cache-Control': 'max-age=60'}))
+        self.cache.fetch(self.url, send)
+        response = self.cache.fetch(self.url, send, headers={
+            'If-Modified-Since': 'Mon, 02 Jan 2012 08:30:00 GMT'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_conditional_request__other_date(self):
+        """
+        A 304 to an If-Modified-Since date which didn't come from the cached
+        response doesn't confirm that response.
+
+        """
+        send = self.send(
+            self.get_response('a', headers={
+                'Last-Modified': 'Mon, 02 Jan 2012 08:30:00 GMT',
+                'Cache-Control': 'no-cache'}),
+            self.get_response('', 304))
+        self.cache.fetch(self.url, send)
+        response = self.cache.fetch(self.url, send, headers={
+            'If-Modified-Since': 'Tue, 03 Jan 2012 08:30:00 GMT'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.sent[1], {
+            'If-Modified-Since': 'Tue, 03 Jan 2012 08:30:00 GMT'})
+        self.assertEqual(self.cache.revalidations, 0)
+
+    def test_ttl(self):
+        send = self.send(self.get_response('a', headers={
+            'Cache-Control': 'no-cache', 'ETag': '"a"'}))
+        self.cache.fetch(self.url, send, ttl=60)
+        self.cache.fetch(self.url, send, ttl=60)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_fetch__cache_ttl(self):
+        """Sources' cache_ttl should be used by fetch()."""
+        source = mock.Mock(cache_ttl=60, priority=None, deadline=None,
+                           prepare_request=None)
+        with mock.patch.object(fetch, 'cache', self.cache):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('a')
+                fetch.fetch(self.url, source)
+                response = fetch.fetch(self.url, source)
+        self.assertEqual(response.content, 'a')
+        self.assertEqual(requests.get.call_count, 1)
+
+    def test_fetch_many(self):
+        with mock.patch.object(fetch, 'cache', self.cache):
+            with mock.patch('vidscraper.fetch.grequests', None):
+                with mock.patch('vidscraper.fetch.requests') as requests:
+                    requests.get.return_value = self.get_response('a', 200, {
+                        'Cache-Control': 'max-age=60'})
+                    fetch.fetch_many([(self.url, None, {})])
+                    responses = fetch.fetch_many([
+                        (self.url, None, {}),
+                        ('http://example.com/other', None, {})])
+        self.assertEqual([response.content for response in responses],
+                         ['a', 'a'])
+        self.assertEqual(requests.get.call_count, 2)
+        self.assertEqual(requests.get.call_args[0],
+                         ('http://example.com/other',))
+
+
+class MemoryBackendTestCase(BaseTestCase):
+    def test_lru(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual(backend.get('a'), 1)
+        self.assertTrue(backend.get('b') is None)
+        self.assertEqual(backend.get('c'), 3)
+
+
+class SQLiteBackendTestCase(CacheTestCase):
+    def setUp(self):
+        super(SQLiteBackendTestCase, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.cache = ResponseCache(SQLiteBackend(
+                                os.path.join(self.tempdir, 'cache.db')))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_compressed(self):
+        content = 'x' * 10000
+        send = self.send(self.get_response(content, headers={
+            'Cache-Control': 'max-age=60'}))
+        self.cache.fetch(self.url, send)
+        stored = self.cache.backend.connection.execute(
+                        'SELECT content FROM vidscraper_cache').fetchone()[0]
+        self.assertTrue(len(stored) < 1000)
+        self.assertEqual(self.cache.fetch(self.url, send).content, content)
+
+    def test_without_response(self):
+        self.cache.backend.set('a', {'data': {'title': 'a'}})
+        self.assertEqual(self.cache.backend.get('a'),
+                         {'data': {'title': 'a'}})
+
+
+class ImmediatePool(object):
+    """Runs "background" work immediately."""
+    def apply_async(self, func, args=()):
+        func(*args)
+
+
+class MetadataCacheTestCase(BaseTestCase):
+    url = 'http://www.youtube.com/watch?v=J_DV9b0x7v4'
+
+    def setUp(self):
+        self.titles = ['a', 'b']
+        self.changes = []
+        self.priorities = []
+        self.cache = MetadataCache(max_age=60, max_stale=3600,
+                                   on_change=self.on_change,
+                                   pool=ImmediatePool())
+        self.cache._load = self.load
+        self.spoil = None
+
+    def on_change(self, url, old_data, new_data):
+        self.changes.append((url, old_data['title'], new_data['title']))
+
+    def load(self, url, fields, api_keys, priority):
+        self.priorities.append(priority)
+        video = Video(url, fields=fields)
+        video.title = self.titles.pop(0)
+        video._loaded = True
+        if self.spoil is not None:
+            self.spoil(video)
+        return video
+
+    def failed(self, video):
+        video._errors[None] = ValueError('broken')
+
+    def partial(self, video):
+        video.partial = True
+        video._loaded = False
+
+    def empty(self, video):
+        video.title = None
+
+    def age(self, seconds):
+        key = self.cache._get_key(self.url, ['title'])
+        entry = self.cache.backend.get(key)
+        entry['stored'] -= seconds
+        self.cache.backend.set(key, entry)
+
+    def test_fresh(self):
+        self.assertEqual(self.cache.scrape(self.url, ['title']).title, 'a')
+        self.assertEqual(self.cache.scrape(self.url, ['title']).title, 'a')
+        self.assertEqual(self.titles, ['b'])
+
+    def test_fresh__loaded(self):
+        """Cached videos are loaded, so loading them makes no requests."""
+        self.cache.scrape(self.url, ['title'])
+        video = self.cache.scrape(self.url, ['title'])
+        self.assertTrue(video.is_loaded())
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                video.load()
+        self.assertFalse(requests.get.called)
+        self.assertEqual(video.title, 'a')
+
+    def test_stale(self):
+        """Stale data is returned and refreshed in the background."""
+        self.cache.scrape(self.url, ['title'])
+        self.age(120)
+        video = self.cache.scrape(self.url, ['title'])
+        self.assertEqual(video.title, 'a')
+        self.assertEqual(video.url, self.url)
+        self.assertEqual(self.changes, [(self.url, 'a', 'b')])
+        self.assertEqual(self.priorities, [INTERACTIVE, BACKGROUND])
+        self.assertEqual(self.cache.scrape(self.url, ['title']).title, 'b')
+
+    def test_too_stale(self):
+        self.cache.scrape(self.url, ['title'])
+        self.age(7200)
+        self.assertEqual(self.cache.scrape(self.url, ['title']).title, 'b')
+        self.assertEqual(self.changes, [])
+
+    def test_unchanged(self):
+        self.titles = ['a', 'a']
+        self.cache.scrape(self.url, ['title'])
+        self.age(120)
+        self.cache.scrape(self.url, ['title'])
+        self.assertEqual(self.titles, [])
+        self.assertEqual(self.changes, [])
+
+    def test_refresh_error(self):
+        """Failed refreshes keep the stale data."""
+        self.cache.scrape(self.url, ['title'])
+        self.age(120)
+        self.titles = []
+        self.assertEqual(self.cache.scrape(self.url, ['title']).title, 'a')
+        key = self.cache._get_key(self.url, ['title'])
+        self.assertEqual(self.cache.backend.get(key)['data']['title'], 'a')
+        self.assertEqual(self.cache._refreshing, set())
+
+    def test_unsuccessful(self):
+        """Failed, partial and empty loads aren't cached."""
+        key = self.cache._get_key(self.url, ['title'])
+        for spoil in (self.failed, self.partial, self.empty):
+            self.spoil = spoil
+            self.titles = ['a', 'b']
+            self.cache.scrape(self.url, ['title'])
+            self.cache.scrape(self.url, ['title'])
+            self.assertEqual(self.titles, [])
+            self.assertTrue(self.cache.backend.get(key) is None)
+
+    def test_unsuccessful_refresh(self):
+        """Unsuccessful refreshes keep the stale data."""
+        key = self.cache._get_key(self.url, ['title'])
+        for spoil in (self.failed, self.partial, self.empty):
+            self.cache.backend.clear()
+            self.spoil = None
+            self.titles = ['a', 'b']
+            self.cache.scrape(self.url, ['title'])
+            self.age(120)
+            self.spoil = spoil
+            self.assertEqual(self.cache.scrape(self.url, ['title']).title,
+                             'a')
+            self.assertEqual(self.cache.backend.get(key)['data']['title'],
+                             'a')
+            self.assertEqual(self.changes, [])
+
+
+class DeletedLoader(VideoLoader):
+    fields = set(['title'])
+    url_format = 'http://example.com/{url}'
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+    def get_video_data(self, response):
+        raise VideoDeleted(self.url)
+
+
+class BrokenLoader(DeletedLoader):
+    def get_video_data(self, response):
+        raise ValueError('broken')
+
+
+class BrokenFilesLoader(BrokenLoader):
+    fields = set(['files'])
+
+
+class TitleLoader(DeletedLoader):
+    def get_video_data(self, response):
+        return {'title': 'title'}
+
+
+class NegativeCacheTestCase(BaseTestCase):
+    def setUp(self):
+        self.cache = NegativeCache(ttls={LOADER_ERROR: 60})
+        patcher = mock.patch.object(fetch, 'negative_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, loader_class, url='1', fields=('title',)):
+        loader_classes = (loader_class if isinstance(loader_class, tuple)
+                          else (loader_class,))
+        video = Video(url, loaders=[cls(url) for cls in loader_classes],
+                      fields=list(fields))
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('')
+                video.load()
+        return video, requests.get.call_count
+
+    def test_ttls(self):
+        self.cache.record(LOADER_ERROR, 'http://example.com/', now=0)
+        self.cache.record(UNHANDLED_VIDEO, 'http://example.com/', now=0)
+        self.assertTrue(self.cache.get('http://example.com/', (LOADER_ERROR,),
+                                       now=59) is not None)
+        self.assertTrue(self.cache.get('http://example.com/', (LOADER_ERROR,),
+                                       now=60) is None)
+        exc = self.cache.get('HTTP://EXAMPLE.COM/#top',
+                             (LOADER_ERROR, UNHANDLED_VIDEO), now=60)
+        self.assertTrue(isinstance(exc, UnhandledVideo))
+
+    def test_get_video(self):
+        url = 'http://unhandled.example.com/'
+        self.assertRaises(UnhandledVideo, registry.get_video, url)
+        suite = mock.Mock(canonical_key=lambda url: None)
+        with mock.patch.object(registry, '_suites', [suite]):
+            self.assertRaises(UnhandledVideo, registry.get_video, url)
+        # The suites aren't consulted again.
+        self.assertFalse(suite.get_video.called)
+        self.cache.forget(url)
+        self.assertTrue(self.cache.get(url, (UNHANDLED_VIDEO,)) is None)
+
+    def test_get_video__api_keys(self):
+        """Urls unhandled without api keys may be handled with them."""
+        url = 'http://www.ustream.tv/recorded/16417223'
+        api_keys = {'ustream_key': 'TEST_KEY'}
+        suite = mock.Mock(canonical_key=lambda url: None)
+        suite.get_video.side_effect = UnhandledVideo(url)
+        with mock.patch.object(registry, '_suites', [suite]):
+            self.assertRaises(UnhandledVideo, registry.get_video, url)
+            self.assertTrue(self.cache.get(url, (UNHANDLED_VIDEO,))
+                            is not None)
+            self.assertTrue(self.cache.get(url, (UNHANDLED_VIDEO,),
+                                           api_keys=api_keys) is None)
+            suite.get_video.side_effect = None
+            registry.get_video(url, api_keys=api_keys)
+        self.assertEqual(suite.get_video.call_count, 2)
+
+    def test_get_feed(self):
+        url = 'http://unhandled.example.com/'
+        with mock.patch.object(registry, '_suites', []):
+            with mock.patch.object(registry, '_fallback', None):
+                self.assertRaises(UnhandledFeed, registry.get_feed, url)
+        suite = mock.Mock(canonical_key=lambda url: None)
+        with mock.patch.object(registry, '_suites', [suite]):
+            self.assertRaises(UnhandledFeed, registry.get_feed, url)
+        # The suites aren't consulted again.
+        self.assertFalse(suite.get_feed.called)
+
+    def test_deleted(self):
+        video, count = self.load(DeletedLoader)
+        self.assertEqual(count, 1)
+        video, count = self.load(BrokenLoader)
+        self.assertEqual(count, 0)
+        self.assertTrue(isinstance(video._errors.values()[0], VideoDeleted))
+        self.assertTrue(video.is_loaded())
+        self.assertTrue(self.cache.get('1', (VIDEO_DELETED,)) is not None)
+
+    def test_loader_error(self):
+        video, count = self.load(BrokenLoader)
+        self.assertEqual(count, 1)
+        video, count = self.load(BrokenLoader)
+        self.assertEqual(count, 0)
+        exc = video._errors.values()[0]
+        self.assertEqual(type(exc), VidscraperError)
+        self.assertEqual(exc.args[0], u'ValueError: broken')
+
+    def test_loader_error__other_loaders(self):
+        """
+        A loader error doesn't stop loads which would use other loaders.
+
+        """
+        loader_classes = (BrokenFilesLoader, TitleLoader)
+        video, count = self.load(loader_classes, fields=['files'])
+        self.assertEqual(count, 1)
+        video, count = self.load(loader_classes, fields=['files'])
+        self.assertEqual(count, 0)
+        video, count = self.load(loader_classes, fields=['title'])
+        self.assertEqual(count, 1)
+        self.assertEqual(video.title, 'title')
@@ -0,0 +1,91 @@
+import datetime
+
+import mock
+
+from vidscraper import fetch
+from vidscraper.costs import LoaderCosts
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import Video, VideoLoader
+
+
+class TitleLoader(VideoLoader):
+    fields = set(['title', 'user'])
+    url_format = 'http://title.example.com/{url}'
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+
+class UserLoader(TitleLoader):
+    fields = set(['user'])
+    url_format = 'http://user.example.com/{url}'
+
+
+class OtherTitleLoader(TitleLoader):
+    fields = set(['title'])
+    url_format = 'http://other.example.com/{url}'
+
+
+class LoaderCostsTestCase(BaseTestCase):
+    def test_record(self):
+        costs = LoaderCosts(alpha=0.5, seconds_per_byte=0.001)
+        self.assertEqual(costs.get_cost(TitleLoader('1')), 0)
+        costs.record(TitleLoader, 1, 1000)
+        costs.record(TitleLoader, 2, 3000)
+        self.assertEqual(costs.get_cost(TitleLoader('1')), 3.5)
+        self.assertEqual(costs.stats(), {
+            'vidscraper.tests.unit.test_costs.TitleLoader': {
+                'latency': 1.5,
+                'bytes': 2000,
+                'samples': 2,
+            },
+        })
+
+    def test_record_response(self):
+        costs = LoaderCosts()
+        response = self.get_response('x' * 10)
+        response.elapsed = datetime.timedelta(seconds=2, microseconds=500000)
+        costs.record_response(UserLoader('1'), response)
+        costs.record_response(UserLoader('1'), None)
+        stats = costs.stats()['vidscraper.tests.unit.test_costs.UserLoader']
+        self.assertEqual(stats, {'latency': 2.5, 'bytes': 10, 'samples': 1})
+
+    def test_fetch_many(self):
+        costs = LoaderCosts()
+        loader = UserLoader('1')
+        with mock.patch.object(fetch, 'loader_costs', costs):
+            with mock.patch('vidscraper.fetch.grequests', None):
+                with mock.patch('vidscraper.fetch.requests') as requests:
+                    requests.get.return_value = self.get_response('abc')
+                    fetch.fetch_many([(loader.get_url(), loader, {}),
+                                      ('http://example.com/', None, {})])
+        self.assertEqual(costs.stats().values(),
+                         [{'latency': 0, 'bytes': 3, 'samples': 1}])
+
+
+class GetBestLoadersTestCase(BaseTestCase):
+    def get_best_loaders(self, costs=None):
+        video = Video('1', loaders=[TitleLoader('1'), UserLoader('1'),
+                                    OtherTitleLoader('1')])
+        video.fields = ['title', 'user']
+        with mock.patch.object(fetch, 'loader_costs', costs):
+            return [type(loader) for loader in video.get_best_loaders()]
+
+    def test_static_order(self):
+        self.assertEqual(self.get_best_loaders(), [TitleLoader])
+        self.assertEqual(self.get_best_loaders(LoaderCosts()), [TitleLoader])
+
+    def test_cheapest(self):
+        costs = LoaderCosts()
+        costs.record(TitleLoader, 3, 0)
+        costs.record(UserLoader, 1, 0)
+        costs.record(OtherTitleLoader, 1, 0)
+        self.assertEqual(self.get_best_loaders(costs),
+                         [UserLoader, OtherTitleLoader])
+
+    def test_tie(self):
+        costs = LoaderCosts()
+        costs.record(TitleLoader, 2, 0)
+        costs.record(UserLoader, 1, 0)
+        costs.record(OtherTitleLoader, 1, 0)
+        self.assertEqual(self.get_best_loaders(costs), [TitleLoader])
@@ -0,0 +1,145 @@
+import threading
+import time
+
+import mock
+from requests.exceptions import ConnectionError
+
+from vidscraper import fetch
+from vidscraper.exceptions import DeadlineExceeded
+from vidscraper.tests.base import BaseTestCase
+
+
+class CoalesceTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def setUp(self):
+        patcher = mock.patch('vidscraper.fetch.requests')
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('vidscraper.fetch.grequests', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_many__duplicates(self):
+        self.requests.get.return_value = self.get_response('a')
+        responses = fetch.fetch_many([
+            (self.url, None, {'headers': {'Accept': 'x'}}),
+            (self.url, None, {'headers': {'accept': 'x'}}),
+            (self.url, None, {'headers': {'Accept': 'y'}}),
+        ])
+        self.assertEqual([response.content for response in responses],
+                         ['a', 'a', 'a'])
+        self.assertFalse(responses[0] is responses[1])
+        self.assertEqual(self.requests.get.call_count, 2)
+        self.assertEqual(fetch._in_flight, {})
+
+    def test_fetch_many__error(self):
+        """A failed request doesn't affect the others."""
+        def get(url, **kwargs):
+            if url == self.url:
+                raise ConnectionError()
+            return self.get_response('a')
+        self.requests.get.side_effect = get
+        responses = fetch.fetch_many([
+            (self.url, None, {}),
+            ('http://example.com/other', None, {}),
+            (self.url, None, {}),
+        ])
+        self.assertTrue(responses[0] is None)
+        self.assertEqual(responses[1].content, 'a')
+        self.assertTrue(responses[2] is None)
+        self.assertEqual(self.requests.get.call_count, 2)
+        self.assertEqual(fetch._in_flight, {})
+
+    def test_fetch_many__disabled(self):
+        self.requests.get.return_value = self.get_response('a')
+        with mock.patch.object(fetch, 'coalesce', False):
+            fetch.fetch_many([(self.url, None, {}), (self.url, None, {})])
+        self.assertEqual(self.requests.get.call_count, 2)
+
+    def fetch_concurrently(self, get):
+        """
+        Fetches :attr:`url` in two threads, where the second starts while
+        the first is waiting on ``get``. Returns the results of both.
+
+        """
+        sent = threading.Event()
+        release = threading.Event()
+        waiting = threading.Event()
+        results = [None, None]
+
+        def blocking_get(url, **kwargs):
+            sent.set()
+            release.wait()
+            return get()
+        self.requests.get.side_effect = blocking_get
+
+        wait = fetch._Call.wait
+
+        def signalling_wait(call, *args):
+            waiting.set()
+            return wait(call, *args)
+
+        def run(i):
+            try:
+                results[i] = fetch.fetch(self.url)
+            except Exception, exc:
+                results[i] = exc
+
+        with mock.patch.object(fetch._Call, 'wait', signalling_wait):
+            first = threading.Thread(target=run, args=(0,))
+            first.start()
+            sent.wait()
+            second = threading.Thread(target=run, args=(1,))
+            second.start()
+            waiting.wait()
+            release.set()
+            first.join()
+            second.join()
+        return results
+
+    def test_fetch__concurrent(self):
+        results = self.fetch_concurrently(lambda: self.get_response('a'))
+        self.assertEqual([response.content for response in results],
+                         ['a', 'a'])
+        self.assertEqual(self.requests.get.call_count, 1)
+        self.assertEqual(fetch._in_flight, {})
+
+    def test_fetch__concurrent_error(self):
+        def get():
+            raise ValueError
+        results = self.fetch_concurrently(get)
+        self.assertTrue(isinstance(results[0], ValueError))
+        self.assertTrue(isinstance(results[1], ValueError))
+        self.assertEqual(fetch._in_flight, {})
+
+
+class DeadlineTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def setUp(self):
+        patcher = mock.patch('vidscraper.fetch.requests')
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('vidscraper.fetch.grequests', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.requests.get.return_value = self.get_response('a')
+
+    def test_fetch__timeout(self):
+        fetch.fetch(self.url, deadline=time.time() + 1, timeout=3)
+        timeout = self.requests.get.call_args[1]['timeout']
+        self.assertTrue(0 < timeout <= 1)
+        fetch.fetch(self.url, deadline=time.time() + 10, timeout=3)
+        self.assertEqual(self.requests.get.call_args[1]['timeout'], 3)
+
+    def test_fetch__passed(self):
+        self.assertRaises(DeadlineExceeded, fetch.fetch, self.url,
+                          deadline=time.time() - 1)
+        self.assertEqual(self.requests.get.call_count, 0)
+
+    def test_fetch_many__passed(self):
+        responses = fetch.fetch_many([(self.url, None, {})],
+                                     deadline=time.time() - 1)
+        self.assertEqual(responses, [None])
+        self.assertEqual(self.requests.get.call_count, 0)
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import mock
+
+from vidscraper import fetch
+from vidscraper.costs import LoaderCosts
+from vidscraper.hedge import HedgePolicy
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import Video, VideoLoader
+
+
+class SlowLoader(VideoLoader):
+    fields = set(['title'])
+    url_format = 'http://slow.example.com/{url}'
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+    def get_video_data(self, response):
+        return {'title': response.content}
+
+
+class FastLoader(SlowLoader):
+    fields = set(['title', 'user'])
+    url_format = 'http://fast.example.com/{url}'
+
+
+class HedgePolicyTestCase(BaseTestCase):
+    def test_get_delay(self):
+        policy = HedgePolicy(percentile=90, min_samples=5)
+        loader = SlowLoader('1')
+        for latency in (5, 1, 4, 2):
+            policy.record(loader, latency)
+        self.assertEqual(policy.get_delay(loader), None)
+        policy.record(loader, 3)
+        self.assertEqual(policy.get_delay(loader), 5)
+        for latency in xrange(6, 11):
+            policy.record(loader, latency)
+        self.assertEqual(policy.get_delay(loader), 9)
+        self.assertEqual(policy.get_delay(FastLoader('1')), None)
+        self.assertEqual(HedgePolicy(delay=2).get_delay(loader), 2)
+
+
+class RunLoadersTestCase(BaseTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.finish)
+        patcher = mock.patch('vidscraper.fetch.requests')
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.requests.get.side_effect = self.get
+        patcher = mock.patch('vidscraper.fetch.grequests', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def finish(self):
+        # Let requests which lost their race finish, so that later tests
+        # can't join them.
+        self.release.set()
+        while fetch._in_flight:
+            time.sleep(0.001)
+
+    def get(self, url, **kwargs):
+        if url.startswith('http://slow.'):
+            self.release.wait()
+        return self.get_response(url.split('/')[2])
+
+    def run_loaders(self, policy):
+        video = Video('1', loaders=[SlowLoader('1'), FastLoader('1')],
+                      fields=['title'])
+        with mock.patch.object(fetch, 'hedge_policy', policy):
+            return video.run_loaders()
+
+    def test_hedge(self):
+        data = self.run_loaders(HedgePolicy(delay=0.01))
+        self.assertEqual(data, {'title': 'fast.example.com'})
+
+    def test_hedge__costs(self):
+        """Hedged requests are measured for the loader costs."""
+        costs = LoaderCosts()
+        with mock.patch.object(fetch, 'loader_costs', costs):
+            data = self.run_loaders(HedgePolicy(delay=0.01))
+            self.assertEqual(data, {'title': 'fast.example.com'})
+            self.assertEqual(costs.stats().keys(),
+                             ['vidscraper.tests.unit.test_hedge.FastLoader'])
+
+    def test_no_hedge(self):
+        self.release.set()
+        policy = HedgePolicy(min_samples=1)
+        data = self.run_loaders(policy)
+        self.assertEqual(data, {'title': 'slow.example.com'})
+        self.assertEqual(self.requests.get.call_count, 1)
+        self.assertTrue(policy.get_delay(SlowLoader('1')) is not None)
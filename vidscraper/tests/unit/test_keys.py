@@ -0,0 +1,135 @@
+import mock
+
+from vidscraper import fetch as fetch_module
+from vidscraper.cache import ResponseCache
+from vidscraper.fetch import fetch
+from vidscraper.keys import KeyPool, get_api_key
+from vidscraper.suites.ustream import ApiLoader as UstreamApiLoader
+from vidscraper.suites.youtube import (ApiLoader, OEmbedLoader,
+                                       VideoInfoLoader)
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import Video
+
+
+class KeyPoolTestCase(BaseTestCase):
+    def test_rotation(self):
+        pool = KeyPool(['a', 'b'])
+        self.assertEqual([pool.get(now=0) for i in xrange(3)],
+                         ['a', 'b', 'a'])
+        self.assertEqual(pool.usage(now=0), [('a', 2), ('b', 1)])
+
+    def test_quota(self):
+        pool = KeyPool(['a', 'b'], quota=1, period=10)
+        self.assertTrue(pool.has_budget(now=0))
+        pool.get(now=0)
+        self.assertTrue(pool.has_budget(now=0))
+        pool.get(now=5)
+        self.assertFalse(pool.has_budget(now=5))
+        # Keys are still handed out past their quota.
+        self.assertEqual(pool.get(now=5), 'a')
+        # The next period starts afresh.
+        self.assertTrue(pool.has_budget(now=10))
+        self.assertEqual(pool.usage(now=10), [('a', 0), ('b', 0)])
+
+    def test_empty(self):
+        self.assertRaises(ValueError, KeyPool, [])
+
+    def test_get_api_key(self):
+        pool = KeyPool(['a', 'b'])
+        api_keys = {'plain': 'x', 'pool': pool}
+        self.assertEqual(get_api_key(api_keys, 'plain'), 'x')
+        self.assertEqual(get_api_key(api_keys, 'missing'), None)
+        self.assertEqual(get_api_key(api_keys, 'pool'), 'a')
+        self.assertEqual(get_api_key(api_keys, 'pool'), 'b')
+
+
+class QuotaTestCase(BaseTestCase):
+    url = 'http://www.youtube.com/watch?v=J_DV9b0x7v4'
+
+    def get_best_loaders(self, api_keys, fields):
+        video = Video(self.url, fields=fields,
+                      loaders=[cls(self.url, api_keys=api_keys)
+                               for cls in (OEmbedLoader, ApiLoader,
+                                           VideoInfoLoader)])
+        return [type(loader) for loader in video.get_best_loaders()]
+
+    def test_uses_quota(self):
+        self.assertFalse(ApiLoader(self.url).uses_quota())
+        self.assertTrue(ApiLoader(self.url, api_keys={
+            'youtube_key': 'a'}).uses_quota())
+        self.assertFalse(VideoInfoLoader(self.url, api_keys={
+            'youtube_key': 'a'}).uses_quota())
+
+    def test_prefers_quota_free(self):
+        fields = ['title', 'user']
+        self.assertEqual(self.get_best_loaders({}, fields), [OEmbedLoader])
+        # Without a key, the API loader doesn't use quota and is preferred
+        # as before.
+        fields = ['title', 'tags']
+        self.assertEqual(self.get_best_loaders({}, fields), [ApiLoader])
+        self.assertEqual(self.get_best_loaders({'youtube_key': 'a'}, fields),
+                         [VideoInfoLoader])
+
+    def test_fields_needed(self):
+        fields = ['title', 'description']
+        self.assertEqual(self.get_best_loaders({'youtube_key': 'a'}, fields),
+                         [ApiLoader])
+
+    def test_out_of_budget(self):
+        pool = KeyPool(['a'], quota=1)
+        fields = ['title', 'description']
+        # Choosing loaders doesn't use up quota.
+        for i in xrange(3):
+            self.assertEqual(
+                self.get_best_loaders({'youtube_key': pool}, fields),
+                [ApiLoader])
+        self.assertEqual(pool.usage(), [('a', 0)])
+
+        loader = ApiLoader(self.url, api_keys={'youtube_key': pool})
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.return_value = self.get_response('')
+            fetch(loader.get_url(), loader, **loader.get_request_kwargs())
+        self.assertEqual(requests.get.call_args[1]['headers']['X-GData-Key'],
+                         'key=a')
+        self.assertEqual(self.get_best_loaders({'youtube_key': pool}, fields),
+                         [OEmbedLoader])
+
+    def test_youtube_pool_headers(self):
+        # Taking a key happens when the request is sent, so identical
+        # requests have the same headers and can be coalesced.
+        loader = ApiLoader(self.url, api_keys={'youtube_key': KeyPool(['a'])})
+        self.assertEqual(loader.get_request_kwargs(),
+                         loader.get_request_kwargs())
+        self.assertFalse('X-GData-Key' in loader.get_headers())
+
+    def test_ustream_pool(self):
+        pool = KeyPool(['a', 'b'])
+        loader = UstreamApiLoader('http://www.ustream.tv/recorded/16417223',
+                                  api_keys={'ustream_key': pool})
+        url = loader.get_url()
+        self.assertEqual(url,
+                         'http://api.ustream.tv/json/video/16417223/getInfo/')
+        self.assertEqual(loader.get_url(), url)
+        self.assertEqual(pool.usage(), [('a', 0), ('b', 0)])
+
+        self.assertEqual(loader.prepare_request(url, {}),
+            ('http://api.ustream.tv/json/video/16417223/getInfo/?key=a', {}))
+        self.assertEqual(loader.prepare_request(url, {}),
+            ('http://api.ustream.tv/json/video/16417223/getInfo/?key=b', {}))
+
+    def test_cached_response(self):
+        pool = KeyPool(['a'])
+        loader = UstreamApiLoader('http://www.ustream.tv/recorded/16417223',
+                                  api_keys={'ustream_key': pool})
+        with mock.patch.object(fetch_module, 'cache', ResponseCache()):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                response = self.get_response('{}')
+                response.headers['cache-control'] = 'max-age=60'
+                requests.get.return_value = response
+                for i in xrange(2):
+                    fetch(loader.get_url(), loader,
+                          **loader.get_request_kwargs())
+        self.assertEqual(requests.get.call_count, 1)
+        self.assertEqual(requests.get.call_args[0][0],
+            'http://api.ustream.tv/json/video/16417223/getInfo/?key=a')
+        self.assertEqual(pool.usage(), [('a', 1)])
@@ -0,0 +1,151 @@
+import threading
+import time
+
+import mock
+
+from vidscraper import fetch
+from vidscraper.ratelimit import (BACKGROUND, INTERACTIVE,
+                                  ConcurrencyLimiter, RateLimiter,
+                                  TokenBucket, round_robin)
+from vidscraper.tests.base import BaseTestCase
+
+
+class TokenBucketTestCase(BaseTestCase):
+    def test_reserve(self):
+        bucket = TokenBucket(2, burst=2)
+        self.assertEqual(bucket.reserve(now=0), 0)
+        self.assertEqual(bucket.reserve(now=0), 0)
+        self.assertEqual(bucket.reserve(now=0), 0.5)
+        # Reservations queue up behind each other.
+        self.assertEqual(bucket.reserve(now=0), 1)
+        # Tokens refill at the rate, up to the burst size.
+        self.assertEqual(bucket.reserve(now=10), 0)
+        self.assertEqual(bucket.tokens, 1)
+
+
+class RateLimiterTestCase(BaseTestCase):
+    def test_suite_defaults(self):
+        limiter = RateLimiter(rates={'vimeo.com': (1, 1)})
+        self.assertEqual(limiter.rates['www.youtube.com'], (2, 5))
+        self.assertEqual(limiter.rates['vimeo.com'], (1, 1))
+        self.assertTrue(limiter.get_bucket('example.com') is None)
+
+    def test_stats(self):
+        limiter = RateLimiter(default_rate=(1, 1), use_suite_defaults=False)
+        limiter.reserve('http://EXAMPLE.com/a', now=0)
+        limiter.reserve('http://example.com/b', now=0)
+        limiter.reserve('http://example.org/', now=0)
+        self.assertEqual(limiter.stats(), {
+            'example.com': {'requests': 2, 'waited': 1, 'wait_time': 1.0},
+            'example.org': {'requests': 1, 'waited': 0, 'wait_time': 0.0},
+        })
+
+    def test_fetch(self):
+        limiter = RateLimiter(default_rate=(1, 1), use_suite_defaults=False)
+        with mock.patch.object(fetch, 'rate_limiter', limiter):
+            with mock.patch('vidscraper.fetch.grequests', None):
+                with mock.patch('vidscraper.fetch.requests') as requests:
+                    requests.get.return_value = self.get_response('')
+                    with mock.patch('vidscraper.ratelimit.time') as time:
+                        time.time.return_value = 0
+                        fetch.fetch_many([('http://example.com/a', None, {}),
+                                          ('http://example.com/b', None, {})])
+        time.sleep.assert_called_once_with(1.0)
+        self.assertEqual(limiter.stats()['example.com']['requests'], 2)
+
+
+class ConcurrencyLimiterTestCase(BaseTestCase):
+    urls = ['http://a.com/1', 'http://a.com/2', 'http://a.com/3',
+            'http://a.com/4', 'http://b.com/1', 'http://c.com/1']
+
+    def test_round_robin(self):
+        self.assertEqual(round_robin(self.urls), [0, 4, 5, 1, 2, 3])
+
+    def test_get_waves(self):
+        limiter = ConcurrencyLimiter(limits={'a.com': 2}, max_requests=3,
+                                     use_suite_defaults=False)
+        waves = []
+        for wave in limiter.get_waves(self.urls):
+            waves.append(wave)
+            for i in wave:
+                limiter.release(self.urls[i])
+        self.assertEqual(waves, [[0, 4, 5], [1, 2], [3]])
+
+    def test_fetch_many(self):
+        limiter = ConcurrencyLimiter(limits={'a.com': 2},
+                                     use_suite_defaults=False)
+        waves = []
+
+        def map(requests):
+            waves.append(requests)
+            return [self.get_response(url) for url in requests]
+        grequests = mock.Mock(map=map, get=lambda url, **kwargs: url)
+        with mock.patch.object(fetch, 'concurrency_limiter', limiter):
+            with mock.patch.object(fetch, 'grequests', grequests):
+                responses = fetch.fetch_many([(url, None, {})
+                                              for url in self.urls])
+        self.assertEqual([response.content for response in responses],
+                         self.urls)
+        self.assertEqual(waves, [
+            ['http://a.com/1', 'http://b.com/1', 'http://c.com/1',
+             'http://a.com/2'],
+            ['http://a.com/3', 'http://a.com/4'],
+        ])
+
+    def test_priority(self):
+        """
+        Interactive requests go first, but not more than
+        max_interactive_streak in a row while background requests wait.
+
+        """
+        limiter = ConcurrencyLimiter(default_limit=1,
+                                     use_suite_defaults=False)
+        limiter.max_interactive_streak = 2
+        url = self.urls[0]
+        order = []
+
+        def run(name, priority):
+            limiter.acquire(url, priority=priority)
+            order.append(name)
+            limiter.release(url)
+
+        limiter.acquire(url)
+        threads = []
+        for name, priority in [('b', BACKGROUND), ('i0', INTERACTIVE),
+                               ('i1', INTERACTIVE), ('i2', INTERACTIVE),
+                               ('i3', INTERACTIVE)]:
+            queued = len(limiter._waiting[priority])
+            thread = threading.Thread(target=run, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            # Wait until the thread is queued, to fix the order.
+            while len(limiter._waiting[priority]) == queued:
+                time.sleep(0.001)
+        limiter.release(url)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['i0', 'i1', 'b', 'i2', 'i3'])
+
+    def test_non_blocking(self):
+        limiter = ConcurrencyLimiter(default_limit=1,
+                                     use_suite_defaults=False)
+        self.assertTrue(limiter.acquire(self.urls[0], blocking=False))
+        self.assertFalse(limiter.acquire(self.urls[1], blocking=False,
+                                         priority=INTERACTIVE))
+        self.assertTrue(limiter.acquire(self.urls[4], blocking=False))
+        limiter.release(self.urls[0])
+        self.assertTrue(limiter.acquire(self.urls[1], blocking=False,
+                                        priority=INTERACTIVE))
+
+    def test_fetch__priority(self):
+        priorities = []
+        limiter = mock.Mock(acquire=lambda url, blocking=True,
+                            priority=BACKGROUND: priorities.append(priority))
+        iterator = mock.Mock(priority=INTERACTIVE, cache_ttl=None,
+                             deadline=None, prepare_request=None)
+        with mock.patch('vidscraper.fetch.requests'):
+            with mock.patch.object(fetch, 'concurrency_limiter', limiter):
+                fetch.fetch(self.urls[0])
+                fetch.fetch(self.urls[0], iterator)
+                fetch.fetch(self.urls[0], iterator, priority=BACKGROUND)
+        self.assertEqual(priorities, [BACKGROUND, INTERACTIVE, BACKGROUND])
@@ -0,0 +1,182 @@
+import mock
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from vidscraper import fetch
+from vidscraper.cache import LOADER_ERROR, NegativeCache
+from vidscraper.exceptions import CircuitOpen
+from vidscraper.retry import CircuitBreaker, CircuitBreakers, RetryPolicy
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import (Video, VideoLoader, _get_loader_names,
+                               load_videos)
+
+
+class TitleLoader(VideoLoader):
+    fields = set(['title'])
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+    def get_video_data(self, response):
+        return {'title': self.url_format}
+
+
+class DownLoader(TitleLoader):
+    url_format = 'http://down.example.com/{url}'
+
+
+class UpLoader(TitleLoader):
+    url_format = 'http://up.example.com/{url}'
+
+
+class FetchTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def setUp(self):
+        for name, value in (('retry_policy', RetryPolicy(max_attempts=3)),
+                            ('circuit_breakers', CircuitBreakers(
+                                         failure_threshold=3)),
+                            ('grequests', None)):
+            patcher = mock.patch.object(fetch, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('vidscraper.fetch.requests')
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('vidscraper.fetch.time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_response(self, content, code=200, headers=None):
+        response = super(FetchTestCase, self).get_response(content, code)
+        response.headers = CaseInsensitiveDict(headers or {})
+        return response
+
+    def open_circuit(self, url):
+        for i in range(3):
+            fetch.circuit_breakers.record(url, False)
+
+    def test_retry(self):
+        self.requests.get.side_effect = [
+            ConnectionError(),
+            self.get_response('', 503, {'Retry-After': '7'}),
+            self.get_response('a'),
+        ]
+        self.assertEqual(fetch.fetch(self.url).content, 'a')
+        self.assertEqual(self.requests.get.call_count, 3)
+        self.assertTrue(0 <= self.time.sleep.call_args_list[0][0][0] <= 0.5)
+        self.assertEqual(self.time.sleep.call_args_list[1][0][0], 7)
+
+    def test_retry__gives_up(self):
+        self.requests.get.side_effect = ConnectionError()
+        self.assertRaises(ConnectionError, fetch.fetch, self.url)
+        self.assertEqual(self.requests.get.call_count, 3)
+        # The circuit opened after three failures.
+        self.assertRaises(CircuitOpen, fetch.fetch, self.url)
+        self.assertEqual(self.requests.get.call_count, 3)
+
+    def test_retry__circuit_opens(self):
+        """Retries stop once the host's circuit is open."""
+        self.open_circuit(self.url)
+        fetch.circuit_breakers.get(self.url).opened_at = 0
+        self.requests.get.return_value = self.get_response('', 500)
+        with mock.patch('vidscraper.retry.time') as time:
+            time.time.return_value = 30
+            self.assertEqual(fetch.fetch(self.url).status_code, 500)
+        self.assertEqual(self.requests.get.call_count, 1)
+
+    def test_not_retried(self):
+        self.requests.get.return_value = self.get_response('', 404)
+        self.assertEqual(fetch.fetch(self.url).status_code, 404)
+        self.assertEqual(self.requests.get.call_count, 1)
+
+    def test_fetch_many__open_circuit(self):
+        self.open_circuit(self.url)
+        self.requests.get.return_value = self.get_response('a')
+        responses = fetch.fetch_many([(self.url, None, {}),
+                                      ('http://other.example.com/', None, {})])
+        self.assertTrue(responses[0] is None)
+        self.assertEqual(responses[1].content, 'a')
+
+    def test_get_best_loaders(self):
+        """Loaders for hosts with open circuits are routed around."""
+        video = Video('1', loaders=[DownLoader('1'), UpLoader('1')],
+                      fields=['title'])
+        self.open_circuit(DownLoader('1').get_url())
+        self.assertEqual(fetch.circuit_breakers.open_hosts(),
+                         ['down.example.com'])
+        self.assertEqual([type(loader) for loader in
+                          video.get_best_loaders()], [UpLoader])
+
+        video = Video('1', loaders=[DownLoader('1')], fields=['title'])
+        self.requests.get.return_value = self.get_response('')
+        with mock.patch.object(fetch, 'negative_cache', NegativeCache()):
+            video.load()
+            # An outage says nothing about the video.
+            self.assertTrue(fetch.negative_cache.get(
+                    '1', (LOADER_ERROR,),
+                    loaders=_get_loader_names(video._errors)) is None)
+        self.assertFalse(self.requests.get.called)
+        self.assertTrue(isinstance(video._errors.values()[0], CircuitOpen))
+
+    def test_load__circuit_opens(self):
+        """
+        Loaders whose requests aren't sent because their circuit opened
+        after they were chosen get a CircuitOpen error, not a parse error.
+
+        """
+        open_circuit = self.open_circuit
+
+        class OpeningLoader(DownLoader):
+            def get_request_kwargs(self):
+                open_circuit(self.get_url())
+                return super(OpeningLoader, self).get_request_kwargs()
+
+        for load in (lambda video: video.load(),
+                     lambda video: load_videos([video])):
+            fetch.circuit_breakers = CircuitBreakers(failure_threshold=3)
+            video = Video('1', loaders=[OpeningLoader('1')],
+                          fields=['title'])
+            with mock.patch.object(fetch, 'negative_cache',
+                                   NegativeCache()):
+                load(video)
+                self.assertTrue(fetch.negative_cache.get(
+                        '1', (LOADER_ERROR,),
+                        loaders=_get_loader_names(video._errors)) is None)
+            self.assertFalse(self.requests.get.called)
+            self.assertTrue(isinstance(video._errors.values()[0],
+                                       CircuitOpen))
+
+
+class RetryPolicyTestCase(BaseTestCase):
+    def test_get_delay(self):
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        for attempt in range(6):
+            self.assertTrue(0 <= policy.get_delay(attempt) <=
+                            min(10, 2 ** attempt))
+        response = mock.Mock(headers=CaseInsensitiveDict({
+                             'Retry-After': 'Mon, 02 Jan 2012 08:30:05 GMT'}))
+        self.assertEqual(policy.get_retry_after(response, now=1325493000), 5)
+        # Retry-After values beyond the maximum delay are ignored.
+        response.headers['Retry-After'] = '3600'
+        self.assertTrue(policy.get_delay(0, response) <= 1)
+
+
+class CircuitBreakerTestCase(BaseTestCase):
+    def test_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record(False, now=0)
+        self.assertTrue(breaker.allow(now=0))
+        breaker.record(False, now=0)
+        self.assertTrue(breaker.is_open(now=29))
+        self.assertFalse(breaker.allow(now=29))
+        # Only one trial request is allowed once the timeout has passed.
+        self.assertFalse(breaker.is_open(now=30))
+        self.assertTrue(breaker.allow(now=30))
+        self.assertFalse(breaker.allow(now=30))
+        breaker.record(False, now=31)
+        self.assertFalse(breaker.allow(now=60))
+        self.assertTrue(breaker.allow(now=61))
+        breaker.record(True, now=61)
+        self.assertFalse(breaker.is_open(now=61))
+        self.assertEqual(breaker.failures, 0)
@@ -0,0 +1,209 @@
+import BaseHTTPServer
+import datetime
+from email.utils import formatdate
+from calendar import timegm
+import threading
+
+from vidscraper.scheduler import FeedState, HashRing, Scheduler
+from vidscraper.tests.base import BaseTestCase
+
+
+class FakeFeedServer(BaseHTTPServer.HTTPServer):
+    """
+    Serves an RSS feed of :attr:`items` at any path on localhost, with
+    support for If-None-Match. Records the paths which were requested.
+
+    """
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeFeedHandler)
+        self.items = []
+        self.requests = []
+
+    @property
+    def etag(self):
+        return '"{0}"'.format(len(self.items))
+
+    def url(self, path):
+        return 'http://127.0.0.1:{0}{1}'.format(self.server_port, path)
+
+    def add_item(self, guid, published):
+        self.items.insert(0, (guid, published))
+
+    def render(self):
+        entries = ''.join(
+            '<item><title>{0}</title><link>http://example.com/{0}</link>'
+            '<guid>urn:fake:{0}</guid><pubDate>{1}</pubDate></item>'.format(
+                guid, formatdate(timegm(published.utctimetuple()),
+                                 usegmt=True))
+            for guid, published in self.items)
+        return ('<?xml version="1.0"?><rss version="2.0"><channel>'
+                '<title>Fake</title>{0}</channel></rss>'.format(entries))
+
+
+class FakeFeedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        content = self.server.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', self.server.etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class SchedulerTestCase(BaseTestCase):
+    def setUp(self):
+        self.server = FakeFeedServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = self.server.url('/feed.rss')
+        self.scheduler = Scheduler(min_interval=60, max_interval=3600)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_poll(self):
+        self.server.add_item('1', datetime.datetime(2012, 1, 1, 10))
+        self.server.add_item('2', datetime.datetime(2012, 1, 1, 10, 20))
+        self.scheduler.add(self.url)
+
+        results = self.scheduler.run_once(now=1000)
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertTrue(result.error is None)
+        self.assertEqual([video.title for video in result.videos],
+                         ['2', '1'])
+        state = result.state
+        self.assertEqual(state.since_guid, 'urn:fake:2')
+        self.assertEqual(state.etag, '"2"')
+        # The feed published every 20 minutes.
+        self.assertEqual(state.interval, 1200)
+        self.assertEqual(state.next_poll, 2200)
+        self.assertEqual(self.scheduler.due(now=2000), [])
+
+        # Unchanged feeds are polled less often.
+        result = self.scheduler.run_once(now=2200)[0]
+        self.assertTrue(result.not_modified)
+        self.assertEqual(result.videos, [])
+        self.assertEqual(state.unchanged_count, 1)
+        self.assertEqual(state.interval, 1800)
+
+        # Only new videos are returned.
+        self.server.add_item('3', datetime.datetime(2012, 1, 1, 10, 40))
+        result = self.scheduler.run_once(now=5000)[0]
+        self.assertEqual([video.title for video in result.videos], ['3'])
+        self.assertEqual(state.unchanged_count, 0)
+        self.assertEqual(state.since_guid, 'urn:fake:3')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_poll__video_fields(self):
+        """
+        The high-water mark and publishing cadence should be tracked even if
+        the videos don't load the fields they're based on.
+
+        """
+        self.scheduler.video_fields = ['title']
+        self.server.add_item('1', datetime.datetime(2012, 1, 1, 10))
+        self.server.add_item('2', datetime.datetime(2012, 1, 1, 10, 20))
+        self.scheduler.add(self.url)
+
+        result = self.scheduler.run_once(now=1000)[0]
+        self.assertTrue(result.error is None)
+        self.assertEqual([video.title for video in result.videos],
+                         ['2', '1'])
+        self.assertEqual(result.videos[0].fields, ['title'])
+        state = result.state
+        self.assertEqual(state.since_guid, 'urn:fake:2')
+        self.assertEqual(state.since_datetime,
+                         datetime.datetime(2012, 1, 1, 10, 20))
+        self.assertEqual(state.interval, 1200)
+
+        # A changed feed with nothing new counts as unchanged.
+        self.server.items.append(('0', datetime.datetime(2012, 1, 1, 9)))
+        result = self.scheduler.run_once(now=2200)[0]
+        self.assertFalse(result.not_modified)
+        self.assertEqual(result.videos, [])
+        self.assertEqual(state.unchanged_count, 1)
+
+    def test_poll__first_poll_limit(self):
+        self.scheduler.first_poll_limit = 2
+        for i in range(5):
+            self.server.add_item(str(i),
+                                 datetime.datetime(2012, 1, 1, 10, i))
+        self.scheduler.add(self.url)
+        result = self.scheduler.run_once(now=1000)[0]
+        self.assertEqual([video.title for video in result.videos],
+                         ['4', '3'])
+        self.assertEqual(result.state.since_guid, 'urn:fake:4')
+
+        # Later polls aren't limited.
+        for i in range(5, 9):
+            self.server.add_item(str(i),
+                                 datetime.datetime(2012, 1, 1, 10, i))
+        result = self.scheduler.run_once(now=result.state.next_poll)[0]
+        self.assertEqual([video.title for video in result.videos],
+                         ['8', '7', '6', '5'])
+
+    def test_poll__duplicates(self):
+        self.server.add_item('1', datetime.datetime(2012, 1, 1, 10))
+        self.server.add_item('1', datetime.datetime(2012, 1, 1, 10, 20))
+        self.scheduler.add(self.url)
+        result = self.scheduler.run_once(now=1000)[0]
+        self.assertEqual(len(result.videos), 1)
+
+    def test_poll__error(self):
+        self.scheduler.add(self.server.url('/feed.rss').replace(
+                str(self.server.server_port), '1'))
+        result = self.scheduler.run_once(now=0)[0]
+        self.assertTrue(result.error is not None)
+        self.assertEqual(result.state.interval, 90)
+
+    def test_interval_bounds(self):
+        state = FeedState(self.url, publish_datetimes=[
+            datetime.datetime(2012, 1, 1),
+            datetime.datetime(2012, 1, 1, 0, 0, 10),
+        ])
+        self.assertEqual(self.scheduler.get_interval(state), 60)
+        state.unchanged_count = 20
+        self.assertEqual(self.scheduler.get_interval(state), 3600)
+
+    def test_state_serialize(self):
+        state = FeedState(self.url, etag='"1"',
+                          since_datetime=datetime.datetime(2012, 1, 1),
+                          publish_datetimes=[datetime.datetime(2012, 1, 1)])
+        new_state = FeedState.deserialize(state.serialize())
+        self.assertEqual(new_state.__dict__, state.__dict__)
+
+    def test_sharding(self):
+        ring = HashRing(['a', 'b', 'c'])
+        urls = ['http://example.com/{0}'.format(i) for i in range(300)]
+        schedulers = [Scheduler(ring=ring, node=node)
+                      for node in ('a', 'b', 'c')]
+        for scheduler in schedulers:
+            for url in urls:
+                scheduler.add(url)
+        due = [set(state.url for state in scheduler.due(now=0))
+               for scheduler in schedulers]
+        # Every feed is handled by exactly one node.
+        self.assertEqual(sum(len(urls) for urls in due), 300)
+        self.assertEqual(set.union(*due), set(urls))
+        for node_urls in due:
+            self.assertTrue(len(node_urls) > 50)
+
+        # Removing a node only moves its own feeds.
+        before = dict((url, ring.get_node(url)) for url in urls)
+        ring.remove('c')
+        for url in urls:
+            if before[url] != 'c':
+                self.assertEqual(ring.get_node(url), before[url])
@@ -0,0 +1,100 @@
+import time
+
+import mock
+from requests.exceptions import Timeout
+
+from vidscraper import fetch
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.timeouts import AdaptiveTimeouts
+from vidscraper.videos import VideoLoader
+
+
+class SlowLoader(VideoLoader):
+    timeout = 10
+
+    def get_url_data(self, url):
+        return {}
+
+
+class AdaptiveTimeoutsTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def test_default(self):
+        timeouts = AdaptiveTimeouts(default=3, connect_ceiling=2)
+        self.assertEqual(timeouts.get(self.url), (2, 3))
+
+    def test_percentile(self):
+        timeouts = AdaptiveTimeouts(percentile=90, multiplier=2,
+                                    min_samples=10, connect_floor=0.5,
+                                    connect_ceiling=5, read_floor=1,
+                                    read_ceiling=30)
+        for latency in xrange(1, 11):
+            timeouts.record(self.url, latency / 10.0)
+        self.assertEqual(timeouts.get_percentile(self.url), 0.9)
+        self.assertEqual(timeouts.get(self.url), (1.8, 1.8))
+        self.assertEqual(timeouts.get('http://other.com/'), (3, 3))
+
+    def test_floors_and_ceilings(self):
+        timeouts = AdaptiveTimeouts(min_samples=1, connect_floor=0.5,
+                                    connect_ceiling=5, read_floor=1,
+                                    read_ceiling=30)
+        timeouts.record(self.url, 0.01)
+        self.assertEqual(timeouts.get(self.url), (0.5, 1))
+        timeouts.record_timeout(self.url, (5, 20))
+        self.assertEqual(timeouts.get(self.url), (5, 30))
+
+
+class FetchTestCase(BaseTestCase):
+    url = 'http://example.com/'
+
+    def setUp(self):
+        patcher = mock.patch('vidscraper.fetch.requests')
+        self.requests = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(fetch, 'timeouts',
+                                    AdaptiveTimeouts(min_samples=1))
+        self.timeouts = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_timeout(self, **kwargs):
+        fetch.fetch(self.url, **kwargs)
+        return self.requests.get.call_args[1]['timeout']
+
+    def test_fetch(self):
+        self.requests.get.return_value = self.get_response('')
+        self.timeouts.record(self.url, 2)
+        with mock.patch.object(fetch, '_split_timeouts', True):
+            self.assertEqual(self.get_timeout(), (4, 4))
+        with mock.patch.object(fetch, '_split_timeouts', False):
+            self.assertEqual(self.get_timeout(), 4)
+        # Timeouts which are set override the learned ones.
+        self.assertEqual(self.get_timeout(timeout=10), 10)
+
+    def test_loader_override(self):
+        self.requests.get.return_value = self.get_response('')
+        loader = SlowLoader(self.url)
+        self.assertEqual(self.get_timeout(**loader.get_request_kwargs()), 10)
+        # Without an override, the first (instant) response's latency gives
+        # the shortest read timeout.
+        loader.timeout = None
+        with mock.patch.object(fetch, '_split_timeouts', False):
+            self.assertEqual(self.get_timeout(**loader.get_request_kwargs()),
+                             1)
+
+    def test_record(self):
+        self.requests.get.side_effect = Timeout
+        with mock.patch.object(fetch, '_split_timeouts', True):
+            self.assertRaises(Timeout, fetch.fetch, self.url)
+        self.assertEqual(self.timeouts.get_percentile(self.url), 3)
+
+    def test_record__deadline(self):
+        """Timeouts cut short by a deadline aren't recorded."""
+        self.requests.get.side_effect = Timeout
+        self.assertRaises(Timeout, fetch.fetch, self.url,
+                          deadline=time.time() + 1)
+        self.assertTrue(self.timeouts.get_percentile(self.url) is None)
+        # Timeouts which end before the deadline still are.
+        with mock.patch.object(fetch, '_split_timeouts', True):
+            self.assertRaises(Timeout, fetch.fetch, self.url,
+                              deadline=time.time() + 60)
+        self.assertEqual(self.timeouts.get_percentile(self.url), 3)
@@ -0,0 +1,74 @@
+import datetime
+
+import mock
+
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.utils import timestamps
+from vidscraper.utils.timestamps import parse_timestamp, parse_isoformat
+
+
+class ParseTimestampTestCase(BaseTestCase):
+    def setUp(self):
+        timestamps._memo.clear()
+
+    def test_fast_paths(self):
+        """
+        Each fast path should give the same result as strptime.
+
+        """
+        values = (
+            ("2007-05-07T22:15:21.000Z", "%Y-%m-%dT%H:%M:%S.000Z"),
+            ("2005-02-16 23:09:19", "%Y-%m-%d %H:%M:%S"),
+            ("2010-09-17T22:31:14Z", "%Y-%m-%dT%H:%M:%SZ"),
+            ("2012-12-25T06:46:01", "%Y-%m-%dT%H:%M:%S"),
+            ("2012-12-25T06:46:01.123456", "%Y-%m-%dT%H:%M:%S.%f"),
+            ("2012-12-25T06:46:01.5", "%Y-%m-%dT%H:%M:%S.%f"),
+        )
+        for value, format in values:
+            with mock.patch.object(timestamps, 'datetime',
+                                   wraps=datetime) as wrapped:
+                dt = parse_timestamp(value, format)
+            self.assertFalse(wrapped.datetime.strptime.called)
+            self.assertEqual(dt, datetime.datetime.strptime(value, format))
+
+    def test_fallback(self):
+        """
+        Values and formats without a fast path should be parsed by strptime.
+
+        """
+        self.assertEqual(parse_timestamp("2012-1-5 3:04:05",
+                                         "%Y-%m-%d %H:%M:%S"),
+                         datetime.datetime(2012, 1, 5, 3, 4, 5))
+        self.assertEqual(parse_timestamp("12.25.12", "%m.%d.%y"),
+                         datetime.datetime(2012, 12, 25))
+
+    def test_invalid(self):
+        for value in ("2012-13-25 06:46:01", "2012-12-25T06:46:01",
+                      "2012-12-25 06:46:0a", ""):
+            self.assertRaises(ValueError, parse_timestamp, value,
+                              "%Y-%m-%d %H:%M:%S")
+        self.assertRaises(TypeError, parse_timestamp, None,
+                          "%Y-%m-%d %H:%M:%S")
+
+    def test_memo(self):
+        parse_timestamp("2005-02-16 23:09:19", "%Y-%m-%d %H:%M:%S")
+        with mock.patch.dict(timestamps._FAST_PATHS, clear=True):
+            with mock.patch.object(timestamps, 'datetime') as wrapped:
+                dt = parse_timestamp("2005-02-16 23:09:19",
+                                     "%Y-%m-%d %H:%M:%S")
+        self.assertFalse(wrapped.datetime.strptime.called)
+        self.assertEqual(dt, datetime.datetime(2005, 2, 16, 23, 9, 19))
+
+    def test_memo__bounded(self):
+        with mock.patch.object(timestamps, 'MEMO_SIZE', 5):
+            for second in xrange(20):
+                parse_timestamp("2005-02-16 23:09:{0:02}".format(second),
+                                "%Y-%m-%d %H:%M:%S")
+                self.assertTrue(len(timestamps._memo) <= 5)
+
+    def test_parse_isoformat(self):
+        for dt in (datetime.datetime(2012, 12, 25, 6, 46, 1),
+                   datetime.datetime(2012, 12, 25, 6, 46, 1, 1234)):
+            self.assertEqual(parse_isoformat(dt.isoformat()), dt)
+        self.assertRaises(ValueError, parse_isoformat, "2012-12-25")
+        self.assertRaises(TypeError, parse_isoformat, 5)
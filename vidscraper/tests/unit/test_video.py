@@ -1,10 +1,119 @@
 import datetime
+import itertools
 import json
+import multiprocessing
 import pickle
+import time
+
+import mock
+from requests.structures import CaseInsensitiveDict
 
 from vidscraper.tests.base import BaseTestCase
 from vidscraper.tests.unit.test_youtube import CARAMELL_DANSEN_API_DATA
-from vidscraper.videos import Video, OEmbedLoaderMixin, VideoFile
+from vidscraper.exceptions import DeadlineExceeded, VideoDeleted
+from vidscraper.keys import KeyPool
+from vidscraper.videos import (BaseFeed, BaseSearch, Video,
+                               OEmbedLoaderMixin, VideoFile, VideoLoader,
+                               load_videos)
+
+
+class FieldsLoader(VideoLoader):
+    fields = set(['title', 'user'])
+    url_format = 'http://example.com/{url}'
+    accepts_fields = True
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+    def get_video_data(self, response, fields=None):
+        self.requested_fields = fields
+        return dict((f, f) for f in fields)
+
+
+class PlainLoader(FieldsLoader):
+    accepts_fields = False
+
+    def get_video_data(self, response):
+        return {'title': 'title', 'user': 'user'}
+
+
+class ContentLoader(FieldsLoader):
+    def get_video_data(self, response, fields=None):
+        return {'title': response.content}
+
+
+class JsonFeed(BaseFeed):
+    page_url_format = 'http://example.com/{url}'
+    per_page = 10
+
+    def get_url_data(self, url):
+        return {'url': url}
+
+    def get_response_items(self, response):
+        return response.json()['items']
+
+    def get_video_data(self, item):
+        return item
+
+    def data_from_response(self, response):
+        return {'title': response.json()['title']}
+
+
+class PagedFeed(JsonFeed):
+    page_url_format = 'http://example.com/{url}?page={page}'
+    per_page = 2
+
+
+class DatedFeed(PagedFeed):
+    def get_video_data(self, item):
+        data = item.copy()
+        data['publish_datetime'] = datetime.datetime(2012, 1, data.pop('day'))
+        return data
+
+
+class DatedFieldsFeed(DatedFeed):
+    accepts_fields = True
+
+    def get_video_data(self, item, fields=None):
+        data = super(DatedFieldsFeed, self).get_video_data(item)
+        return dict((key, value) for key, value in data.iteritems()
+                    if fields is None or key in fields)
+
+
+class JsonSearch(BaseSearch):
+    page_url_format = 'http://example.com/?q={query}'
+
+
+class BatchLoader(FieldsLoader):
+    batch_size = 2
+    batch_url_format = 'http://example.com/batch?ids={ids}'
+
+    def get_batch_url(self, url_data_list, fields):
+        return self.batch_url_format.format(
+                      ids=','.join(data['url'] for data in url_data_list))
+
+    def get_batch_video_data(self, response, url_data_list, fields):
+        items = response.json()
+        return [dict((f, items[data['url']]) for f in fields)
+                if data['url'] in items else VideoDeleted(data['url'])
+                for data in url_data_list]
+
+
+class PicklingPool(object):
+    """
+    Stands in for a process pool by sending arguments and results through
+    pickle, as :class:`multiprocessing.Pool` would.
+
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def map(self, func, iterable):
+        self.calls += 1
+        results = []
+        for args in pickle.loads(pickle.dumps(list(iterable))):
+            results.append(func(args))
+        return pickle.loads(pickle.dumps(results))
 
 
 class VideoTestCase(BaseTestCase):
@@ -176,6 +285,421 @@ class VideoTestCase(BaseTestCase):
         self.assertTrue(video.get_file() is None)
 
 
+class RunLoadersTestCase(BaseTestCase):
+    def run_loaders(self, loader, fields):
+        video = Video('1', loaders=[loader], fields=fields)
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('')
+                return video.run_loaders()
+
+    def test_run_loaders__accepts_fields(self):
+        loader = FieldsLoader('1')
+        data = self.run_loaders(loader, ['title'])
+        self.assertEqual(loader.requested_fields, set(['title']))
+        self.assertEqual(data, {'title': 'title'})
+
+    def test_run_loaders__unaware(self):
+        data = self.run_loaders(PlainLoader('1'), ['title'])
+        self.assertEqual(data, {'title': 'title', 'user': 'user'})
+
+    def test_run_loaders__parse_pool(self):
+        """
+        With a parse pool, responses should be parsed in the pool and errors
+        should still be recorded per loader.
+
+        """
+        pool = PicklingPool()
+        loader = ContentLoader('1')
+        video = Video('1', loaders=[loader], fields=['title'])
+        video.parse_pool = pool
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('content')
+                data = video.run_loaders()
+        self.assertEqual(pool.calls, 1)
+        self.assertEqual(data, {'title': 'content'})
+
+        video = Video('1', loaders=[FieldsLoader('1')], fields=['user'])
+        video.parse_pool = pool
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('')
+                data = video.run_loaders()
+        # FieldsLoader sets an attribute on itself, which is lost in the
+        # pool, but its data still comes back.
+        self.assertEqual(data, {'user': 'user'})
+
+    def test_run_loaders__parse_pool_key_pool(self):
+        """Loaders with a :class:`.KeyPool` can be sent to a parse pool."""
+        pool = PicklingPool()
+        loader = ContentLoader('1', api_keys={'key': KeyPool(['a', 'b'])})
+        video = Video('1', loaders=[loader], fields=['title'])
+        video.parse_pool = pool
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('content')
+                data = video.run_loaders()
+        self.assertEqual(pool.calls, 1)
+        self.assertEqual(data, {'title': 'content'})
+
+
+class LoadVideosTestCase(BaseTestCase):
+    def load_videos(self, videos, items):
+        def get(url, **kwargs):
+            if url.startswith('http://example.com/batch'):
+                return self.get_response(json.dumps(dict(
+                    (id, items.get(id)) for id in url.split('=')[1].split(',')
+                    if id in items)))
+            return self.get_response('')
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.side_effect = get
+                load_videos(videos)
+        return [call[0][0] for call in requests.get.call_args_list]
+
+    def test_batches(self):
+        videos = [Video(id, loaders=[BatchLoader(id)], fields=['title'])
+                  for id in ('1', '2', '3', '1')]
+        videos.append(Video('4', loaders=[PlainLoader('4')],
+                            fields=['title']))
+        urls = self.load_videos(videos, {'1': 'one', '2': 'two'})
+        self.assertEqual(sorted(urls), [
+            'http://example.com/4',
+            'http://example.com/batch?ids=1,2',
+            'http://example.com/batch?ids=3',
+        ])
+        self.assertEqual([video.title for video in videos],
+                         ['one', 'two', None, 'one', 'title'])
+        self.assertTrue(all(video.is_loaded() for video in videos))
+        self.assertTrue(isinstance(videos[2]._errors.values()[0],
+                                   VideoDeleted))
+
+    def test_single(self):
+        """A batch loader for a single video makes its usual request."""
+        video = Video('1', loaders=[BatchLoader('1')], fields=['title'])
+        urls = self.load_videos([video], {})
+        self.assertEqual(urls, ['http://example.com/1'])
+        self.assertEqual(video.title, 'title')
+
+    def test_batch_error(self):
+        videos = [Video(id, loaders=[BatchLoader(id)], fields=['title'])
+                  for id in ('1', '2')]
+        with mock.patch.object(BatchLoader, 'get_batch_video_data',
+                               side_effect=ValueError):
+            self.load_videos(videos, {})
+        for video in videos:
+            self.assertTrue(isinstance(video._errors.values()[0],
+                                       ValueError))
+
+
+class ParsePoolIteratorTestCase(BaseTestCase):
+    content = json.dumps({
+        'title': 'Feed',
+        'items': [{'link': 'http://example.com/1', 'title': 'One'},
+                  {'link': 'http://example.com/2', 'title': 'Two'}],
+    })
+
+    def iterate(self, pool):
+        iterator = JsonFeed('feed')
+        iterator.parse_pool = pool
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.return_value = self.get_response(self.content)
+            iterator.load()
+            videos = list(iterator)
+        self.assertEqual(iterator.title, 'Feed')
+        self.assertEqual([video.title for video in videos], ['One', 'Two'])
+        self.assertEqual(requests.get.call_count, 1)
+        return iterator
+
+    def test_no_pool(self):
+        self.iterate(None)
+
+    def test_pickling_pool(self):
+        pool = PicklingPool()
+        self.iterate(pool)
+        self.assertEqual(pool.calls, 1)
+
+    def test_process_pool(self):
+        pool = multiprocessing.Pool(1)
+        try:
+            self.iterate(pool)
+        finally:
+            pool.terminate()
+
+    def test_pickle(self):
+        iterator = self.iterate(PicklingPool())
+        new_iterator = pickle.loads(pickle.dumps(iterator))
+        self.assertTrue(new_iterator._response is None)
+        self.assertTrue(new_iterator.parse_pool is None)
+        self.assertEqual(new_iterator.title, 'Feed')
+
+
+class PagedFeedTestMixin(object):
+    def get_page(self, url, **kwargs):
+        page = int(url.rsplit('=', 1)[1])
+        self.pages.append(page)
+        items = [{'link': 'http://example.com/{0}'.format(i),
+                  'title': str(i), 'guid': str(i), 'day': 10 - i}
+                 for i in range(page * 2 - 1, min(page * 2, 5) + 1)]
+        return self.get_response(json.dumps({'title': 'Feed',
+                                             'items': items}))
+
+    def iterate(self, feed, count=None, load=False):
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.side_effect = self.get_page
+            if load:
+                feed.load()
+            return [video.title for video in itertools.islice(feed, count)]
+
+    def setUp(self):
+        self.pages = []
+
+
+class DeadlineTestCase(PagedFeedTestMixin, BaseTestCase):
+    def test_video_load(self):
+        video = Video('1', loaders=[FieldsLoader('1')], fields=['title'])
+        with mock.patch('vidscraper.fetch.grequests', None):
+            with mock.patch('vidscraper.fetch.requests') as requests:
+                requests.get.return_value = self.get_response('')
+                video.load(deadline=time.time() - 1)
+                self.assertTrue(video.partial)
+                self.assertFalse(video.is_loaded())
+                self.assertTrue(isinstance(video._errors.values()[0],
+                                           DeadlineExceeded))
+                self.assertEqual(requests.get.call_count, 0)
+
+                video.load()
+                self.assertFalse(video.partial)
+                self.assertTrue(video.is_loaded())
+                self.assertEqual(video.title, 'title')
+
+    def test_iterator(self):
+        feed = PagedFeed('feed')
+        get_page = self.get_page
+
+        def get_first_page(url, **kwargs):
+            # The deadline passes while the first page is fetched.
+            feed.deadline = time.time() - 1
+            return get_page(url, **kwargs)
+        self.get_page = get_first_page
+        self.assertEqual(self.iterate(feed), ['1', '2'])
+        self.assertTrue(feed.partial)
+
+        self.get_page = get_page
+        feed.deadline = None
+        self.assertEqual(self.iterate(feed), ['3', '4', '5'])
+        self.assertFalse(feed.partial)
+
+    def test_iterator__resume_mid_page(self):
+        feed = PagedFeed('feed')
+        self.assertEqual(self.iterate(feed, 3), ['1', '2', '3'])
+        new_feed = PagedFeed.from_checkpoint(feed.checkpoint())
+        new_feed.deadline = time.time() - 1
+        self.assertEqual(self.iterate(new_feed), [])
+        self.assertTrue(new_feed.partial)
+        # The videos already returned from the page are still skipped.
+        state = new_feed.checkpoint()
+        self.assertEqual(state['page_offset'], 1)
+
+        new_feed = PagedFeed.from_checkpoint(state)
+        self.assertEqual(self.iterate(new_feed), ['4', '5'])
+
+
+class CheckpointTestCase(PagedFeedTestMixin, BaseTestCase):
+    def test_resume__mid_page(self):
+        feed = PagedFeed('feed', last_modified=datetime.datetime(2012, 1, 1))
+        self.assertEqual(self.iterate(feed, 3, load=True), ['1', '2', '3'])
+        state = json.loads(json.dumps(feed.checkpoint()))
+        self.assertEqual(state['item_count'], 3)
+        self.assertEqual(state['page_offset'], 1)
+
+        self.pages = []
+        new_feed = PagedFeed.from_checkpoint(state)
+        self.assertTrue(new_feed._loaded)
+        self.assertEqual(new_feed.title, 'Feed')
+        self.assertEqual(new_feed.last_modified,
+                         datetime.datetime(2012, 1, 1))
+        self.assertEqual(self.iterate(new_feed), ['4', '5'])
+        self.assertEqual(self.pages, [2, 3])
+
+    def test_resume__page_boundary(self):
+        feed = PagedFeed('feed')
+        self.assertEqual(self.iterate(feed, 2), ['1', '2'])
+        new_feed = BaseFeed.from_checkpoint(feed.checkpoint())
+        self.assertTrue(isinstance(new_feed, PagedFeed))
+        self.assertEqual(new_feed.title, 'Feed')
+
+        self.pages = []
+        self.assertEqual(self.iterate(new_feed), ['3', '4', '5'])
+        self.assertEqual(self.pages, [2, 3])
+
+    def test_resume__max_results(self):
+        feed = PagedFeed('feed', max_results=4)
+        self.assertEqual(self.iterate(feed, 1), ['1'])
+        new_feed = PagedFeed.from_checkpoint(feed.checkpoint())
+        self.assertEqual(self.iterate(new_feed), ['2', '3', '4'])
+
+    def test_after_load(self):
+        feed = PagedFeed('feed')
+        self.iterate(feed, 0, load=True)
+        state = json.loads(json.dumps(feed.checkpoint()))
+        self.assertEqual(state['item_count'], 0)
+        self.assertEqual(state['page_offset'], 0)
+        pickled_feed = pickle.loads(pickle.dumps(feed))
+
+        self.pages = []
+        new_feed = PagedFeed.from_checkpoint(state)
+        self.assertEqual(self.iterate(new_feed), ['1', '2', '3', '4', '5'])
+        self.assertEqual(self.pages, [1, 2, 3])
+        self.pages = []
+        self.assertEqual(self.iterate(pickled_feed),
+                         ['1', '2', '3', '4', '5'])
+        self.assertEqual(self.pages, [1, 2, 3])
+
+    def test_search(self):
+        search = JsonSearch('query -term', max_results=10)
+        new_search = BaseSearch.from_checkpoint(search.checkpoint())
+        self.assertEqual(new_search.raw_query, 'query -term')
+        self.assertEqual(new_search.max_results, 10)
+
+    def test_wrong_class(self):
+        state = PagedFeed('feed').checkpoint()
+        self.assertRaises(ValueError, BaseSearch.from_checkpoint, state)
+        state['class'] = 'vidscraper.missing.Feed'
+        self.assertRaises(ValueError, BaseFeed.from_checkpoint, state)
+
+
+class SinceTestCase(PagedFeedTestMixin, BaseTestCase):
+    def test_since_guid(self):
+        feed = DatedFeed('feed', since_guid='3', video_fields=['title'])
+        self.assertEqual(self.iterate(feed), ['1', '2'])
+        # Only the pages up to the seen video should be fetched.
+        self.assertEqual(self.pages, [1, 2])
+        self.assertTrue(feed.is_finished())
+        self.assertEqual(feed.newest_guid, '1')
+        self.assertEqual(feed.newest_datetime,
+                         datetime.datetime(2012, 1, 9))
+
+    def test_since_guid__video_fields(self):
+        feed = DatedFeed('feed', since_guid='3', video_fields=['title'])
+        self.assertEqual(feed.get_requested_fields(),
+                         set(('title', 'link', 'guid', 'publish_datetime')))
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.side_effect = self.get_page
+            videos = list(feed)
+        self.assertEqual([video.title for video in videos], ['1', '2'])
+        # The fields needed to find seen videos aren't added to the
+        # requested ones.
+        self.assertEqual(feed.video_fields, ['title'])
+        self.assertEqual(feed.checkpoint()['kwargs']['video_fields'],
+                         ['title'])
+        for video in videos:
+            self.assertEqual(video.fields, ['title'])
+            self.assertEqual(video.guid, None)
+        self.assertEqual(feed.newest_guid, '1')
+
+    def test_first_check__video_fields(self):
+        feed = DatedFieldsFeed('feed', video_fields=['title'])
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.side_effect = self.get_page
+            videos = list(feed)
+        self.assertEqual([video.title for video in videos],
+                         ['1', '2', '3', '4', '5'])
+        self.assertEqual(videos[0].fields, ['title'])
+        self.assertEqual(feed.newest_guid, '1')
+        self.assertEqual(feed.newest_datetime,
+                         datetime.datetime(2012, 1, 9))
+
+    def test_since_datetime(self):
+        feed = DatedFeed('feed',
+                         since_datetime=datetime.datetime(2012, 1, 8))
+        self.assertEqual(self.iterate(feed), ['1'])
+        self.assertEqual(self.pages, [1])
+        self.assertEqual(feed.newest_guid, '1')
+        self.assertEqual(feed.newest_datetime,
+                         datetime.datetime(2012, 1, 9))
+
+    def test_no_new_videos(self):
+        feed = DatedFeed('feed', since_guid='1',
+                         since_datetime=datetime.datetime(2012, 1, 9))
+        self.assertEqual(self.iterate(feed), [])
+        self.assertEqual(feed.newest_guid, '1')
+        self.assertEqual(feed.newest_datetime,
+                         datetime.datetime(2012, 1, 9))
+
+    def test_checkpoint(self):
+        feed = DatedFeed('feed', since_guid='4')
+        self.assertEqual(self.iterate(feed, 1), ['1'])
+        state = json.loads(json.dumps(feed.checkpoint()))
+        new_feed = DatedFeed.from_checkpoint(state)
+        self.assertEqual(new_feed.newest_guid, '1')
+        self.assertEqual(self.iterate(new_feed), ['2', '3'])
+        self.assertEqual(new_feed.newest_guid, '1')
+
+
+class ConditionalGetTestCase(BaseTestCase):
+    def get_feed(self, response, parse_pool=None):
+        feed = JsonFeed('feed', etag='"old"',
+                        last_modified=datetime.datetime(2012, 1, 1, 12))
+        feed.parse_pool = parse_pool
+        with mock.patch('vidscraper.fetch.requests') as requests:
+            requests.get.return_value = response
+            videos = list(feed)
+        self.assertEqual(requests.get.call_count, 1)
+        headers = requests.get.call_args[1]['headers']
+        self.assertEqual(headers['If-None-Match'], '"old"')
+        self.assertEqual(headers['If-Modified-Since'],
+                         'Sun, 01 Jan 2012 12:00:00 GMT')
+        return feed, videos
+
+    def get_response(self, content, code=200, headers=None):
+        response = super(ConditionalGetTestCase, self).get_response(content,
+                                                                    code)
+        response.headers = CaseInsensitiveDict(headers or {})
+        return response
+
+    def test_not_modified(self):
+        response = self.get_response('', 304, {'ETag': '"old"'})
+        feed, videos = self.get_feed(response)
+        self.assertTrue(feed.not_modified)
+        self.assertTrue(feed.is_finished())
+        self.assertEqual(videos, [])
+        self.assertEqual(feed.etag, '"old"')
+        self.assertEqual(feed.title, None)
+
+    def test_not_modified__parse_pool(self):
+        pool = PicklingPool()
+        feed, videos = self.get_feed(self.get_response('', 304), pool)
+        self.assertTrue(feed.not_modified)
+        self.assertEqual(videos, [])
+        self.assertEqual(pool.calls, 0)
+
+    def test_modified(self):
+        content = json.dumps({
+            'title': 'Feed',
+            'items': [{'link': 'http://example.com/1', 'title': 'One'}],
+        })
+        response = self.get_response(content, 200, {
+            'ETag': '"new"',
+            'Last-Modified': 'Mon, 02 Jan 2012 08:30:00 GMT',
+        })
+        feed, videos = self.get_feed(response)
+        self.assertFalse(feed.not_modified)
+        self.assertEqual([video.title for video in videos], ['One'])
+        self.assertEqual(feed.title, 'Feed')
+        self.assertEqual(feed.etag, '"new"')
+        self.assertEqual(feed.last_modified,
+                         datetime.datetime(2012, 1, 2, 8, 30))
+
+    def test_later_pages(self):
+        """Only the first page should be requested conditionally."""
+        feed = JsonFeed('feed', etag='"old"')
+        feed.item_count = 10
+        self.assertFalse('If-None-Match' in
+                         feed.get_request_kwargs()['headers'])
+
+
 class OEmbedLoaderMixinTestCase(BaseTestCase):
     def test_get_video_data(self):
         expected_data = {
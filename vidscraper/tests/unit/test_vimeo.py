@@ -89,6 +89,33 @@ class VimeoAdvancedLoaderTestCase(VimeoTestCase):
         self.assertEqual(set(data), self.loader.fields)
         self.assertDictEqual(data, expected_data)
 
+    def test_get_url_for_fields(self):
+        api_url = self.loader.get_url_for_fields(set(['title', 'link']))
+        self.assertEqual(api_url, 'http://vimeo.com/api/rest/v2?format=json&'
+                                  'summary_response=1&method=vimeo.videos.'
+                                  'getInfo&video_id=2')
+        api_url = self.loader.get_url_for_fields(set(['title', 'tags']))
+        self.assertEqual(api_url, self.loader.get_url())
+
+    def test_get_video_data__summary(self):
+        """
+        Summary responses should be parsed for the fields they contain, and
+        full responses should still be accepted if only those fields are
+        requested.
+
+        """
+        fields = set(['title', 'link', 'publish_datetime'])
+        expected_data = {
+            'title': u'Good morning, universe',
+            'link': u'http://vimeo.com/2',
+            'publish_datetime': datetime.datetime(2005, 2, 16, 23, 9, 19),
+        }
+        for data_file in ('vimeo/advanced_summary.json',
+                          'vimeo/advanced.json'):
+            response = self.get_response(self.get_data_file(data_file).read())
+            data = self.loader.get_video_data(response, fields=fields)
+            self.assertDictEqual(data, expected_data)
+
 
 class SimpleFeedTestCase(VimeoTestCase):
     """
@@ -412,6 +439,14 @@ class AdvancedFeedTestCase(VimeoTestCase):
         url = self.feed.get_page_url(page_start=21, page_max=20)
         self.assertEqual(url, expected)
 
+    def test_get_page_url__video_fields(self):
+        expected = ("http://vimeo.com/api/rest/v2?format=json&summary_response=1"
+                    "&per_page=50&method=vimeo.videos.getUploaded&"
+                    "sort=newest&page=1&user_id=plasticcut")
+        self.feed.video_fields = ['title']
+        url = self.feed.get_page_url(page_start=21, page_max=20)
+        self.assertEqual(url, expected)
+
 
 @unittest2.skipIf(oauth_hook is None, "Advanced api requires requests-oauth")
 class VimeoSearchTestCase(VimeoTestCase):
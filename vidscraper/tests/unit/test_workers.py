@@ -0,0 +1,203 @@
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from vidscraper import fetch
+from vidscraper.exceptions import CircuitOpen, UnhandledVideo
+from vidscraper.retry import CircuitBreakers
+from vidscraper.ratelimit import BACKGROUND
+from vidscraper.tests.base import BaseTestCase
+from vidscraper.videos import Video
+from vidscraper.workers import (SQLiteQueue, Worker, VIDEO, FEED, SEARCH,
+                                PENDING, CLAIMED, DONE, FAILED)
+
+
+class SQLiteQueueTestCase(BaseTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'jobs.db')
+        self.queue = SQLiteQueue(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_put_claim_complete(self):
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        self.assertEqual(self.queue.get(job_id).status, PENDING)
+
+        job = self.queue.claim()
+        self.assertEqual(job.id, job_id)
+        self.assertEqual(job.status, CLAIMED)
+        self.assertEqual(job.params, {'url': 'http://example.com/'})
+        self.assertTrue(self.queue.claim() is None)
+
+        self.assertTrue(self.queue.complete(job, {'title': 'Title'}))
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.result, {'title': 'Title'})
+
+    def test_put__unknown_kind(self):
+        self.assertRaises(ValueError, self.queue.put, 'unknown')
+
+    def test_shared(self):
+        """Queues opened on the same file should share jobs."""
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        other_queue = SQLiteQueue(self.path)
+        self.assertEqual(other_queue.claim().id, job_id)
+        self.assertTrue(self.queue.claim() is None)
+
+    def test_timeout(self):
+        """
+        Jobs which aren't finished in time should be handed out again, and
+        the late result should be discarded.
+
+        """
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'},
+                                timeout=0)
+        job = self.queue.claim()
+        time.sleep(0.01)
+        new_job = self.queue.claim()
+        self.assertEqual(new_job.id, job_id)
+        self.assertNotEqual(new_job.token, job.token)
+        self.assertEqual(new_job.attempts, 2)
+        self.assertFalse(self.queue.complete(job, {}))
+
+    def test_timeout__max_attempts(self):
+        queue = SQLiteQueue(self.path, max_attempts=1)
+        job_id = queue.put(VIDEO, {'url': 'http://example.com/'}, timeout=0)
+        queue.claim()
+        time.sleep(0.01)
+        self.assertTrue(queue.claim() is None)
+        self.assertEqual(queue.get(job_id).status, FAILED)
+
+    def test_fail(self):
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        job = self.queue.claim()
+        self.assertTrue(self.queue.fail(job, u'Error'))
+        self.assertEqual(self.queue.get(job_id).status, PENDING)
+
+        job = self.queue.claim()
+        self.assertTrue(self.queue.fail(job, u'Error', retry=False))
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, u'Error')
+
+    def test_fail__delay(self):
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        job = self.queue.claim()
+        self.assertTrue(self.queue.fail(job, u'Error', delay=0.05))
+        self.assertEqual(self.queue.get(job_id).status, PENDING)
+        self.assertTrue(self.queue.claim() is None)
+        time.sleep(0.06)
+        self.assertEqual(self.queue.claim().id, job_id)
+
+
+class WorkerTestCase(BaseTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.queue = SQLiteQueue(os.path.join(self.tempdir, 'jobs.db'))
+        self.worker = Worker(self.queue, api_keys={'key': 'value'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_work__empty(self):
+        self.assertTrue(self.worker.work() is None)
+
+    def test_work__video(self):
+        video = Video('http://example.com/', fields=['title'])
+        video.title = u'Title'
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/',
+                                        'fields': ['title']})
+        with mock.patch('vidscraper.workers.auto_scrape',
+                        return_value=video) as auto_scrape:
+            self.worker.work()
+        job = self.queue.get(job_id)
+        auto_scrape.assert_called_once_with('http://example.com/',
+                                            fields=['title'],
+                                            api_keys={'key': 'value'},
+                                            priority=BACKGROUND,
+                                            deadline=job.deadline)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.result, video.serialize())
+
+    def test_work__feed(self):
+        video = Video('http://example.com/1', fields=['title'])
+        video.title = u'Title'
+        feed = mock.MagicMock()
+        feed._all_fields = ('title',)
+        feed.title = u'Feed'
+        feed.partial = False
+        feed.__iter__.return_value = iter([video])
+        job_id = self.queue.put(FEED, {'url': 'http://example.com/feed'})
+        with mock.patch('vidscraper.workers.registry') as registry:
+            registry.get_feed.return_value = feed
+            self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(feed.deadline, job.deadline)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.result, {'feed': {'title': u'Feed'},
+                                      'videos': [video.serialize()]})
+
+    def test_work__partial(self):
+        """Jobs cut off by their deadline are timed out and retried."""
+        video = Video('http://example.com/', fields=['title'])
+        video.partial = True
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        with mock.patch('vidscraper.workers.auto_scrape',
+                        return_value=video):
+            self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, PENDING)
+        self.assertEqual(job.error, u'Timed out.')
+
+    def test_work__search(self):
+        job_id = self.queue.put(SEARCH, {'query': 'query'})
+        with mock.patch('vidscraper.workers.registry') as registry:
+            registry.get_searches.return_value = []
+            self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(registry.get_searches.call_args[1]['deadline'],
+                         job.deadline)
+        self.assertEqual(job.status, DONE)
+
+    def test_work__unhandled(self):
+        """Errors from vidscraper itself shouldn't be retried."""
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        with mock.patch('vidscraper.workers.auto_scrape',
+                        side_effect=UnhandledVideo('http://example.com/')):
+            self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, u'UnhandledVideo: http://example.com/')
+
+    def test_work__retry(self):
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        with mock.patch('vidscraper.workers.auto_scrape',
+                        side_effect=IOError('Connection reset')):
+            self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, PENDING)
+        self.assertEqual(job.error, u'IOError: Connection reset')
+
+    def test_work__circuit_open(self):
+        """
+        Jobs for hosts with open circuits are retried once the circuit may
+        let a request through.
+
+        """
+        job_id = self.queue.put(VIDEO, {'url': 'http://example.com/'})
+        breakers = CircuitBreakers(reset_timeout=0.05)
+        with mock.patch.object(fetch, 'circuit_breakers', breakers):
+            with mock.patch('vidscraper.workers.auto_scrape',
+                            side_effect=CircuitOpen('example.com')):
+                self.worker.work()
+        job = self.queue.get(job_id)
+        self.assertEqual(job.status, PENDING)
+        self.assertEqual(job.error, u'CircuitOpen: example.com')
+        self.assertTrue(self.queue.claim() is None)
+        time.sleep(0.06)
+        self.assertEqual(self.queue.claim().id, job_id)
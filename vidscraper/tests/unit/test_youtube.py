@@ -63,6 +63,15 @@ class SuiteTestCase(YouTubeTestCase):
                  'user_url', 'thumbnail_url', 'link', 'user', 'guid',
                  'publish_datetime', 'tags', 'license', 'files']))
 
+    def test_canonical_key(self):
+        for url in ('http://www.youtube.com/watch?v=J_DV9b0x7v4&feature=g',
+                    'https://youtube.com/watch/?v=J_DV9b0x7v4',
+                    'http://youtu.be/J_DV9b0x7v4'):
+            self.assertEqual(self.suite.canonical_key(url),
+                             'youtube:J_DV9b0x7v4')
+        self.assertTrue(
+            self.suite.canonical_key('http://example.com/') is None)
+
 
 class YouTubePathTestCase(YouTubeTestCase):
     def test_valid_urls(self):
@@ -138,6 +147,45 @@ class YouTubeApiTestCase(YouTubeTestCase):
         data['tags'] = set(data['tags'])
         self.assertDictEqual(data, CARAMELL_DANSEN_API_DATA)
 
+    def test_get_url_for_fields(self):
+        api_url = self.loader.get_url_for_fields(
+                               set(['title', 'user', 'thumbnail_url', 'tags']))
+        self.assertEqual(
+            api_url,
+            "http://gdata.youtube.com/feeds/api/videos/J_DV9b0x7v4?v=2&alt=json"
+            "&fields=author,title,media:group(media:category,media:keywords,"
+            "media:thumbnail)")
+        self.assertEqual(self.loader.get_url_for_fields(None),
+                         self.loader.get_url())
+
+    def test_get_video_data__partial(self):
+        """
+        Partial responses should be parsed for the requested fields, and
+        full responses should still be accepted.
+
+        """
+        fields = set(['title', 'user', 'thumbnail_url'])
+        for data_file in ('youtube/api_partial.json', 'youtube/api.json'):
+            response = self.get_response(self.get_data_file(data_file).read())
+            data = self.loader.get_video_data(response, fields=fields)
+            self.assertEqual(data, {
+                'title': CARAMELL_DANSEN_API_DATA['title'],
+                'user': CARAMELL_DANSEN_API_DATA['user'],
+                'user_url': CARAMELL_DANSEN_API_DATA['user_url'],
+                'thumbnail_url': CARAMELL_DANSEN_API_DATA['thumbnail_url'],
+            })
+
+    def test_get_video_data__fields(self):
+        api_file = self.get_data_file('youtube/api.json')
+        response = self.get_response(api_file.read())
+        data = self.loader.get_video_data(response,
+                                          fields=set(['title', 'user']))
+        self.assertEqual(data, {
+            'title': CARAMELL_DANSEN_API_DATA['title'],
+            'user': CARAMELL_DANSEN_API_DATA['user'],
+            'user_url': CARAMELL_DANSEN_API_DATA['user_url'],
+        })
+
     def test_get_video_data__pretty_name(self):
         """
         The author's "name" isn't the same as their username. We want their username.
@@ -201,22 +249,22 @@ class YouTubeScrapeTestCase(YouTubeTestCase):
                      u's\xfcchtig', u'geil', u'cool', u'lustig', u'manga',
                      u'schweden', u'anime', u'musik', u'music', u'funny',
                      u'caramelldansen', u'U-U-U-Aua', u'Dance'],
-            'files': [VideoFile(url='http://r10---sn-nx57yn7k.c.youtube.com/videoplayback?upn=p0pWpkfxwq4&sparams=cp%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Cratebypass%2Csource%2Cupn%2Cexpire&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&key=yt1&expire=1356417961&source=youtube&ipbits=8&itag=18&gcr=us&sver=3&signature=7D1D4A9CF0626C3B2A10F6567390165729FA00B8.89C64C08C8B1CA689E4CE21169531E34A56761C1&ratebypass=yes&mt=1356395169&mv=m&ms=au&ip=74.61.34.250&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&id=27f0d5f5bd31eefe',
+            'files': [VideoFile(url='http://r10---sn-nx57yn7k.c.youtube.com/videoplayback?ms=au&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&sver=3&mv=m&ratebypass=yes&mt=1356395169&id=27f0d5f5bd31eefe&key=yt1&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&upn=p0pWpkfxwq4&expire=1356417961&ipbits=8&sparams=cp%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Cratebypass%2Csource%2Cupn%2Cexpire&gcr=us&ip=74.61.34.250&source=youtube&itag=18&signature=7D1D4A9CF0626C3B2A10F6567390165729FA00B8.89C64C08C8B1CA689E4CE21169531E34A56761C1',
                                 width=640,
                                 height=360,
                                 expires=datetime.datetime(2012, 12, 25, 6, 46, 1),
                                 mime_type=u'video/mp4'),
-                      VideoFile(url='http://r15---sn-nx57yn7r.c.youtube.com/videoplayback?upn=p0pWpkfxwq4&sparams=algorithm%2Cburst%2Ccp%2Cfactor%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Csource%2Cupn%2Cexpire&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&key=yt1&algorithm=throttle-factor&itag=34&ipbits=8&burst=40&gcr=us&sver=3&signature=9DAA96CCF4CA172A92C78907B0ECE241BAFB07D6.09AF4B0F7C6558D1B9B184A5F60232EDC296FF95&mv=m&mt=1356395169&ip=74.61.34.250&expire=1356417961&source=youtube&ms=au&factor=1.25&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&id=27f0d5f5bd31eefe',
+                      VideoFile(url='http://r15---sn-nx57yn7r.c.youtube.com/videoplayback?ms=au&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&expire=1356417961&sver=3&itag=34&mt=1356395169&source=youtube&id=27f0d5f5bd31eefe&key=yt1&factor=1.25&upn=p0pWpkfxwq4&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&algorithm=throttle-factor&burst=40&ipbits=8&sparams=algorithm%2Cburst%2Ccp%2Cfactor%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Csource%2Cupn%2Cexpire&gcr=us&ip=74.61.34.250&mv=m&signature=9DAA96CCF4CA172A92C78907B0ECE241BAFB07D6.09AF4B0F7C6558D1B9B184A5F60232EDC296FF95',
                                 width=640,
                                 height=360,
                                 expires=datetime.datetime(2012, 12, 25, 6, 46, 1),
                                 mime_type=u'video/x-flv'),
-                      VideoFile(url='http://r2---sn-nx57yn7d.c.youtube.com/videoplayback?upn=p0pWpkfxwq4&sparams=algorithm%2Cburst%2Ccp%2Cfactor%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Csource%2Cupn%2Cexpire&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&key=yt1&algorithm=throttle-factor&itag=5&ipbits=8&burst=40&gcr=us&sver=3&signature=A909DD7537DD821A0F5AE14FF1E83C87DD7C4EDF.4FCE8516F456B96DD45DB35A7AB8624A1A45498F&mv=m&mt=1356395169&ip=74.61.34.250&expire=1356417961&source=youtube&ms=au&factor=1.25&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&id=27f0d5f5bd31eefe',
+                      VideoFile(url='http://r2---sn-nx57yn7d.c.youtube.com/videoplayback?ms=au&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&expire=1356417961&sver=3&itag=5&mt=1356395169&source=youtube&id=27f0d5f5bd31eefe&key=yt1&factor=1.25&upn=p0pWpkfxwq4&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&algorithm=throttle-factor&burst=40&ipbits=8&sparams=algorithm%2Cburst%2Ccp%2Cfactor%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Csource%2Cupn%2Cexpire&gcr=us&ip=74.61.34.250&mv=m&signature=A909DD7537DD821A0F5AE14FF1E83C87DD7C4EDF.4FCE8516F456B96DD45DB35A7AB8624A1A45498F',
                                 width=400,
                                 height=240,
                                 expires=datetime.datetime(2012, 12, 25, 6, 46, 1),
                                 mime_type=u'video/x-flv'),
-                      VideoFile(url='http://r11---sn-nx57yn76.c.youtube.com/videoplayback?upn=p0pWpkfxwq4&sparams=cp%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Cratebypass%2Csource%2Cupn%2Cexpire&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&key=yt1&expire=1356417961&source=youtube&ipbits=8&itag=43&gcr=us&sver=3&signature=7D0403EBD72E0A28695B35F7BD542A88BC9FE4FA.C4D2BFDD22BBFDC002F8C67CF66363BCC93501EC&ratebypass=yes&mt=1356395169&mv=m&ms=au&ip=74.61.34.250&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&id=27f0d5f5bd31eefe',
+                      VideoFile(url='http://r11---sn-nx57yn76.c.youtube.com/videoplayback?ms=au&fexp=919330%2C916611%2C920704%2C912806%2C928001%2C922403%2C922405%2C929901%2C913605%2C929104%2C913546%2C913556%2C908496%2C920201%2C913302%2C919009%2C911116%2C901451%2C902556&sver=3&mv=m&ratebypass=yes&mt=1356395169&id=27f0d5f5bd31eefe&key=yt1&cp=U0hUS1RMVV9LS0NONF9MRllKOmZQN1JFU3lOX2Js&upn=p0pWpkfxwq4&expire=1356417961&ipbits=8&sparams=cp%2Cgcr%2Cid%2Cip%2Cipbits%2Citag%2Cratebypass%2Csource%2Cupn%2Cexpire&gcr=us&ip=74.61.34.250&source=youtube&itag=43&signature=7D0403EBD72E0A28695B35F7BD542A88BC9FE4FA.C4D2BFDD22BBFDC002F8C67CF66363BCC93501EC',
                                 width=640,
                                 height=360,
                                 expires=datetime.datetime(2012, 12, 25, 6, 46, 1),
@@ -224,6 +272,40 @@ class YouTubeScrapeTestCase(YouTubeTestCase):
         }
         self.assertDictEqual(data, expected_data)
 
+    def test_get_video_data__fields(self):
+        """
+        If files weren't requested, the stream map shouldn't be parsed.
+
+        """
+        scrape_file = self.get_data_file('youtube/video_info.txt')
+        response = self.get_response(scrape_file.read())
+        with mock.patch('vidscraper.suites.youtube._parse_stream_map') as p:
+            data = self.loader.get_video_data(response,
+                                              fields=set(['title', 'tags']))
+        self.assertFalse(p.called)
+        self.assertFalse('files' in data)
+        self.assertEqual(data['title'],
+                         u'CaramellDansen (Full Version + Lyrics)')
+
+    def test_get_video_data__formats(self):
+        """
+        Only the stream map entries for the loader's formats should be
+        returned, in the loader's order of preference.
+
+        """
+        self.loader.formats = (
+            ('43', u'video/webm', 640, 360),
+            ('18', u'video/mp4', 640, 360),
+        )
+        scrape_file = self.get_data_file('youtube/video_info.txt')
+        response = self.get_response(scrape_file.read())
+        data = self.loader.get_video_data(response)
+        self.assertEqual([f.mime_type for f in data['files']],
+                         [u'video/webm', u'video/mp4'])
+        self.assertTrue(data['files'][0].url.endswith(
+            '&itag=43&signature=7D0403EBD72E0A28695B35F7BD542A88BC9FE4FA.'
+            'C4D2BFDD22BBFDC002F8C67CF66363BCC93501EC'))
+
     def test_get_video_data__fail_150(self):
         scrape_file = self.get_data_file('youtube/video_info2.txt')
         response = self.get_response(scrape_file.read())
@@ -324,6 +406,37 @@ class YouTubeFeedTestCase(YouTubeTestCase):
                               'AssociatedPress/uploads?alt=json&v=2&'
                               'start-index=3&max-results=25')
 
+    def test_get_page_url__video_fields(self):
+        feed = self.suite.get_feed(self.feed_url, video_fields=['title'])
+        url = feed.get_page_url(page_start=3, page_max=25)
+        self.assertEqual(url, 'http://gdata.youtube.com/feeds/api/users/'
+                              'AssociatedPress/uploads?alt=json&v=2&'
+                              'start-index=3&max-results=25&fields=@gd:etag,'
+                              'id,title,link,logo,openSearch:totalResults,'
+                              'entry(id,link,published,title,updated)')
+
+    def test_partial_response(self):
+        """
+        A partial response should provide the feed's data and each video's
+        link, requested fields and the fields which the feed uses to track
+        new videos.
+
+        """
+        feed = self.suite.get_feed(self.feed_url, video_fields=['title'])
+        with self.get_data_file('youtube/feed_partial.json') as f:
+            response = self.get_response(f.read())
+        self.assertEqual(feed.data_from_response(response),
+                         self.feed.data_from_response(self.response))
+        entries = feed.get_response_items(response)
+        data = feed.get_video_data(entries[0],
+                                   fields=feed.get_requested_fields())
+        self.assertEqual(data, {
+            'link': u'http://www.youtube.com/watch?v=RLISBF9-G30',
+            'title': u'Romney Says Obama Not Being Candid',
+            'guid': 'http://gdata.youtube.com/feeds/api/videos/RLISBF9-G30',
+            'publish_datetime': datetime.datetime(2012, 4, 4, 17, 41, 49),
+        })
+
     def test_get_video_data(self):
         expected = {
             'description': u'GOP presidential candidate Mitt Romney said '
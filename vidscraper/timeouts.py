@@ -0,0 +1,100 @@
+"""
+Per-host timeouts learned from the latencies of earlier requests. They are
+enabled by setting :data:`vidscraper.fetch.timeouts` to an
+:class:`AdaptiveTimeouts` instance::
+
+    from vidscraper import fetch
+    from vidscraper.timeouts import AdaptiveTimeouts
+
+    fetch.timeouts = AdaptiveTimeouts(read_ceiling=60)
+
+Requests which don't set a timeout of their own then get a ``(connect,
+read)`` timeout for their host, so that fast hosts are given up on quickly
+while slow but healthy hosts get the time they usually need. The
+:attr:`~.VideoLoader.timeout` attribute of a loader or iterator class
+overrides this. Versions of requests before 2.4 only take a single timeout,
+which is used for connecting and for each read; they are sent the read
+timeout.
+
+"""
+from collections import deque
+import threading
+
+from vidscraper.utils.http import get_host
+from vidscraper.utils.stats import percentile
+
+
+class AdaptiveTimeouts(object):
+    """
+    Keeps the recent latencies of each host, and bases its timeouts on a
+    high ``percentile`` of them, times a safety ``multiplier``. Requests
+    can only measure the time until the response's headers arrive, which
+    bounds the time taken to connect, so both timeouts are based on the
+    same latencies, with their own floors and ceilings.
+
+    :param default: The timeout for hosts with fewer than ``min_samples``
+                    latencies.
+    :param connect_floor: The shortest connect timeout, in seconds.
+    :param connect_ceiling: The longest connect timeout, in seconds.
+    :param read_floor: The shortest read timeout, in seconds.
+    :param read_ceiling: The longest read timeout, in seconds.
+
+    """
+    def __init__(self, percentile=99, multiplier=2, default=3,
+                 connect_floor=0.5, connect_ceiling=5, read_floor=1,
+                 read_ceiling=30, min_samples=20, max_samples=200):
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.default = default
+        self.connect_floor = connect_floor
+        self.connect_ceiling = connect_ceiling
+        self.read_floor = read_floor
+        self.read_ceiling = read_ceiling
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, url, latency):
+        """Adds a latency, in seconds, for ``url``'s host."""
+        host = get_host(url)
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None:
+                samples = self._samples[host] = deque(
+                    maxlen=self.max_samples)
+            samples.append(latency)
+
+    def record_timeout(self, url, timeout):
+        """
+        Records that a request for ``url`` timed out after ``timeout``
+        seconds (a number or a ``(connect, read)`` tuple). Its latency was
+        at least that long, so recording it lets the timeouts of a host
+        which has become slower grow, up to their ceilings, rather than
+        cutting off every request.
+
+        """
+        if isinstance(timeout, tuple):
+            timeout = timeout[1]
+        self.record(url, timeout)
+
+    def get_percentile(self, url):
+        """
+        Returns the :attr:`percentile` of the latencies of ``url``'s host,
+        or ``None`` if fewer than :attr:`min_samples` have been recorded.
+
+        """
+        with self._lock:
+            samples = list(self._samples.get(get_host(url), ()))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return percentile(samples, self.percentile)
+
+    def get(self, url):
+        """Returns a ``(connect, read)`` timeout tuple for ``url``."""
+        latency = self.get_percentile(url)
+        if latency is None:
+            return (min(self.default, self.connect_ceiling), self.default)
+        timeout = latency * self.multiplier
+        return (min(max(timeout, self.connect_floor), self.connect_ceiling),
+                min(max(timeout, self.read_floor), self.read_ceiling))
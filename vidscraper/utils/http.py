@@ -0,0 +1,100 @@
+"""
+Utilities for working with HTTP dates, urls and responses.
+
+"""
+from calendar import timegm
+from datetime import datetime, timedelta
+from email.utils import formatdate, mktime_tz, parsedate_tz
+import urlparse
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+def http_date(value):
+    """
+    Returns ``value`` formatted for use in an HTTP date header. ``value`` may
+    be a naive UTC datetime or a string, which is assumed to be formatted
+    already.
+
+    """
+    if isinstance(value, datetime):
+        return formatdate(timegm(value.utctimetuple()), usegmt=True)
+    return value
+
+
+def parse_http_date(value):
+    """
+    Returns a naive UTC datetime for an HTTP date header, or ``None`` if
+    ``value`` can't be parsed.
+
+    """
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return datetime.utcfromtimestamp(mktime_tz(parsed))
+
+
+def parse_http_timestamp(value):
+    """
+    Returns the number of seconds since the epoch for an HTTP date header,
+    or ``None`` if ``value`` can't be parsed.
+
+    """
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+def get_host(url):
+    """
+    Returns the lowercased host (and port, if any) of ``url``, which is used
+    to group requests by the server they are sent to.
+
+    """
+    return urlparse.urlsplit(url).netloc.lower()
+
+
+def total_seconds(delta):
+    """
+    Returns the number of seconds in a :class:`~datetime.timedelta`, like
+    :meth:`~datetime.timedelta.total_seconds` (which is new in python 2.7).
+
+    """
+    return (delta.days * 86400 + delta.seconds +
+            delta.microseconds / 1000000.0)
+
+
+def pack_response(response):
+    """
+    Returns a picklable dictionary with the parts of ``response`` which are
+    needed to rebuild it with :func:`unpack_response`, for example in
+    another process or a cache.
+
+    """
+    if response is None:
+        return None
+    return {
+        'url': response.url,
+        'status_code': response.status_code,
+        'headers': dict(response.headers),
+        'encoding': response.encoding,
+        'content': response.content,
+        'elapsed': total_seconds(response.elapsed),
+    }
+
+
+def unpack_response(state):
+    """Rebuilds a response from the output of :func:`pack_response`."""
+    if state is None:
+        return None
+    response = Response()
+    response.url = state['url']
+    response.status_code = state['status_code']
+    response.headers = CaseInsensitiveDict(state['headers'])
+    response.encoding = state['encoding']
+    response._content = state['content']
+    # Responses packed by older versions don't have this.
+    response.elapsed = timedelta(seconds=state.get('elapsed', 0))
+    return response
@@ -0,0 +1,14 @@
+import math
+
+
+def percentile(samples, percent):
+    """
+    Returns the ``percent``\ th percentile of ``samples`` by the nearest-rank
+    method, or ``None`` if there are no samples.
+
+    """
+    samples = sorted(samples)
+    if not samples:
+        return None
+    index = int(math.ceil(percent / 100.0 * len(samples))) - 1
+    return samples[max(0, index)]
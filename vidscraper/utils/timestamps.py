@@ -0,0 +1,105 @@
+import datetime
+
+
+#: The maximum number of parsed values which will be remembered by
+#: :func:`parse_timestamp`. Once this is reached, the memo is cleared.
+MEMO_SIZE = 1024
+
+_memo = {}
+
+
+def _fixed_layout(separator, suffix):
+    """
+    Returns a function which parses ``YYYY-mm-dd<separator>HH:MM:SS<suffix>``
+    strings into datetimes, or returns ``None`` if the string doesn't have
+    exactly that layout.
+
+    """
+    length = 19 + len(suffix)
+
+    def parse(value):
+        if (len(value) != length or value[4] != '-' or value[7] != '-' or
+            value[10] != separator or value[13] != ':' or
+            value[16] != ':' or not value.endswith(suffix)):
+            return None
+        digits = (value[0:4] + value[5:7] + value[8:10] + value[11:13] +
+                  value[14:16] + value[17:19])
+        if not digits.isdigit():
+            return None
+        try:
+            return datetime.datetime(int(value[0:4]), int(value[5:7]),
+                                     int(value[8:10]), int(value[11:13]),
+                                     int(value[14:16]), int(value[17:19]))
+        except ValueError:
+            return None
+    return parse
+
+
+def _microseconds_layout(value):
+    """
+    Parses ``YYYY-mm-ddTHH:MM:SS.ffffff`` strings (with one to six digits of
+    microseconds) into datetimes, or returns ``None`` if the string doesn't
+    have that layout.
+
+    """
+    head, dot, fraction = value.partition('.')
+    if not dot or not 1 <= len(fraction) <= 6 or not fraction.isdigit():
+        return None
+    dt = _FAST_PATHS["%Y-%m-%dT%H:%M:%S"](head)
+    if dt is None:
+        return None
+    return dt.replace(microsecond=int(fraction.ljust(6, '0')))
+
+
+#: Maps :func:`~datetime.datetime.strptime` formats to functions which parse
+#: exactly the same strings much more quickly.
+_FAST_PATHS = {
+    "%Y-%m-%d %H:%M:%S": _fixed_layout(' ', ''),
+    "%Y-%m-%dT%H:%M:%S": _fixed_layout('T', ''),
+    "%Y-%m-%dT%H:%M:%SZ": _fixed_layout('T', 'Z'),
+    "%Y-%m-%dT%H:%M:%S.000Z": _fixed_layout('T', '.000Z'),
+}
+_FAST_PATHS["%Y-%m-%dT%H:%M:%S.%f"] = _microseconds_layout
+
+
+def parse_timestamp(value, format):
+    """
+    Returns a naive datetime for ``value``, which is expected to match the
+    given :func:`~datetime.datetime.strptime` ``format``. The formats used by
+    the built-in suites are parsed without calling
+    :func:`~datetime.datetime.strptime`, and recently-parsed values are
+    remembered. Raises :exc:`ValueError` if ``value`` doesn't match
+    ``format``, or :exc:`TypeError` if it isn't a string.
+
+    """
+    key = (value, format)
+    try:
+        return _memo[key]
+    except KeyError:
+        pass
+
+    dt = None
+    fast_path = _FAST_PATHS.get(format)
+    if fast_path is not None:
+        dt = fast_path(value)
+    if dt is None:
+        # Let strptime handle (or reject) anything unusual.
+        dt = datetime.datetime.strptime(value, format)
+
+    if len(_memo) >= MEMO_SIZE:
+        _memo.clear()
+    _memo[key] = dt
+    return dt
+
+
+def parse_isoformat(value):
+    """
+    Returns a naive datetime for a string produced by
+    :meth:`datetime.datetime.isoformat`, with or without microseconds.
+    Raises :exc:`ValueError` if ``value`` isn't isoformatted, or
+    :exc:`TypeError` if it isn't a string.
+
+    """
+    if isinstance(value, basestring) and '.' in value:
+        return parse_timestamp(value, "%Y-%m-%dT%H:%M:%S.%f")
+    return parse_timestamp(value, "%Y-%m-%dT%H:%M:%S")
@@ -4,27 +4,35 @@ import json
 import math
 import mimetypes
 import operator
+from StringIO import StringIO
+import time
 import urllib
 import urllib2
+import urlparse
 
 import feedparser
-import requests
-try:
-    import grequests
-except (RuntimeError, ImportError):
-    grequests = None
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
 
 from vidscraper import __version__
+from vidscraper.cache import LOADER_ERROR, VIDEO_DELETED
 from vidscraper.exceptions import (UnhandledVideo, UnhandledFeed,
-                                   UnhandledSearch, InvalidVideo)
+                                   UnhandledSearch, InvalidVideo, VideoDeleted,
+                                   CircuitOpen, DeadlineExceeded)
+import vidscraper.fetch
+from vidscraper.fetch import REQUEST_TIMEOUT, fetch, fetch_many
+from vidscraper.keys import KeyPool
+from vidscraper.ratelimit import BACKGROUND
 from vidscraper.utils.feedparser import (get_item_thumbnail_url,
                                          struct_time_to_datetime)
+from vidscraper.utils.http import (http_date, parse_http_date, pack_response,
+                                   unpack_response)
 from vidscraper.utils.search import (search_string_from_terms,
                                      terms_from_search_string)
+from vidscraper.utils.timestamps import parse_isoformat
 
 
 PREFERRED_MIMETYPES = ('video/webm', 'video/ogg', 'video/mp4')
-REQUEST_TIMEOUT = 3
 REQUEST_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (X11; Linux) Safari/536.10 '
                   'vidscraper/{version}'.format(version=__version__)
@@ -37,15 +45,117 @@ def _isoformat_to_datetime(dt_str):
     if the input is not a string or ValueError if it is not isoformatted.
 
     """
-    format = "%Y-%m-%dT%H:%M:%S"
+    return parse_isoformat(dt_str)
+
+
+def _get_video_data(obj, response_or_item, fields):
+    """
+    Calls ``obj.get_video_data`` with the given response or item, passing
+    ``fields`` along if ``obj`` declares that it :attr:`accepts_fields
+    <VideoLoader.accepts_fields>`.
+
+    """
+    if getattr(obj, 'accepts_fields', False):
+        return obj.get_video_data(response_or_item, fields=fields)
+    return obj.get_video_data(response_or_item)
+
+
+def _is_not_modified(response):
+    """
+    Returns ``True`` if ``response`` is an unparsed 304 Not Modified
+    response.
+
+    """
+    return getattr(response, 'status_code', None) == 304
+
+
+def _loader_video_data(args):
+    """
+    Runs :meth:`VideoLoader.get_video_data` for a ``(loader, response,
+    fields)`` tuple and returns a ``(data, exception)`` tuple. If ``response``
+    is packed, it is unpacked first, so that this can be run in a
+    :attr:`~Video.parse_pool`.
+
+    """
+    loader, response, fields = args
+    if isinstance(response, dict):
+        response = unpack_response(response)
+    try:
+        return _get_video_data(loader, response, fields), None
+    except Exception, exc:
+        return None, exc
+
+
+def _parse_loader_responses(parse_pool, items):
+    """
+    Runs :func:`_loader_video_data` for each ``(loader, response, fields)``
+    tuple in ``items``, in ``parse_pool`` if it isn't ``None``.
+
+    """
+    if parse_pool is None:
+        return [_loader_video_data(item) for item in items]
+    return list(parse_pool.map(_loader_video_data,
+                               [(loader, pack_response(response), fields)
+                                for loader, response, fields in items]))
+
+
+def _is_circuit_open(loader):
+    circuit_breakers = vidscraper.fetch.circuit_breakers
+    if circuit_breakers is None:
+        return False
     try:
-        return datetime.strptime(dt_str, format)
-    except ValueError:
-        pass
+        url = loader.get_url()
+    except NotImplementedError:
+        return False
+    return circuit_breakers.is_open(url)
 
-    # Maybe it has microseconds?
-    format = "%Y-%m-%dT%H:%M:%S.%f"
-    return datetime.strptime(dt_str, format)
+
+def _get_unanswered_error(loader, deadline=None):
+    """
+    Returns the error for a ``loader`` whose request got no response because
+    the ``deadline`` passed (:exc:`.DeadlineExceeded`) or its host's circuit
+    is open (:exc:`.CircuitOpen`), or ``None`` if it failed for some other
+    reason.
+
+    """
+    if deadline is not None and time.time() >= deadline:
+        return DeadlineExceeded(loader.url)
+    if _is_circuit_open(loader):
+        return CircuitOpen(loader.get_url())
+    return None
+
+
+def _get_loader_names(loaders):
+    """
+    Returns the sorted names of the classes of ``loaders``, which identify
+    the loaders that a :data:`~vidscraper.cache.LOADER_ERROR` applies to.
+
+    """
+    return sorted(set('{0}.{1}'.format(type(loader).__module__,
+                                       type(loader).__name__)
+                      for loader in loaders))
+
+
+def _iterator_page_data(args):
+    """
+    Parses a packed page response for an ``(iterator, response, page_max,
+    with_data)`` tuple in a :attr:`~VideoIterator.parse_pool`. Returns a
+    list of data dictionaries for the page's videos and, if ``with_data`` is
+    ``True``, a ``(data, exception)`` tuple for the iterator's
+    :meth:`~VideoIterator.data_from_response`.
+
+    """
+    iterator, response, page_max, with_data = args
+    response = iterator.parse_page(unpack_response(response))
+    video_data = list(iterator._iter_video_data(response, page_max))
+    if not with_data:
+        return video_data, None
+    try:
+        return video_data, (iterator.data_from_response(response), None)
+    except Exception, exc:
+        # Leave it to :meth:`VideoIterator.load` to raise this, if it's ever
+        # needed.
+        return video_data, (None, exc)
 
 
 class Video(object):
@@ -107,6 +217,19 @@ class Video(object):
     #: Whether the video is embeddable? (Youtube, Vimeo)
     is_embeddable = None
 
+    #: A process pool (such as a :class:`multiprocessing.Pool`) which
+    #: :meth:`run_loaders` will use to parse responses, or ``None`` to parse
+    #: them in the current thread. Only fetching is done in the current
+    #: thread; loaders and raw response data are sent to the pool, which
+    #: sends back data dictionaries. Any object with a ``map`` method like
+    #: :meth:`multiprocessing.Pool.map` can be used.
+    parse_pool = None
+
+    #: ``True`` if the last :meth:`load` was cut off by its deadline, so that
+    #: some fields may be missing which could still be loaded. Calling
+    #: :meth:`load` again tries to fill them.
+    partial = False
+
     def __init__(self, url, loaders=None, fields=None):
         if fields is None:
             self.fields = list(self._all_fields)
@@ -130,16 +253,68 @@ class Video(object):
         """
         return [f for f in self.fields if getattr(self, f) is None]
 
-    def load(self):
+    def load(self, priority=None, deadline=None):
         """
         If the video hasn't been loaded before, runs the loaders and populates
         the video's :attr:`fields`.
 
+        If a :data:`~vidscraper.fetch.negative_cache` is set, videos which
+        were recently found to be deleted or whose loaders all failed are
+        not loaded again; the remembered error is recorded for each loader
+        instead.
+
+        :param priority: The priority of the loaders' requests, as for
+                         :func:`~vidscraper.fetch.fetch`.
+        :param deadline: A timestamp (as from :func:`time.time`) by which
+                         loading must be finished. Requests which are still
+                         outstanding then are cut off, with a
+                         :exc:`.DeadlineExceeded` error for their loaders,
+                         and the video is left :attr:`partial`.
+
         """
         if not self._loaded:
-            data = self.run_loaders()
-            self._apply(data)
-            self._loaded = True
+            if self._load_cached_error():
+                self._loaded = True
+            else:
+                self._finish_load(self.run_loaders(priority, deadline))
+                self._loaded = not self.partial
+
+    def _load_cached_error(self):
+        """
+        If the :data:`~vidscraper.fetch.negative_cache` remembers that this
+        video failed to load, records the failure for each of the best
+        loaders and returns ``True``.
+
+        """
+        negative_cache = vidscraper.fetch.negative_cache
+        if negative_cache is None:
+            return False
+        loaders = self.get_best_loaders()
+        exc = negative_cache.get(self.url, (VIDEO_DELETED, LOADER_ERROR),
+                                 loaders=_get_loader_names(loaders))
+        if exc is None:
+            return False
+        for loader in loaders:
+            self._errors[loader] = exc
+        return True
+
+    def _finish_load(self, data):
+        self._apply(data)
+        negative_cache = vidscraper.fetch.negative_cache
+        if negative_cache is None:
+            return
+        for exc in self._errors.itervalues():
+            if isinstance(exc, VideoDeleted):
+                negative_cache.record(VIDEO_DELETED, self.url, exc)
+                return
+        # Running out of time, or not being able to reach a host, says
+        # nothing about the video.
+        if (self._errors and not data and not self.partial and
+                not any(isinstance(exc, CircuitOpen)
+                        for exc in self._errors.itervalues())):
+            negative_cache.record(LOADER_ERROR, self.url,
+                                  self._errors.values()[0],
+                                  loaders=_get_loader_names(self._errors))
 
     def _apply(self, data):
         """
@@ -161,58 +336,141 @@ class Video(object):
 
         This will prefer the first listed loaders and will prefer small
         combinations of loaders, so that the smallest number of smallest
-        possible responses will be fetched.
+        possible responses will be fetched. If
+        :data:`~vidscraper.fetch.loader_costs` is set, the combination with
+        the lowest measured cost is preferred instead, and the static order
+        only breaks ties. Either way, loaders which use up API quota (see
+        :meth:`VideoLoader.uses_quota`) are avoided unless they provide
+        fields which no other loader does.
+
+        Loaders whose host has an open circuit breaker (see
+        :mod:`vidscraper.retry`), and loaders whose :mod:`key pools
+        <vidscraper.keys>` are out of budget, are left out, so that other
+        loaders for the same fields are used instead.
 
         """
+        loaders = [loader for loader in self.loaders
+                   if not _is_circuit_open(loader) and
+                   loader.has_quota()]
         missing_fields = set(self.missing_fields)
         # Our initial state is that we cover none of the missing fields, and
         # that we use none of the available loaders.
         min_remaining = len(missing_fields)
         best_loaders = []
+        best_rank = (0, 0)
+        loader_costs = vidscraper.fetch.loader_costs
 
         # Loop through all combinations of any size that can be made with the
         # available loaders.
-        for size in xrange(1, len(self.loaders) + 1):
-            for loaders in itertools.combinations(self.loaders, size):
+        for size in xrange(1, len(loaders) + 1):
+            for combination in itertools.combinations(loaders, size):
                 # First, build a set of the fields that are provided by the
                 # loaders.
-                field_set = reduce(operator.or_, (l.fields for l in loaders))
+                field_set = reduce(operator.or_,
+                                   (l.fields for l in combination))
                 remaining = len(missing_fields - field_set)
-
-                # If these loaders fill all the missing fields, take them
-                # immediately.
-                if not remaining:
-                    return loaders
+                quota_count = sum(1 for l in combination if l.uses_quota())
+
+                if loader_costs is None:
+                    # If these loaders fill all the missing fields without
+                    # using any quota, take them immediately.
+                    if not remaining and not quota_count:
+                        return combination
+                    cost = 0
+                else:
+                    # A later combination may still be cheaper.
+                    cost = sum(loader_costs.get_cost(l) for l in combination)
 
                 # Otherwise, note the loaders iff they would decrease the 
-                # number of missing fields.
-                if remaining < min_remaining:
-                    best_loaders = loaders
+                # number of missing fields, or fill as many with fewer
+                # quota-limited loaders or for less. Earlier combinations win
+                # ties.
+                rank = (quota_count, cost)
+                if (remaining < min_remaining or
+                        (best_loaders and remaining == min_remaining and
+                         rank < best_rank)):
+                    best_loaders = combination
                     min_remaining = remaining
+                    best_rank = rank
         return best_loaders
 
-    def run_loaders(self):
+    def _record_open_circuits(self, best_loaders):
         """
-        Runs :meth:`get_best_loaders` and then gets data from each loader.
+        Records a :exc:`.CircuitOpen` error for each loader which was left
+        out because of an open circuit, but could have provided fields which
+        ``best_loaders`` don't.
 
         """
-        best_loaders = self.get_best_loaders()
+        uncovered = set(self.missing_fields)
+        for loader in best_loaders:
+            uncovered -= loader.fields
+        for loader in self.loaders:
+            if loader.fields & uncovered and _is_circuit_open(loader):
+                self._errors[loader] = CircuitOpen(loader.get_url())
+
+    def _get_alternative(self, loader, best_loaders):
+        """
+        Returns another loader which provides every missing field that
+        ``loader`` does, and which isn't already one of ``best_loaders``,
+        or ``None``.
+
+        """
+        needed = loader.fields & set(self.missing_fields)
+        for other in self.loaders:
+            if (other not in best_loaders and needed <= other.fields and
+                    not _is_circuit_open(other) and other.has_quota()):
+                return other
+        return None
+
+    def run_loaders(self, priority=None, deadline=None):
+        """
+        Runs :meth:`get_best_loaders` and then gets data from each loader,
+        making its requests with the given ``priority``. If a
+        :data:`~vidscraper.fetch.hedge_policy` is set, slow loaders are
+        hedged with alternative loaders. Loaders whose requests are cut off
+        by the ``deadline`` get a :exc:`.DeadlineExceeded` error, and make
+        the video :attr:`partial`.
 
-        if grequests is None:
-            responses = [requests.get(loader.get_url(),
-                                      **loader.get_request_kwargs())
-                         for loader in best_loaders]
+        """
+        self.partial = False
+        best_loaders = self.get_best_loaders()
+        self._record_open_circuits(best_loaders)
+        fields = set(self.fields)
+
+        hedge_policy = vidscraper.fetch.hedge_policy
+        if hedge_policy is None:
+            responses = fetch_many([(loader.get_url_for_fields(fields),
+                                     loader, loader.get_request_kwargs())
+                                    for loader in best_loaders], priority,
+                                   deadline)
         else:
-            responses = grequests.map(
-                                 [grequests.get(loader.get_url(),
-                                                **loader.get_request_kwargs())
-                                  for loader in best_loaders])
+            alternatives = [self._get_alternative(loader, best_loaders)
+                            for loader in best_loaders]
+            best_loaders, responses = zip(*hedge_policy.fetch_many(
+                best_loaders, alternatives, fields, priority,
+                deadline)) or ((), ())
 
-        data = {}
+        answered = []
         for loader, response in itertools.izip(best_loaders, responses):
-            try:
-                data.update(loader.get_video_data(response))
-            except Exception, exc:
+            exc = None
+            if response is None:
+                exc = _get_unanswered_error(loader, deadline)
+            if exc is None:
+                answered.append((loader, response, fields))
+            else:
+                # There's nothing to parse.
+                self._errors[loader] = exc
+                if isinstance(exc, DeadlineExceeded):
+                    self.partial = True
+        best_loaders = [loader for loader, response, fields in answered]
+        results = _parse_loader_responses(self.parse_pool, answered)
+
+        data = {}
+        for loader, (loader_data, exc) in itertools.izip(best_loaders,
+                                                         results):
+            if exc is None:
+                data.update(loader_data)
+            else:
                 self._errors[loader] = exc
 
         return data
@@ -306,6 +564,128 @@ class Video(object):
         return chosen
 
 
+def load_videos(videos, priority=None):
+    """
+    Loads each video in ``videos`` which hasn't been loaded yet, as with
+    :meth:`Video.load`, but with as few requests as possible.
+
+    The best loaders of all the videos are grouped by class, api keys and
+    requested fields. Groups of loaders with a :attr:`~VideoLoader.batch_size`
+    fetch data for up to that many videos per request, and videos in a group
+    with the same :attr:`~VideoLoader.url_data` share their data. All other
+    loaders make their usual requests. All requests are made together, with
+    the given ``priority``, as with :meth:`Video.run_loaders`.
+
+    """
+    pending = []
+    for video in videos:
+        if video._loaded:
+            continue
+        if video._load_cached_error():
+            video._loaded = True
+            continue
+        pending.append(video)
+    if not pending:
+        return
+
+    best_loaders = {}
+    # Maps each group's key to a dictionary of lists of loaders by url data,
+    # and a list of the same lists in the order they were added.
+    groups = {}
+    group_keys = []
+    singles = []
+    for video in pending:
+        fields = set(video.fields)
+        best_loaders[video] = video.get_best_loaders()
+        video._record_open_circuits(best_loaders[video])
+        for loader in best_loaders[video]:
+            if not loader.batch_size:
+                singles.append((loader, fields))
+                continue
+            key = (type(loader), tuple(sorted(loader.api_keys.items())),
+                   tuple(sorted(fields)))
+            url_data_key = json.dumps(loader.url_data, sort_keys=True)
+            if key not in groups:
+                groups[key] = ({}, [])
+                group_keys.append(key)
+            by_url_data, loader_lists = groups[key]
+            if url_data_key not in by_url_data:
+                by_url_data[url_data_key] = []
+                loader_lists.append(by_url_data[url_data_key])
+            by_url_data[url_data_key].append(loader)
+
+    # Each batch is a list of lists of loaders with the same url data.
+    batches = []
+    for key in group_keys:
+        cls, api_keys, fields = key
+        loader_lists = groups[key][1]
+        if len(loader_lists) == 1:
+            # There's nothing to batch.
+            singles.extend((loader, set(fields))
+                           for loader in loader_lists[0])
+            continue
+        for start in xrange(0, len(loader_lists), cls.batch_size):
+            batches.append((set(fields),
+                            loader_lists[start:start + cls.batch_size]))
+
+    requests_ = [(loader.get_url_for_fields(fields), loader,
+                  loader.get_request_kwargs())
+                 for loader, fields in singles]
+    for fields, loader_lists in batches:
+        loader = loader_lists[0][0]
+        url_data_list = [loaders[0].url_data for loaders in loader_lists]
+        requests_.append((loader.get_batch_url(url_data_list, fields),
+                          loader, loader.get_request_kwargs()))
+    responses = fetch_many(requests_, priority)
+
+    results = {}
+    answered = []
+    for (loader, fields), response in itertools.izip(singles, responses):
+        exc = None
+        if response is None:
+            exc = _get_unanswered_error(loader)
+        if exc is None:
+            answered.append((loader, response, fields))
+        else:
+            results[loader] = (None, exc)
+    results.update(itertools.izip(
+        (loader for loader, response, fields in answered),
+        _parse_loader_responses(pending[0].parse_pool, answered)))
+
+    for (fields, loader_lists), response in itertools.izip(
+                                        batches, responses[len(singles):]):
+        loader = loader_lists[0][0]
+        url_data_list = [loaders[0].url_data for loaders in loader_lists]
+        exc = None
+        if response is None:
+            exc = _get_unanswered_error(loader)
+        if exc is None:
+            try:
+                batch_data = loader.get_batch_video_data(
+                                         response, url_data_list, fields)
+            except Exception, exc:
+                batch_data = [exc] * len(loader_lists)
+        else:
+            batch_data = [exc] * len(loader_lists)
+        for loaders, data in itertools.izip(loader_lists, batch_data):
+            for loader in loaders:
+                if isinstance(data, Exception):
+                    results[loader] = (None, data)
+                else:
+                    results[loader] = (data, None)
+
+    for video in pending:
+        data = {}
+        for loader in best_loaders[video]:
+            loader_data, exc = results[loader]
+            if exc is None:
+                data.update(loader_data)
+            else:
+                video._errors[loader] = exc
+        video._finish_load(data)
+        video._loaded = True
+
+
 class VideoFile(object):
     """
     Represents a video file hosted somewhere. The only required attribute is
@@ -397,13 +777,36 @@ class VideoLoader(object):
     url_format = None
 
     #: The number of seconds before this loader times out. See python-requests
-    #: documentation for more information.
-    timeout = REQUEST_TIMEOUT
+    #: documentation for more information. If this is ``None``, the timeout
+    #: comes from :data:`vidscraper.fetch.timeouts`, or is
+    #: :data:`~vidscraper.fetch.REQUEST_TIMEOUT`.
+    timeout = None
 
     #: Extra headers to set on the requests for this loader. See
     #: python-requests documentation for more information.
     headers = REQUEST_HEADERS
 
+    #: The number of seconds for which responses to this class's requests
+    #: will be cached if a :data:`vidscraper.fetch.cache` is set, or ``None``
+    #: to follow the responses' Cache-Control and Expires headers.
+    cache_ttl = None
+
+    #: Whether :meth:`get_video_data` accepts a ``fields`` keyword argument.
+    #: If ``True``, the set of fields requested for the video will be passed
+    #: in, and fields which weren't requested may be left out of the
+    #: returned data instead of being computed.
+    accepts_fields = False
+
+    #: The largest number of videos which :meth:`get_batch_url` can ask for
+    #: at once, or ``None`` if this loader doesn't support batches.
+    #:
+    #: .. seealso:: :func:`load_videos`
+    batch_size = None
+
+    #: The names of the :attr:`api_keys` which this loader's requests use.
+    #: These are assumed to be limited by a quota.
+    api_key_names = ()
+
     def __init__(self, url, api_keys=None):
         self.url = url
         self.api_keys = api_keys if api_keys is not None else {}
@@ -420,6 +823,26 @@ class VideoLoader(object):
         """
         raise UnhandledVideo(url)
 
+    def uses_quota(self):
+        """
+        Returns ``True`` if this loader's requests would be made with one of
+        its :attr:`api_key_names`, and so use up quota.
+
+        """
+        return any(name in self.api_keys for name in self.api_key_names)
+
+    def has_quota(self, now=None):
+        """
+        Returns ``False`` if any of this loader's keys is a
+        :class:`~vidscraper.keys.KeyPool` which is out of budget.
+
+        """
+        for name in self.api_key_names:
+            pool = self.api_keys.get(name)
+            if isinstance(pool, KeyPool) and not pool.has_budget(now):
+                return False
+        return True
+
     def get_url(self):
         """
         Returns a url which can be fetched to get a response that this loader
@@ -430,6 +853,17 @@ class VideoLoader(object):
             raise NotImplementedError
         return self.url_format.format(**self.url_data)
 
+    def get_url_for_fields(self, fields):
+        """
+        Returns a url which can be fetched to get data for (at least) the
+        given set of ``fields``, or for all fields if ``fields`` is ``None``.
+        By default, this is the same as :meth:`get_url`; loaders for APIs
+        which support partial responses can override this to ask for less
+        data.
+
+        """
+        return self.get_url()
+
     def get_headers(self):
         """
         Returns a dictionary of headers which will be added to the request.
@@ -449,15 +883,53 @@ class VideoLoader(object):
             'headers': self.get_headers(),
         }
 
+    def prepare_request(self, url, kwargs):
+        """
+        Given the ``url`` and ``kwargs`` of one of this loader's requests,
+        returns the ``(url, kwargs)`` which should actually be sent. This is
+        called by :mod:`vidscraper.fetch` each time the request is sent, and
+        not for requests answered from a cache, so it's the place to add
+        :attr:`api_keys` which may come from a
+        :class:`~vidscraper.keys.KeyPool`. By default, returns them
+        unchanged.
+
+        """
+        return url, kwargs
+
     def get_video_data(self, response):
         """
         Parses the given ``response`` and returns a data dictionary for
         populating a :class:`Video` instance. By default, returns an empty
         dictionary.
 
+        If :attr:`accepts_fields` is ``True``, this will instead be called
+        with a ``fields`` keyword argument: a set of the fields which were
+        requested, or ``None`` if all fields should be returned.
+
         """
         return {}
 
+    def get_batch_url(self, url_data_list, fields):
+        """
+        Returns a url which can be fetched to get data for several videos at
+        once, given a list of their :attr:`url_data` and the set of
+        ``fields`` requested for all of them. This is only used if
+        :attr:`batch_size` is set.
+
+        """
+        raise NotImplementedError
+
+    def get_batch_video_data(self, response, url_data_list, fields):
+        """
+        Parses the ``response`` to a request for :meth:`get_batch_url` and
+        returns a list with an item for each of ``url_data_list``, in the
+        same order: either a data dictionary, as for :meth:`get_video_data`,
+        or an exception (such as :exc:`.VideoDeleted`) if the response had
+        no data for that video.
+
+        """
+        raise NotImplementedError
+
 
 class OEmbedLoaderMixin(object):
     """
@@ -518,6 +990,12 @@ class VideoIterator(object):
                      to find what API keys they may want or require.
 
     """
+    _all_fields = ()
+    #: Fields and :meth:`get_checkpoint_kwargs` which hold datetimes, and
+    #: need to be converted when checkpointing.
+    _datetime_fields = ()
+    _datetime_kwargs = ()
+
     #: Describes the number of videos expected on each page. This should be
     #: set whether or not the number of videos per page can be controlled.
     per_page = None
@@ -529,13 +1007,52 @@ class VideoIterator(object):
     page_url_format = None
 
     #: The number of seconds before this loader times out. See python-requests
-    #: documentation for more information.
-    timeout = REQUEST_TIMEOUT
+    #: documentation for more information. If this is ``None``, the timeout
+    #: comes from :data:`vidscraper.fetch.timeouts`, or is
+    #: :data:`~vidscraper.fetch.REQUEST_TIMEOUT`.
+    timeout = None
 
     #: Extra headers to set on the requests for this loader. See
     #: python-requests documentation for more information.
     headers = REQUEST_HEADERS
 
+    #: The number of seconds for which responses to this class's requests
+    #: will be cached if a :data:`vidscraper.fetch.cache` is set, or ``None``
+    #: to follow the responses' Cache-Control and Expires headers.
+    cache_ttl = None
+
+    #: Whether :meth:`get_video_data` accepts a ``fields`` keyword argument.
+    #: See :attr:`VideoLoader.accepts_fields`.
+    accepts_fields = False
+
+    #: The priority of page requests. Iterators usually run in the
+    #: background; set this to :data:`~vidscraper.ratelimit.INTERACTIVE` on
+    #: an instance if a user is waiting on its pages.
+    priority = BACKGROUND
+
+    #: A timestamp (as from :func:`time.time`) after which no more pages
+    #: will be fetched, or ``None``. Iteration stops early at the deadline,
+    #: and :attr:`partial` is set.
+    deadline = None
+
+    #: ``True`` if iteration was stopped by the :attr:`deadline` before the
+    #: iterator was finished. A :meth:`checkpoint` can be used to continue.
+    partial = False
+
+    #: ``True`` if the service responded to the first page request with 304
+    #: Not Modified, because the iterator's contents haven't changed since
+    #: its ``etag`` or ``last_modified``. In that case, the iterator yields no
+    #: videos and its data is not parsed.
+    not_modified = False
+
+    #: A process pool which will be used to parse pages, or ``None`` to parse
+    #: them in the current thread. Each page is fetched with
+    #: :meth:`fetch_page` in the current thread; the pool then runs
+    #: :meth:`parse_page`, :meth:`get_response_items` and
+    #: :meth:`get_video_data` and sends back data dictionaries. See
+    #: :attr:`Video.parse_pool`.
+    parse_pool = None
+
     def __init__(self, start_index=1, max_results=None, video_fields=None,
                  api_keys=None):
         self.start_index = start_index
@@ -546,6 +1063,124 @@ class VideoIterator(object):
 
         self.item_count = 0
         self._response = None
+        self._response_data = None
+        # The number of videos from the current page which have already been
+        # returned, if the page needs to be fetched again.
+        self._page_offset = 0
+        # The number of videos from the current page which have been
+        # returned (including any skipped ones), the most which it can
+        # return, and whether it has been finished.
+        self._page_videos_count = 0
+        self._page_max = None
+        self._page_finished = False
+        # Video fields which are parsed for the iterator's own use, even if
+        # they weren't requested, and the parsed data for the last video.
+        self._extra_video_fields = ()
+        self._last_video_data = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Responses and page iterators are specific to this process.
+        for key in ('_response', '_page_videos_iter', 'parse_pool',
+                    '_last_video_data'):
+            state.pop(key, None)
+        state['_page_offset'] = self._get_page_offset()
+        return state
+
+    def _get_page_offset(self):
+        if self._response is None:
+            return self._page_offset
+        if (self._page_max is not None and
+            self._page_videos_count >= self._page_max):
+            # The current page is finished.
+            return 0
+        return self._page_videos_count
+
+    def get_checkpoint_kwargs(self):
+        """
+        Returns the keyword arguments which :meth:`from_checkpoint` should use
+        to instantiate a new iterator. These must be serializable as json.
+        Subclasses which take additional arguments should extend this.
+
+        """
+        return {
+            'start_index': self.start_index,
+            'max_results': self.max_results,
+            'video_fields': (list(self.video_fields)
+                             if self.video_fields is not None else None),
+        }
+
+    def checkpoint(self):
+        """
+        Returns a dictionary, serializable as json, which describes the
+        iterator's current position. An iterator built from it with
+        :meth:`from_checkpoint` will continue from the same video, without
+        fetching any pages which have already been finished. Loaded data is
+        included; api keys are not.
+
+        """
+        data = None
+        if self._loaded:
+            data = {}
+            for field in self._all_fields:
+                value = getattr(self, field)
+                if isinstance(value, datetime):
+                    value = value.isoformat()
+                data[field] = value
+        return {
+            'class': '{0}.{1}'.format(type(self).__module__,
+                                      type(self).__name__),
+            'kwargs': self.get_checkpoint_kwargs(),
+            'item_count': self.item_count,
+            'page_offset': self._get_page_offset(),
+            'data': data,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, state, api_keys=None):
+        """
+        Given a dictionary such as would be provided by :meth:`checkpoint`
+        and, optionally, api keys, constructs an iterator which will continue
+        from the checkpointed position. The checkpointed class must be
+        ``cls`` or one of its subclasses.
+
+        :raises: :exc:`ValueError` if the checkpointed class isn't available.
+
+        """
+        module_name, _, class_name = state['class'].rpartition('.')
+        try:
+            module = __import__(module_name, fromlist=[class_name])
+            iterator_class = getattr(module, class_name)
+        except (ImportError, AttributeError):
+            iterator_class = None
+        if not (isinstance(iterator_class, type) and
+                issubclass(iterator_class, cls)):
+            raise ValueError(u"Can't restore {0} as {1}.".format(
+                                              state['class'], cls.__name__))
+        kwargs = dict((str(key), value)
+                      for key, value in state['kwargs'].iteritems())
+        for key in iterator_class._datetime_kwargs:
+            if isinstance(kwargs.get(key), basestring):
+                try:
+                    kwargs[key] = _isoformat_to_datetime(kwargs[key])
+                except ValueError:
+                    # It was given as a string in the first place.
+                    pass
+        iterator = iterator_class(api_keys=api_keys, **kwargs)
+        iterator.item_count = state['item_count']
+        iterator._page_offset = state['page_offset']
+        if state['data'] is not None:
+            data = state['data'].copy()
+            for field in iterator._datetime_fields:
+                if data.get(field) is not None:
+                    data[field] = _isoformat_to_datetime(data[field])
+            iterator._apply(data)
+            iterator._loaded = True
+        return iterator
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._response = None
 
     # Act as a generator
     def __iter__(self):
@@ -557,7 +1192,12 @@ class VideoIterator(object):
             raise StopIteration
 
         if self._response is None:
-            self._next_page()
+            self.partial = False
+            try:
+                self._next_page()
+            except DeadlineExceeded:
+                self.partial = True
+                raise StopIteration
             #: We could check _loaded first, but why bother?
             self.load()
 
@@ -566,40 +1206,76 @@ class VideoIterator(object):
         except StopIteration:
             # Try the next page.
             self._response = None
+            self._page_finished = True
             return self.next()
         else:
             self.item_count += 1
             return video
 
     def _next_page(self):
-        page_start = self.start_index + self.item_count
+        # If the iterator was restored partway through a page, fetch that
+        # page again and skip the videos which were already returned. The
+        # offset is kept until the page is loaded, in case fetching it fails.
+        skip = self._page_offset
+        page_start = self.start_index + self.item_count - skip
         if self.max_results is None:
             page_max = self.per_page
         else:
-            page_max = self.max_results - self.item_count
+            page_max = self.max_results - self.item_count + skip
             if self.per_page is not None:
                 page_max = min(page_max, self.per_page)
 
-        r = self.get_page(page_start, page_max)
+        self._page_max = page_max
+        self._page_videos_count = skip
+        self._page_finished = False
+        if self.parse_pool is None:
+            r = self.get_page(page_start, page_max)
+        else:
+            r = self.fetch_page(page_start, page_max)
+
+        if _is_not_modified(r):
+            self.not_modified = True
+            video_data = ()
+        elif self.parse_pool is None:
+            video_data = self._iter_video_data(r, page_max)
+        else:
+            video_data, self._response_data = list(self.parse_pool.map(
+                       _iterator_page_data,
+                       [(self, pack_response(r), page_max, not self._loaded)]
+            ))[0]
+        self._page_offset = 0
         self._response = r
-        self._page_videos_iter = self._page_videos(r, page_max)
+        self._page_videos_iter = self._page_videos(video_data, page_max, skip)
 
-    def _page_videos(self, response, page_max=None):
-        # Avoid circular imports.
-        from vidscraper.suites import registry
-        items = self.get_response_items(response)
-        self._page_videos_count = 0
-        for item in items:
+    def _iter_video_data(self, response, page_max=None):
+        """
+        Yields a data dictionary for each valid item in ``response``, up to
+        ``page_max`` items.
+
+        """
+        fields = self.get_requested_fields()
+        count = 0
+        for item in self.get_response_items(response):
+            if page_max is not None and count >= page_max:
+                break
             try:
-                data = self.get_video_data(item)
+                data = _get_video_data(self, item, fields)
             except InvalidVideo:
                 continue
+            count += 1
+            yield data
+
+    def _page_videos(self, video_data, page_max=None, skip=0):
+        # Avoid circular imports.
+        from vidscraper.suites import registry
+        for data in itertools.islice(video_data, skip, None):
             url = data.get('link')
             video = registry.get_video(url,
                                        fields=self.video_fields,
                                        api_keys=self.api_keys,
                                        require_loaders=False)
             video._apply(data)
+            self._last_video_data = data
             self._page_videos_count += 1
             yield video
             if (page_max is not None and
@@ -607,18 +1283,17 @@ class VideoIterator(object):
                 break
 
     def is_finished(self):
+        if self.not_modified:
+            return True
         if (self.max_results is not None and
             self.item_count >= self.max_results):
             return True
-        if self._response is None:
+        if self._response is None and self._page_finished:
             # Then we're between pages.
-            try:
-                if (self._page_videos_count == 0 or
-                    self._page_videos_count < self.per_page):
-                    # The last page was either empty or not full.
-                    return True
-            except AttributeError:
-                pass
+            if (self._page_videos_count == 0 or
+                self._page_videos_count < self.per_page):
+                # The last page was either empty or not full.
+                return True
         return False
 
     def load(self):
@@ -630,7 +1305,17 @@ class VideoIterator(object):
         if not self._loaded:
             if self._response is None:
                 self._next_page()
-            data = self.data_from_response(self._response)
+            if self.not_modified:
+                # There's nothing new to parse.
+                data = {}
+            elif self._response_data is not None:
+                # Already parsed in the parse pool.
+                data, exc = self._response_data
+                self._response_data = None
+                if exc is not None:
+                    raise exc
+            else:
+                data = self.data_from_response(self._response)
             self._apply(data)
             self._loaded = True
 
@@ -643,6 +1328,20 @@ class VideoIterator(object):
         """Returns an iterable of unparsed items for the response."""
         raise NotImplementedError
 
+    def get_requested_fields(self):
+        """
+        Returns the set of video fields which should be parsed from each
+        item, or ``None`` if all fields should be. This is based on
+        :attr:`video_fields`, but always includes ``link``, since that is
+        needed to build each video, and any fields which the iterator needs
+        for itself.
+
+        """
+        if self.video_fields is None:
+            return None
+        return (set(self.video_fields) | set(('link',)) |
+                set(self._extra_video_fields))
+
     def get_video_data(self, item):
         """
         Parses a single item for the feed and returns a data dictionary for
@@ -650,6 +1349,10 @@ class VideoIterator(object):
         dictionary. Raises :exc:`.InvalidVideo` if the item is found to be
         invalid in some way; this causes the item to be ignored.
 
+        If :attr:`accepts_fields` is ``True``, this will instead be called
+        with a ``fields`` keyword argument, as for
+        :meth:`VideoLoader.get_video_data`.
+
         """
         return {}
 
@@ -696,15 +1399,46 @@ class VideoIterator(object):
             'headers': self.get_headers()
         }
 
+    def prepare_request(self, url, kwargs):
+        """
+        Returns the ``(url, kwargs)`` which should be sent for a page
+        request. See :meth:`VideoLoader.prepare_request`.
+
+        """
+        return url, kwargs
+
     def get_page(self, page_start, page_max):
         """
         Given a start and maximum size for a page, fetches and returns a
         response for that page. The response could be a feedparser dict, a
-        parsed json response, or even just an html page.
+        parsed json response, or even just an html page. By default, this
+        runs :meth:`parse_page` on the result of :meth:`fetch_page`, unless
+        the response is 304 Not Modified, which is returned unparsed.
+
+        """
+        response = self.fetch_page(page_start, page_max)
+        if _is_not_modified(response):
+            return response
+        return self.parse_page(response)
+
+    def fetch_page(self, page_start, page_max):
+        """
+        Given a start and maximum size for a page, fetches and returns an
+        unparsed response for that page.
 
         """
         page_url = self.get_page_url(page_start, page_max)
-        response = requests.get(page_url, **self.get_request_kwargs())
+        response = fetch(page_url, self, **self.get_request_kwargs())
+        return response
+
+    def parse_page(self, response):
+        """
+        Given a response as returned by :meth:`fetch_page`, returns the
+        response which should be passed to :meth:`get_response_items` and
+        :meth:`data_from_response`. By default, returns the response
+        unchanged.
+
+        """
         return response
 
     def data_from_response(self, response):
@@ -719,26 +1453,44 @@ class VideoIterator(object):
 
 class FeedparserVideoIteratorMixin(object):
     """
-    Overrides the :meth:`get_page`, :meth:`data_from_response` and
+    Overrides the :meth:`parse_page`, :meth:`data_from_response` and
     :meth:`get_response_items` to use :mod:`feedparser`.
     :meth:`get_video_data` must still be implemented by subclasses.
 
     """
-    def get_request_kwargs(self):
-        return {
-            'etag': getattr(self, 'etag', None),
-            'modified': getattr(self, 'last_modified', None),
-            'request_headers': self.get_headers()
-        }
+    #: Response headers which are passed on to feedparser. Others (notably
+    #: Content-Encoding, since requests has already decoded the content)
+    #: would confuse it.
+    feedparser_headers = ('content-type', 'content-language',
+                          'content-location', 'etag', 'last-modified')
 
-    def get_page(self, page_start, page_max):
+    def fetch_page(self, page_start, page_max):
         page_url = self.get_page_url(page_start, page_max)
-        response = feedparser.parse(page_url, **self.get_request_kwargs())
-        # Don't let feedparser silence connection problems.
-        if isinstance(response.get('bozo_exception', None), urllib2.URLError):
-            raise response.bozo_exception
+        if urlparse.urlsplit(page_url).scheme in ('http', 'https'):
+            return super(FeedparserVideoIteratorMixin,
+                         self).fetch_page(page_start, page_max)
+        # feedparser has always accepted local files, so keep doing so.
+        fp = urllib2.urlopen(page_url)
+        try:
+            response = Response()
+            response.url = page_url
+            response.status_code = 200
+            response.headers = CaseInsensitiveDict(fp.info().items())
+            response._content = fp.read()
+        finally:
+            fp.close()
         return response
 
+    def parse_page(self, response):
+        headers = dict((key.lower(), value)
+                       for key, value in response.headers.items()
+                       if key.lower() in self.feedparser_headers)
+        headers.setdefault('content-location', response.url)
+        # Wrap the content so feedparser doesn't mistake it for a url or
+        # filename.
+        return feedparser.parse(StringIO(response.content),
+                                response_headers=headers)
+
     def data_from_response(self, response):
         feed = response.feed
         data = {
@@ -786,6 +1538,14 @@ class BaseFeed(VideoIterator):
                  known.
 
                  .. seealso:: http://en.wikipedia.org/wiki/HTTP_ETag
+    :param since_guid: The guid of the newest video seen the last time the
+                       feed was checked. Iteration will stop when this video
+                       is reached, since feeds list their newest videos
+                       first.
+    :param since_datetime: The publish datetime of the newest video seen the
+                           last time the feed was checked. Iteration will
+                           stop at the first video published at or before
+                           this time.
     :raises: :exc:`.UnhandledFeed` if the url can't be handled by the class
              being instantiated.
 
@@ -829,9 +1589,17 @@ class BaseFeed(VideoIterator):
 
        A unique identifier for the feed.
 
+    After iterating over a feed, :attr:`newest_guid` and
+    :attr:`newest_datetime` hold the high-water mark to use as
+    ``since_guid`` and ``since_datetime`` the next time the feed is checked.
+    If no new videos were found, they will be equal to ``since_guid`` and
+    ``since_datetime``.
+
     """
     _all_fields = ('video_count', 'last_modified', 'etag', 'description',
                    'webpage', 'title', 'thumbnail_url', 'guid')
+    _datetime_fields = ('last_modified',)
+    _datetime_kwargs = ('last_modified', 'since_datetime')
 
     video_count = None
     description = None
@@ -840,13 +1608,127 @@ class BaseFeed(VideoIterator):
     thumbnail_url = None
     guid = None
 
-    def __init__(self, url, last_modified=None, etag=None, **kwargs):
+    def __init__(self, url, last_modified=None, etag=None, since_guid=None,
+                 since_datetime=None, **kwargs):
         super(BaseFeed, self).__init__(**kwargs)
 
         self.url = url
         self.url_data = self.get_url_data(url)
         self.last_modified = last_modified
         self.etag = etag
+        self.since_guid = since_guid
+        self.since_datetime = since_datetime
+        self.newest_guid = since_guid
+        self.newest_datetime = since_datetime
+        self._caught_up = False
+        self._validators = {}
+
+        # The fields used to recognize seen videos and track the high-water
+        # mark need to be parsed, even on the first check, but aren't added
+        # to the videos unless they were requested.
+        self._extra_video_fields = ('guid', 'publish_datetime')
+
+    def get_request_kwargs(self):
+        kwargs = super(BaseFeed, self).get_request_kwargs()
+        if self.item_count:
+            # Only the first page says whether the feed has changed.
+            return kwargs
+        if self.etag:
+            kwargs['headers']['If-None-Match'] = self.etag
+        if self.last_modified:
+            kwargs['headers']['If-Modified-Since'] = http_date(
+                                                        self.last_modified)
+        return kwargs
+
+    def fetch_page(self, page_start, page_max):
+        response = super(BaseFeed, self).fetch_page(page_start, page_max)
+        if not self.item_count:
+            # Keep track of the feed's new state for the next request.
+            etag = response.headers.get('etag')
+            if etag:
+                self._validators['etag'] = etag
+            last_modified = parse_http_date(
+                                    response.headers.get('last-modified'))
+            if last_modified is not None:
+                self._validators['last_modified'] = last_modified
+            self._apply(self._validators)
+        return response
+
+    def load(self):
+        super(BaseFeed, self).load()
+        # The response headers are what the service will compare the next
+        # conditional request to, so they win over the parsed data.
+        self._apply(self._validators)
+
+    def next(self):
+        if self._caught_up:
+            raise StopIteration
+        video = super(BaseFeed, self).next()
+        guid = self._last_video_data.get('guid')
+        publish_datetime = self._last_video_data.get('publish_datetime')
+        if self.is_seen(guid, publish_datetime):
+            self._caught_up = True
+            raise StopIteration
+        if self.newest_guid == self.since_guid and guid is not None:
+            # This is the first new video.
+            self.newest_guid = guid
+        if publish_datetime is not None and (
+                self.newest_datetime is None or
+                publish_datetime > self.newest_datetime):
+            self.newest_datetime = publish_datetime
+        return video
+
+    def is_finished(self):
+        return self._caught_up or super(BaseFeed, self).is_finished()
+
+    def is_seen(self, guid, publish_datetime):
+        """
+        Returns ``True`` if the video with the given ``guid`` and
+        ``publish_datetime`` was already seen the last time the feed was
+        checked, based on ``since_guid`` and ``since_datetime``.
+
+        """
+        if self.since_guid is not None and guid == self.since_guid:
+            return True
+        return (self.since_datetime is not None and
+                publish_datetime is not None and
+                publish_datetime <= self.since_datetime)
+
+    def get_checkpoint_kwargs(self):
+        kwargs = super(BaseFeed, self).get_checkpoint_kwargs()
+        kwargs.update({
+            'url': self.url,
+            'last_modified': self.last_modified,
+            'etag': self.etag,
+            'since_guid': self.since_guid,
+            'since_datetime': self.since_datetime,
+        })
+        for key in self._datetime_kwargs:
+            if isinstance(kwargs[key], datetime):
+                kwargs[key] = kwargs[key].isoformat()
+        return kwargs
+
+    def checkpoint(self):
+        state = super(BaseFeed, self).checkpoint()
+        newest_datetime = self.newest_datetime
+        if newest_datetime is not None:
+            newest_datetime = newest_datetime.isoformat()
+        state.update({
+            'newest_guid': self.newest_guid,
+            'newest_datetime': newest_datetime,
+            'caught_up': self._caught_up,
+        })
+        return state
+
+    @classmethod
+    def from_checkpoint(cls, state, api_keys=None):
+        iterator = super(BaseFeed, cls).from_checkpoint(state, api_keys)
+        iterator.newest_guid = state['newest_guid']
+        if state['newest_datetime'] is not None:
+            iterator.newest_datetime = _isoformat_to_datetime(
+                                                    state['newest_datetime'])
+        iterator._caught_up = state['caught_up']
+        return iterator
 
     def get_url_data(self, url):
         """
@@ -915,6 +1797,14 @@ class BaseSearch(VideoIterator):
                                   u"{1}".format(self.__class__.__name__,
                                                 order_by))
 
+    def get_checkpoint_kwargs(self):
+        kwargs = super(BaseSearch, self).get_checkpoint_kwargs()
+        kwargs.update({
+            'query': self.raw_query,
+            'order_by': self.order_by,
+        })
+        return kwargs
+
     def get_page_url_data(self, page_start, page_max):
         data = super(BaseSearch, self).get_page_url_data(page_start,
                                                           page_max)
@@ -0,0 +1,396 @@
+"""
+Support for running scrape jobs from a shared queue, so that work can be
+spread across several processes or machines. Jobs are put on a queue with
+:meth:`BaseQueue.put` and run by :class:`Worker`\ s, which store their
+results back on the queue.
+
+Delivery is at-least-once: a job which is claimed by a worker but not
+finished within its timeout will be handed to another worker, so a job may
+occasionally be run more than once.
+
+"""
+from datetime import datetime
+import json
+import sqlite3
+import time
+import uuid
+
+from vidscraper import auto_scrape
+from vidscraper.exceptions import (CircuitOpen, DeadlineExceeded,
+                                   VidscraperError)
+import vidscraper.fetch
+from vidscraper.ratelimit import BACKGROUND
+from vidscraper.suites import registry
+
+
+#: Job kinds which can be run by a :class:`Worker`.
+VIDEO = 'video'
+FEED = 'feed'
+SEARCH = 'search'
+
+#: Job states.
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobTimedOut(VidscraperError):
+    """
+    Raised by a :class:`Worker` if a job is still running once its timeout
+    has passed.
+
+    """
+    pass
+
+
+class Job(object):
+    """
+    Represents a job on a queue. Jobs are created by queues; they should not
+    be instantiated directly.
+
+    .. attribute:: id
+
+        The id assigned to the job by its queue.
+
+    .. attribute:: kind
+
+        One of :data:`VIDEO`, :data:`FEED`, or :data:`SEARCH`.
+
+    .. attribute:: params
+
+        A dictionary of keyword arguments for the job.
+
+    .. attribute:: timeout
+
+        The number of seconds a worker has to finish the job before it will
+        be handed to another worker.
+
+    .. attribute:: status
+
+        One of :data:`PENDING`, :data:`CLAIMED`, :data:`DONE` or
+        :data:`FAILED`.
+
+    .. attribute:: result
+
+        For finished jobs, the data returned by the worker.
+
+    .. attribute:: error
+
+        For failed jobs, a description of the last error.
+
+    """
+    def __init__(self, id, kind, params, timeout, status=PENDING,
+                 attempts=0, token=None, deadline=None, result=None,
+                 error=None):
+        self.id = id
+        self.kind = kind
+        self.params = params
+        self.timeout = timeout
+        self.status = status
+        self.attempts = attempts
+        self.token = token
+        self.deadline = deadline
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        return '<Job {0} {1} {2}>'.format(self.id, self.kind, self.status)
+
+
+class BaseQueue(object):
+    """
+    Defines the interface for job queues. Subclasses must implement all of
+    the methods except :meth:`put`, which validates its arguments and then
+    calls :meth:`_put`.
+
+    """
+    #: The default number of seconds a worker has to finish a job.
+    default_timeout = 300
+
+    #: The number of times a job will be tried before it fails for good.
+    max_attempts = 3
+
+    def put(self, kind, params=None, timeout=None):
+        """
+        Adds a job of the given ``kind`` to the queue and returns its id.
+        ``params`` will be passed as keyword arguments to the corresponding
+        :class:`Worker` method, and must be serializable as json.
+
+        """
+        if kind not in (VIDEO, FEED, SEARCH):
+            raise ValueError(u"Unknown job kind: {0}".format(kind))
+        if timeout is None:
+            timeout = self.default_timeout
+        return self._put(kind, params or {}, timeout)
+
+    def _put(self, kind, params, timeout):
+        raise NotImplementedError
+
+    def claim(self):
+        """
+        Marks the next available job as claimed and returns it, or returns
+        ``None`` if no jobs are available. Jobs whose previous claim has
+        timed out are available again.
+
+        """
+        raise NotImplementedError
+
+    def complete(self, job, result):
+        """
+        Stores the ``result`` of a claimed ``job``. Returns ``False`` if the
+        claim had already timed out (and the result was discarded), and
+        ``True`` otherwise.
+
+        """
+        raise NotImplementedError
+
+    def fail(self, job, error, retry=True, delay=0):
+        """
+        Records that a claimed ``job`` failed with the given ``error``. If
+        ``retry`` is ``True`` and the job has attempts left, it becomes
+        available again after ``delay`` seconds; otherwise it is marked as
+        failed. Returns ``False`` if the claim had already timed out.
+
+        """
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Returns the :class:`Job` with the given id."""
+        raise NotImplementedError
+
+
+class SQLiteQueue(BaseQueue):
+    """
+    A queue stored in an SQLite database at ``path``, which can be shared by
+    any processes which can open the file.
+
+    """
+    def __init__(self, path, default_timeout=None, max_attempts=None):
+        if default_timeout is not None:
+            self.default_timeout = default_timeout
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None,
+                                          timeout=30)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS vidscraper_jobs ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'kind TEXT NOT NULL, '
+            'params TEXT NOT NULL, '
+            'timeout REAL NOT NULL, '
+            'status TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'token TEXT, '
+            'deadline REAL, '
+            'result TEXT, '
+            'error TEXT)')
+
+    def _put(self, kind, params, timeout):
+        cursor = self.connection.execute(
+            'INSERT INTO vidscraper_jobs (kind, params, timeout, status) '
+            'VALUES (?, ?, ?, ?)',
+            (kind, json.dumps(params), timeout, PENDING))
+        return cursor.lastrowid
+
+    def claim(self):
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Claims which timed out on their last attempt have failed.
+            self.connection.execute(
+                'UPDATE vidscraper_jobs SET status = ?, token = NULL, '
+                'error = ? WHERE status = ? AND deadline < ? '
+                'AND attempts >= ?',
+                (FAILED, u'Timed out.', CLAIMED, now, self.max_attempts))
+            # The deadline of a pending job is when it may be retried.
+            row = self.connection.execute(
+                'SELECT id FROM vidscraper_jobs WHERE (status = ? AND '
+                '(deadline IS NULL OR deadline <= ?)) '
+                'OR (status = ? AND deadline < ?) ORDER BY id LIMIT 1',
+                (PENDING, now, CLAIMED, now)).fetchone()
+            if row is None:
+                self.connection.execute('COMMIT')
+                return None
+            self.connection.execute(
+                'UPDATE vidscraper_jobs SET status = ?, token = ?, '
+                'attempts = attempts + 1, deadline = ? + timeout '
+                'WHERE id = ?',
+                (CLAIMED, uuid.uuid4().hex, now, row[0]))
+            self.connection.execute('COMMIT')
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.get(row[0])
+
+    def _finish(self, job, status, result=None, error=None, retry_at=None):
+        cursor = self.connection.execute(
+            'UPDATE vidscraper_jobs SET status = ?, token = NULL, '
+            'result = ?, error = ?, deadline = COALESCE(?, deadline) '
+            'WHERE id = ? AND token = ? AND status = ? AND deadline >= ?',
+            (status, json.dumps(result), error, retry_at, job.id, job.token,
+             CLAIMED, time.time()))
+        return cursor.rowcount == 1
+
+    def complete(self, job, result):
+        return self._finish(job, DONE, result=result)
+
+    def fail(self, job, error, retry=True, delay=0):
+        if retry and job.attempts < self.max_attempts:
+            return self._finish(job, PENDING, error=error,
+                                retry_at=time.time() + delay)
+        return self._finish(job, FAILED, error=error)
+
+    def get(self, job_id):
+        row = self.connection.execute(
+            'SELECT id, kind, params, timeout, status, attempts, token, '
+            'deadline, result, error FROM vidscraper_jobs WHERE id = ?',
+            (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        (id, kind, params, timeout, status, attempts, token, deadline,
+         result, error) = row
+        return Job(id, kind, json.loads(params), timeout, status=status,
+                   attempts=attempts, token=token, deadline=deadline,
+                   result=json.loads(result) if result else None,
+                   error=error)
+
+
+def _serialize_iterator(iterator):
+    """
+    Returns a dictionary of the fields on a feed or search, with datetimes
+    converted to isoformat.
+
+    """
+    data = {}
+    for field in iterator._all_fields:
+        value = getattr(iterator, field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        data[field] = value
+    return data
+
+
+class Worker(object):
+    """
+    Claims jobs from ``queue`` and runs them. ``api_keys`` will be used for
+    every job.
+
+    The result of a :data:`VIDEO` job is the output of
+    :meth:`.Video.serialize`. A :data:`FEED` job returns a dictionary with
+    the feed's fields under ``'feed'`` and a list of serialized videos
+    under ``'videos'``. A :data:`SEARCH` job returns a list of such
+    dictionaries (under ``'search'`` and ``'videos'``), one per suite which
+    handled the search.
+
+    Each job's deadline applies to the requests made for it, as with the
+    ``deadline`` of :func:`.auto_scrape`. A job which is cut off by its
+    deadline fails as timed out, and can be retried. A job which fails with
+    :exc:`.CircuitOpen` can also be retried, once its host's circuit is
+    ready to let a trial request through.
+
+    """
+    def __init__(self, queue, api_keys=None):
+        self.queue = queue
+        self.api_keys = api_keys
+
+    def run_video(self, job, url, fields=None):
+        video = auto_scrape(url, fields=fields, api_keys=self.api_keys,
+                            priority=BACKGROUND, deadline=job.deadline)
+        if video.partial:
+            raise JobTimedOut(job.id)
+        return video.serialize()
+
+    def _run_iterator(self, job, iterator):
+        iterator.deadline = job.deadline
+        iterator.load()
+        videos = []
+        for video in iterator:
+            if time.time() > job.deadline:
+                raise JobTimedOut(job.id)
+            videos.append(video.serialize())
+        if iterator.partial:
+            raise JobTimedOut(job.id)
+        return _serialize_iterator(iterator), videos
+
+    def run_feed(self, job, url, max_results=None, video_fields=None):
+        feed = registry.get_feed(url, max_results=max_results,
+                                 video_fields=video_fields,
+                                 api_keys=self.api_keys)
+        data, videos = self._run_iterator(job, feed)
+        return {'feed': data, 'videos': videos}
+
+    def run_search(self, job, query, order_by='relevant', max_results=None,
+                   video_fields=None):
+        results = []
+        for search in registry.get_searches(query, order_by=order_by,
+                                            max_results=max_results,
+                                            video_fields=video_fields,
+                                            api_keys=self.api_keys,
+                                            deadline=job.deadline):
+            data, videos = self._run_iterator(job, search)
+            results.append({'search': data, 'videos': videos})
+        return results
+
+    def get_circuit_delay(self):
+        """
+        Returns the number of seconds to wait before retrying a job which
+        failed because a host's circuit was open: the circuit breakers'
+        ``reset_timeout``.
+
+        """
+        circuit_breakers = vidscraper.fetch.circuit_breakers
+        if circuit_breakers is None:
+            return 0
+        return circuit_breakers.reset_timeout
+
+    def run_job(self, job):
+        """Runs ``job`` and returns its result."""
+        method = getattr(self, 'run_{0}'.format(job.kind))
+        # json gives unicode keys, which can't be used as kwargs in all
+        # versions of python 2.
+        params = dict((str(key), value)
+                      for key, value in job.params.iteritems())
+        return method(job, **params)
+
+    def work(self):
+        """
+        Claims and runs a single job. Returns the job, or ``None`` if no job
+        was available. Errors from :mod:`vidscraper` (like
+        :exc:`.UnhandledVideo`) fail the job immediately; other errors (like
+        connection problems) and :exc:`.CircuitOpen` let it be retried.
+
+        """
+        job = self.queue.claim()
+        if job is None:
+            return None
+        try:
+            result = self.run_job(job)
+        except (JobTimedOut, DeadlineExceeded), exc:
+            self.queue.fail(job, u'Timed out.')
+        except CircuitOpen, exc:
+            self.queue.fail(job, u'{0}: {1}'.format(type(exc).__name__, exc),
+                            delay=self.get_circuit_delay())
+        except VidscraperError, exc:
+            self.queue.fail(job, u'{0}: {1}'.format(type(exc).__name__, exc),
+                            retry=False)
+        except Exception, exc:
+            self.queue.fail(job, u'{0}: {1}'.format(type(exc).__name__, exc))
+        else:
+            self.queue.complete(job, result)
+        return job
+
+    def run(self, poll_interval=1, max_jobs=None):
+        """
+        Runs jobs until ``max_jobs`` have been run (or forever, if
+        ``max_jobs`` is ``None``), sleeping for ``poll_interval`` seconds
+        whenever the queue is empty.
+
+        """
+        count = 0
+        while max_jobs is None or count < max_jobs:
+            if self.work() is None:
+                time.sleep(poll_interval)
+            else:
+                count += 1